@@ -10,6 +10,9 @@ done
 
 cd ../library || exit 1
 
-python manage.py collectstatic --noinput --clear
+# no --clear: files that didn't change since the last build aren't copied, hashed or compressed
+# again, and what the new build no longer references is deleted after it instead (see
+# core.storage.PrecompressedManifestStaticFilesStorage)
+python manage.py collectstatic --noinput
 
 cd ../container-config || exit 1
\ No newline at end of file
@@ -1,59 +1,236 @@
-from django.contrib import admin
+from collections import Counter
+
+from django.contrib import admin, messages
+from django.db.models import Prefetch
 from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .loans import LoanResult, return_copies, set_copies_status
+from .models import Author, Book, BookInstance, Genre, Language, OverdueScan
+from .pagination import EstimatedCountPaginator
+
+STATUS = BookInstance.LOAN_STATUS
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that can grow to 100k+ rows."""
+
+    paginator = EstimatedCountPaginator
+    # otherwise a filtered changelist also counts the whole table ("x of y selected")
+    show_full_result_count = False
+
+
+class LimitedInline(admin.TabularInline):
+    """Inline whose existing objects can't be changed, showing only the first 'max_shown' of them
+    (see 'LimitedInlinesMixin'); the parent links to the related changelist for the rest."""
 
-from .models import Author, Book, BookInstance, Genre, Language
+    max_shown = 20
+    extra = 0
+    can_delete = False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+
+class LimitedInlinesMixin:
+    """Fetches only the first 'max_shown' objects of each 'LimitedInline' (formsets normally load
+    every related object, and render a form for each)."""
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)  # type: ignore
+        if isinstance(inline, LimitedInline) and obj is not None:
+            queryset = kwargs["queryset"]
+            fk_name = inline.fk_name or next(
+                field.name
+                for field in inline.model._meta.fields
+                if field.related_model is type(obj)
+            )
+            shown = list(
+                queryset.filter(**{fk_name: obj}).values_list("pk", flat=True)[
+                    : inline.max_shown
+                ]
+            )
+            kwargs["queryset"] = queryset.filter(pk__in=shown)
+        return kwargs
+
+
+def _changelist_link(model, lookup: str, obj, count: int, max_shown: int) -> str:
+    url = reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+    label = f"All {count} {model._meta.verbose_name_plural}"
+    if count > max_shown:
+        label += f" (only the first {max_shown} are listed below)"
+    return format_html('<a href="{}?{}={}">{}</a>', url, lookup, obj.pk, label)
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(LimitedInlinesMixin, LargeTableAdmin):
     list_display = ("title", "author", "display_genre")
+    search_fields = ("title", "isbn")
+    autocomplete_fields = ("author", "genre", "language")
+    readonly_fields = ("copies",)
+
+    def get_queryset(self, request):
+        # the list's author and genres in two queries, not one per row
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("author")
+            .prefetch_related(Prefetch("genre", Genre.objects.order_by("name")))
+        )
 
     # cannot display many-to-many field in list_display because of performance on large DBs, so we
     # create a callable (maybe not recommended, but using for example)
     @admin.display(description="Genre")
     def display_genre(self, obj):
-        return ", ".join([genre.name for genre in obj.genre.all()[:3]])
-
-    class BooksInstanceInline(admin.TabularInline):
+        # sliced in Python, since slicing the queryset would skip the prefetched genres
+        return ", ".join([genre.name for genre in list(obj.genre.all())[:3]])
+
+    @admin.display(description="Copies")
+    def copies(self, obj):
+        if obj.pk is None:
+            return "-"
+        return _changelist_link(
+            BookInstance,
+            "book__id__exact",
+            obj,
+            obj.bookinstance_set.count(),
+            self.BooksInstanceInline.max_shown,
+        )
+
+    class BooksInstanceInline(LimitedInline):
         model = BookInstance
+        fields = ("id", "imprint", "status", "due_back", "borrower")
+        # a select of every user would be rendered for each added copy
+        autocomplete_fields = ("borrower",)
 
-        def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
-            return False
-
-        can_delete = False
-        extra = 0
+        def get_queryset(self, request):
+            return super().get_queryset(request).select_related("borrower")
 
     inlines = [BooksInstanceInline]
 
 
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
+class AuthorAdmin(LimitedInlinesMixin, LargeTableAdmin):
     list_display = ("last_name", "first_name", "date_of_birth", "date_of_death")
-    fields = ["first_name", "last_name", ("date_of_birth", "date_of_death")]
-
-    class BookInline(admin.TabularInline):
+    fields = ["first_name", "last_name", ("date_of_birth", "date_of_death"), "books"]
+    readonly_fields = ("books",)
+    search_fields = ("last_name", "first_name")
+
+    @admin.display(description="Books")
+    def books(self, obj):
+        if obj.pk is None:
+            return "-"
+        return _changelist_link(
+            Book,
+            "author__id__exact",
+            obj,
+            obj.book_set.count(),
+            self.BookInline.max_shown,
+        )
+
+    class BookInline(LimitedInline):
         model = Book
-        extra = 0
-        can_delete = False
+        # not the genres, which would be a query per book; books are added from their own form,
+        # which has them (and the cover)
+        fields = ("title", "isbn", "language")
 
-        def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        def has_add_permission(self, request: HttpRequest, obj=None) -> bool:
             return False
 
+        def get_queryset(self, request):
+            return super().get_queryset(request).select_related("language")
+
     inlines = [BookInline]
 
 
-admin.site.register(Genre)
-admin.site.register(Language)
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    search_fields = ("name",)
+
+
+@admin.register(Language)
+class LanguageAdmin(admin.ModelAdmin):
+    search_fields = ("name",)
 
 
 @admin.register(BookInstance)
-class BookInstanceAdmin(admin.ModelAdmin):
+class BookInstanceAdmin(LargeTableAdmin):
     list_display = ("status", "due_back", "borrower", "book", "id")
+    list_select_related = ("book", "borrower")
     list_filter = (
         "status",
         "due_back",
     )
+    search_fields = ("=id", "book__title", "imprint")
+    autocomplete_fields = ("book", "borrower")
     fieldsets = (
         (None, {"fields": ("book", "imprint", "id")}),
         ("Availability", {"fields": ("status", "due_back", "borrower")}),
     )
+    actions = ["mark_returned", "mark_available", "send_to_maintenance"]
+
+    def has_mark_returned_permission(self, request: HttpRequest) -> bool:
+        return request.user.has_perm("catalog.can_mark_returned")
+
+    # each action locks the selected copies and changes the ones it applies to with one UPDATE
+    # (see 'catalog.loans'), instead of saving them one by one
+
+    @admin.action(
+        description="Mark selected copies as returned", permissions=["mark_returned"]
+    )
+    def mark_returned(self, request, queryset):
+        self.report(request, return_copies(queryset.values_list("pk", flat=True)))
+
+    @admin.action(
+        description="Mark selected copies as available", permissions=["change"]
+    )
+    def mark_available(self, request, queryset):
+        self.report(
+            request,
+            set_copies_status(queryset.values_list("pk", flat=True), STATUS.Available),
+        )
+
+    @admin.action(
+        description="Send selected copies to maintenance", permissions=["change"]
+    )
+    def send_to_maintenance(self, request, queryset):
+        self.report(
+            request,
+            set_copies_status(
+                queryset.values_list("pk", flat=True), STATUS.Maintenance
+            ),
+        )
+
+    def report(self, request: HttpRequest, result: LoanResult) -> None:
+        self.message_user(request, f"Updated {len(result.changed)} copies")
+        if result.skipped:
+            reasons = Counter(result.skipped.values())
+            self.message_user(
+                request,
+                f"Skipped {len(result.skipped)} copies ("
+                + ", ".join(f"{count}: {reason}" for reason, count in reasons.items())
+                + ")",
+                level=messages.WARNING,
+            )
+
+
+@admin.register(OverdueScan)
+class OverdueScanAdmin(admin.ModelAdmin):
+    list_display = (
+        "started_at",
+        "duration",
+        "overdue_loans",
+        "borrowers",
+        "emails_sent",
+        "emails_failed",
+        "unreachable",
+        "dry_run",
+    )
+
+    # written by 'scan_overdue' only
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
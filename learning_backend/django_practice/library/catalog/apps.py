@@ -1,3 +1,5 @@
+from typing import override
+
 from django.apps import AppConfig
 
 
@@ -5,3 +7,8 @@ class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     # define name of app
     name = 'catalog'
+
+    @override
+    def ready(self) -> None:
+        # importing the module connects the receivers declared with @receiver
+        from . import signals  # noqa: F401
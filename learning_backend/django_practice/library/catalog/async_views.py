@@ -0,0 +1,76 @@
+"""Async versions of the read-heavy catalog views, used when running under ASGI.
+
+Every query is made with the async ORM, so a worker's event loop can serve other requests while it
+waits on the database. The responses are TemplateResponses, which Django renders in its sync thread
+after the view returns, so templates can still lazily touch 'request.user', permissions, etc.
+"""
+
+from django.http import Http404
+from django.template.response import TemplateResponse
+from django.utils.translation import gettext as _
+
+from . import views
+from .counters import aget_counters
+
+
+async def index(request):
+    """View function for home page of site."""
+    context = await aget_counters()
+    return TemplateResponse(request, "catalog/index.html", context=context)
+
+
+class AsyncListMixin:
+    """Serves a ListView's GET with the async ORM (the view must use 'CursorPaginationMixin')."""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()  # type: ignore
+        page_size = self.get_paginate_by(self.object_list)  # type: ignore
+        if page_size:
+            self._pagination = await self.apaginate_queryset(  # type: ignore
+                self.object_list, page_size
+            )
+        else:
+            self._pagination = None
+            self.object_list = [obj async for obj in self.object_list]
+        return self.render_to_response(self.get_context_data())  # type: ignore
+
+    def paginate_queryset(self, queryset, page_size):
+        # 'get_context_data()' is sync, so it's handed the page that 'get()' already fetched
+        return self._pagination
+
+
+class AsyncDetailMixin:
+    """Serves a DetailView's GET with the async ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        context = self.get_context_data(object=self.object)  # type: ignore
+        return self.render_to_response(context)  # type: ignore
+
+    async def aget_object(self):
+        queryset = self.get_queryset()  # type: ignore
+        pk = self.kwargs.get(self.pk_url_kwarg)  # type: ignore
+        if pk is None:
+            raise AttributeError(
+                f"Generic detail view {self.__class__.__name__} must be called with an object pk."
+            )
+        try:
+            # prefetch_related() lookups are run as part of the same (async) call
+            return await queryset.aget(pk=pk)
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                _("No %(verbose_name)s found matching the query")
+                % {"verbose_name": queryset.model._meta.verbose_name}
+            )
+
+
+class BookListView(AsyncListMixin, views.BookListView):
+    pass
+
+
+class BookDetailView(AsyncDetailMixin, views.BookDetailView):
+    pass
+
+
+class AuthorListView(AsyncListMixin, views.AuthorListView):
+    pass
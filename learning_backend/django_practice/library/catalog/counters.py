@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, QuerySet, Value
+
+from .models import Author, Book, BookInstance, Genre
+
+COUNTERS_CACHE_KEY = "catalog:counters"
+
+
+def aggregate_counters(queryset: QuerySet, **aggregates) -> QuerySet:
+    """Lazy equivalent of 'queryset.aggregate()' that can be compiled into a larger query."""
+    # grouping by a constant makes Django drop the GROUP BY clause entirely, so the aggregates are
+    # computed over the whole table and an empty table still produces a single row of zeros
+    return (
+        queryset.order_by()
+        .values(_counters=Value(1))
+        .annotate(**aggregates)
+        .values(*aggregates)
+    )
+
+
+def _counter_querysets() -> dict[str, QuerySet]:
+    # one conditional-aggregation queryset per table; 'filter=' compiles to 'COUNT(...) FILTER
+    # (WHERE ...)' on postgres (or an equivalent CASE expression elsewhere), so each table is only
+    # scanned once no matter how many counters it contributes
+    return {
+        "books": aggregate_counters(
+            Book.objects.all(),
+            num_books=Count("pk"),
+            num_books_containing_memor=Count("pk", filter=Q(title__icontains="memor")),
+        ),
+        "instances": aggregate_counters(
+            BookInstance.objects.all(),
+            num_instances=Count("pk"),
+            num_instances_available=Count(
+                "pk", filter=Q(status__exact=BookInstance.LOAN_STATUS.Available)
+            ),
+        ),
+        "authors": aggregate_counters(Author.objects.all(), num_authors=Count("pk")),
+        "genres": aggregate_counters(
+            Genre.objects.all(),
+            num_genre_containing_trash=Count("pk", filter=Q(name__icontains="trash")),
+        ),
+    }
+
+
+def compute_counters() -> dict[str, int]:
+    """Compute every dashboard counter in a single database round trip."""
+    subqueries = []
+    params = []
+    for alias, queryset in _counter_querysets().items():
+        sql, sql_params = queryset.query.sql_with_params()
+        subqueries.append(f"({sql}) AS {connection.ops.quote_name(alias)}")
+        params.extend(sql_params)
+
+    # every subquery returns exactly one row, so cross joining them yields one row holding all the
+    # counters
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM " + " CROSS JOIN ".join(subqueries), params)
+        columns = [column[0] for column in cursor.description]
+        return dict(zip(columns, cursor.fetchone()))
+
+
+def get_counters() -> dict[str, int]:
+    """Return the dashboard counters from the cache, computing them on a miss."""
+    return cache.get_or_set(
+        COUNTERS_CACHE_KEY, compute_counters, timeout=settings.CATALOG_COUNTERS_TIMEOUT
+    )
+
+
+async def aget_counters() -> dict[str, int]:
+    """Async version of 'get_counters()'."""
+    counters = await cache.aget(COUNTERS_CACHE_KEY)
+    if counters is None:
+        # the raw cursor has no async API, so the one query runs in the sync thread
+        counters = await sync_to_async(compute_counters)()
+        await cache.aset(
+            COUNTERS_CACHE_KEY, counters, timeout=settings.CATALOG_COUNTERS_TIMEOUT
+        )
+    return counters
+
+
+def invalidate_counters() -> None:
+    cache.delete(COUNTERS_CACHE_KEY)
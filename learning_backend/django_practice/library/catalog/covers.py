@@ -0,0 +1,247 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from core.storage import direct_upload
+
+from .fragments import bump_model_version
+from .models import MAX_COVER_SIZE, Book
+
+try:
+    # registers an AVIF encoder with Pillow (newer Pillow versions have one built in)
+    import pillow_avif  # type: ignore # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = "cover-images/renditions/"
+
+# Pillow format name, mime type (for <source type>) and encoder options for each output format
+FORMATS = {
+    "avif": ("AVIF", "image/avif", {"quality": 50, "speed": 6}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": (
+        "JPEG",
+        "image/jpeg",
+        {"quality": 82, "optimize": True, "progressive": True},
+    ),
+}
+
+
+def available_formats() -> list[str]:
+    """The configured cover formats that this Pillow build can encode (best first)."""
+    Image.init()
+    return [
+        name
+        for name in settings.CATALOG_COVER_FORMATS
+        if FORMATS[name][0] in Image.SAVE
+    ]
+
+
+def render_renditions(image: Image.Image, source: str, storage: Storage) -> dict:
+    """Save a resized copy of 'image' for every configured width and format.
+
+    Returns {format: [[width, height, name], ...]} with the widths in ascending order. Widths larger
+    than the image itself are skipped (the original size is used instead if they all are).
+    """
+    widths = sorted(w for w in settings.CATALOG_COVER_WIDTHS if w < image.width)
+    widths = widths or [image.width]
+    stem = PurePosixPath(source).stem
+
+    renditions = {}
+    for name in available_formats():
+        pillow_format, _mime_type, options = FORMATS[name]
+        # JPEG has no alpha channel
+        converted = image.convert(
+            "RGBA" if name != "jpeg" and image.mode in ("RGBA", "LA", "P") else "RGB"
+        )
+        renditions[name] = []
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            # 'reducing_gap' downscales in cheap integer steps before the final LANCZOS pass
+            resized = converted.resize(
+                (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+            buffer = BytesIO()
+            resized.save(buffer, pillow_format, **options)
+            # 'generate_filename()' is where UuidNameStorage makes the name unique, and storages
+            # don't call it themselves when saving
+            filename = storage.generate_filename(
+                f"{RENDITIONS_DIR}{stem}_{width}w.{name}"
+            )
+            saved = storage.save(filename, ContentFile(buffer.getvalue()))
+            renditions[name].append([width, height, saved])
+    return renditions
+
+
+def delete_renditions(cover_renditions: dict, storage: Storage) -> None:
+    for entries in cover_renditions.get("formats", {}).values():
+        for _width, _height, name in entries:
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.exception("Could not delete cover rendition %s", name)
+
+
+def prefetch_cover_urls(books) -> None:
+    """Look up the URLs of a page of books' covers and renditions in one go, instead of one by one
+    while the page renders (see 'core.storage.UuidNameStorage.prefetch')."""
+    storage = Book._meta.get_field("cover_image").storage  # type: ignore
+    if not hasattr(storage, "prefetch"):
+        return
+    names = []
+    for book in books:
+        if book.cover_image:
+            names.append(book.cover_image.name)
+            for entries in book.cover_renditions.get("formats", {}).values():
+                names.extend(name for _width, _height, name in entries)
+    storage.prefetch(names, metadata=("url",))
+
+
+def is_cover_stale(book: Book) -> bool:
+    """Whether the book's renditions were made from something other than its current cover."""
+    return book.cover_renditions.get("source", "") != (book.cover_image.name or "")
+
+
+def process_cover(book_id: int, force: bool = False) -> None:
+    """Bring a book's cover renditions (and dimensions) in line with its current cover image."""
+    book = (
+        Book.objects.filter(pk=book_id).only("cover_image", "cover_renditions").first()
+    )
+    if book is None or not (force or is_cover_stale(book)):
+        return
+    source = book.cover_image.name or ""
+
+    storage = book.cover_image.storage
+    renditions, width, height = {}, None, None
+    if source:
+        with book.cover_image.open("rb") as file:
+            image = Image.open(file)
+            # phone photos are often stored sideways with an EXIF rotation tag
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        width, height = image.size
+        renditions = render_renditions(image, source, storage)
+
+    cover_renditions = {"source": source, "formats": renditions}
+    # conditional on the cover, in case it was replaced while this one was being processed (the
+    # replacement has its own job queued)
+    updated = Book.objects.filter(pk=book_id, cover_image=source).update(
+        cover_renditions=cover_renditions,
+        cover_image_width=width,
+        cover_image_height=height,
+    )
+    if updated:
+        delete_renditions(book.cover_renditions, storage)
+        # .update() doesn't send post_save, so cached fragments showing the cover are invalidated
+        # by hand
+        bump_model_version(Book._meta.label)
+    else:
+        delete_renditions(cover_renditions, storage)
+
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _worker_pool() -> ThreadPoolExecutor:
+    # created on first use so each gunicorn worker process (after forking) gets its own threads
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.CATALOG_COVER_WORKERS, thread_name_prefix="covers"
+        )
+    return _executor
+
+
+def _run(book_id: int) -> None:
+    try:
+        process_cover(book_id)
+    except Exception:
+        logger.exception("Processing the cover of book %s failed", book_id)
+    finally:
+        # the pool's threads aren't request threads, so nothing else closes their connections
+        close_old_connections()
+
+
+def schedule_cover_processing(book_id: int) -> None:
+    """Process the book's cover in the background once the current transaction commits.
+
+    With 'settings.CATALOG_COVER_WORKERS' set to 0 it is processed inline instead (after commit as
+    well), which is what tests use.
+    """
+    if settings.CATALOG_COVER_WORKERS == 0:
+        transaction.on_commit(lambda: process_cover(book_id))
+    else:
+        transaction.on_commit(lambda: _worker_pool().submit(_run, book_id))
+
+
+UPLOAD_SALT = "catalog.covers.upload"
+UPLOAD_CONTENT_TYPES = (
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "image/avif",
+    "image/gif",
+)
+
+
+def start_cover_upload(user, filename: str, content_type: str) -> dict:
+    """Where the browser uploads a new cover (see 'core.storage.direct_upload'), plus a "token"
+    for the book form, which 'claim_cover_upload' turns into the cover's name."""
+    if content_type not in UPLOAD_CONTENT_TYPES:
+        raise ValidationError(
+            f"Covers must be one of {', '.join(UPLOAD_CONTENT_TYPES)}",
+            code="cover_image_type",
+        )
+    field = Book._meta.get_field("cover_image")
+    name = field.generate_filename(None, filename)  # type: ignore
+    upload = direct_upload(
+        field.storage,  # type: ignore
+        name,
+        content_type,
+        MAX_COVER_SIZE,
+        settings.CATALOG_COVER_UPLOAD_EXPIRY,
+    )
+    upload["token"] = signing.dumps({"name": name, "user": user.pk}, salt=UPLOAD_SALT)
+    return upload
+
+
+def claim_cover_upload(token: str, user) -> str:
+    """Name of the cover uploaded with 'start_cover_upload', once it's checked to be an image no
+    bigger than the limit (the browser could have uploaded anything)."""
+    try:
+        upload = signing.loads(
+            token, salt=UPLOAD_SALT, max_age=settings.CATALOG_COVER_UPLOAD_EXPIRY
+        )
+    except signing.BadSignature:
+        raise ValidationError("The cover upload expired, please upload it again")
+    if upload["user"] != getattr(user, "pk", None):
+        raise ValidationError("The cover was uploaded by someone else")
+
+    name = upload["name"]
+    storage = Book._meta.get_field("cover_image").storage  # type: ignore
+    if not storage.exists(name):
+        raise ValidationError("The cover upload didn't finish, please upload it again")
+    # nothing else uses a cover that fails these, so it's deleted right away
+    if storage.size(name) > MAX_COVER_SIZE:
+        storage.delete(name)
+        raise ValidationError(
+            "Image file too large: must be less than 1MB", code="cover_image_too_large"
+        )
+    try:
+        with storage.open(name) as file:
+            Image.open(file).verify()
+    except Exception:
+        storage.delete(name)
+        raise ValidationError("The cover isn't a valid image", code="invalid_image")
+    return name
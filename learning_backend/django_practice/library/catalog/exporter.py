@@ -0,0 +1,230 @@
+"""Streaming catalog export (the inverse of 'catalog.importer').
+
+Rows are read with 'QuerySet.iterator(chunk_size=...)', which uses a server-side cursor on postgres
+(and prefetches genres one chunk at a time), and are encoded a chunk at a time, so memory use stays
+the same no matter how many rows are exported.
+"""
+
+import csv
+import io
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Book, BookInstance
+
+try:
+    # only needed for Parquet exports ('poetry install -E parquet')
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = pq = None
+
+# columns of each dataset; the "books" columns are the ones 'import_catalog' reads
+DATASETS = {
+    "books": [
+        "isbn",
+        "title",
+        "summary",
+        "author_first_name",
+        "author_last_name",
+        "author_date_of_birth",
+        "author_date_of_death",
+        "language",
+        "genres",
+    ],
+    "copies": [
+        "id",
+        "isbn",
+        "title",
+        "author_first_name",
+        "author_last_name",
+        "language",
+        "genres",
+        "imprint",
+        "status",
+        "due_back",
+    ],
+}
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+# formats that can't be exported here, with the reason why
+UNAVAILABLE_FORMATS = {}
+if pa is None:
+    del CONTENT_TYPES["parquet"]
+    UNAVAILABLE_FORMATS["parquet"] = (
+        "pyarrow isn't installed ('poetry install -E parquet')"
+    )
+
+
+def _book_columns(book: Book | None) -> dict:
+    author, language = (book.author, book.language) if book else (None, None)
+    return {
+        "author_first_name": author.first_name if author else "",
+        "author_last_name": author.last_name if author else "",
+        "author_date_of_birth": author.date_of_birth if author else None,
+        "author_date_of_death": author.date_of_death if author else None,
+        "language": language.name if language else "",
+        # prefetched, so sorting in python doesn't run a query
+        "genres": sorted(genre.name for genre in book.genre.all()) if book else [],
+    }
+
+
+def book_rows(chunk_size: int) -> Iterator[dict]:
+    books = (
+        Book.objects.select_related("author", "language")
+        .prefetch_related("genre")
+        # cover details aren't exported
+        .defer(
+            "cover_image", "cover_image_width", "cover_image_height", "cover_renditions"
+        )
+        .order_by("pk")
+    )
+    for book in books.iterator(chunk_size=chunk_size):
+        yield {
+            "isbn": book.isbn,
+            "title": book.title,
+            "summary": book.summary,
+            **_book_columns(book),
+        }
+
+
+def copy_rows(chunk_size: int) -> Iterator[dict]:
+    copies = (
+        BookInstance.objects.select_related("book__author", "book__language")
+        .prefetch_related("book__genre")
+        .order_by("pk")
+    )
+    for copy in copies.iterator(chunk_size=chunk_size):
+        book = copy.book
+        yield {
+            "id": copy.id,
+            "isbn": book.isbn if book else "",
+            "title": book.title if book else "",
+            **_book_columns(book),
+            "imprint": copy.imprint,
+            "status": copy.status,
+            "due_back": copy.due_back,
+        }
+
+
+ROWS: dict[str, Callable[[int], Iterator[dict]]] = {
+    "books": book_rows,
+    "copies": copy_rows,
+}
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _csv(columns: list[str], chunks: Iterable[list[dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, columns, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in chunks:
+        for row in chunk:
+            # same separator 'import_catalog' splits on
+            row["genres"] = ";".join(row["genres"])
+            writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # just the header when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _jsonl(columns: list[str], chunks: Iterable[list[dict]]) -> Iterator[bytes]:
+    encoder = DjangoJSONEncoder()
+    for chunk in chunks:
+        yield "".join(
+            encoder.encode({column: row[column] for column in columns}) + "\n"
+            for row in chunk
+        ).encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands over what was written so far, while still reporting the
+    position from the start of the output (parquet records absolute offsets in its footer).
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def _parquet(columns: list[str], chunks: Iterable[list[dict]]) -> Iterator[bytes]:
+    types = {
+        "genres": pa.list_(pa.string()),
+        "author_date_of_birth": pa.date32(),
+        "author_date_of_death": pa.date32(),
+        "due_back": pa.date32(),
+    }
+    schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+    sink = _Sink()
+    # every chunk becomes a row group, whose bytes are handed on as soon as it's written
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            table = pa.Table.from_pylist(
+                [
+                    {
+                        column: str(row[column]) if column == "id" else row[column]
+                        for column in columns
+                    }
+                    for row in chunk
+                ],
+                schema=schema,
+            )
+            writer.write_table(table)
+            yield sink.take()
+    # the footer is written when the writer closes
+    yield sink.take()
+
+
+WRITERS = {"csv": _csv, "jsonl": _jsonl, "parquet": _parquet}
+
+
+def export(dataset: str, format: str, chunk_size: int = 2000) -> Iterator[bytes]:
+    """Encoded export of a dataset ("books" or "copies"), a chunk of rows at a time."""
+    if format in UNAVAILABLE_FORMATS:
+        # raised here rather than once the export has started streaming
+        raise ValueError(f"Can't export {format}: {UNAVAILABLE_FORMATS[format]}")
+    columns = DATASETS[dataset]
+    chunks = _chunks(ROWS[dataset](chunk_size), chunk_size)
+    return WRITERS[format](columns, chunks)
+
+
+async def stream_async(chunks: Iterator[bytes]):
+    """Async iterator over 'chunks', producing each chunk in Django's sync thread.
+
+    Every chunk is made in the same thread (and so on the same database connection), which the
+    server-side cursor behind the export needs.
+    """
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
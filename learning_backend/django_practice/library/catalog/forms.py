@@ -6,6 +6,7 @@ from crispy_forms.layout import Submit
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
+from .covers import claim_cover_upload
 from .models import Book, BookInstance
 
 
@@ -66,8 +67,12 @@ class RenewBookModelForm(forms.ModelForm):
 
 
 class CrispyBookForm(forms.ModelForm):
-    def __init__(self, *args, **kwargs):
+    # set (by 'cover_upload.js') when the cover was uploaded straight to the storage
+    cover_upload = forms.CharField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.user = user
         self.helper = FormHelper()
         # ID and class can be whatever you want
         self.helper.form_id = "book-form"
@@ -87,6 +92,7 @@ class CrispyBookForm(forms.ModelForm):
             "genre",
             "language",
             "cover_image",
+            "cover_upload",
         ]
 
     def clean_summary(self):
@@ -101,8 +107,16 @@ class CrispyBookForm(forms.ModelForm):
             raise forms.ValidationError(_("ISBN must be 13 characters"))
         return data
 
+    def clean_cover_upload(self):
+        token = self.cleaned_data["cover_upload"]
+        return claim_cover_upload(token, self.user) if token else ""
+
     @override
     def clean(self) -> dict[str, Any]:
+        if self.cleaned_data.get("cover_upload"):
+            # saved as the cover image's name, like the name of a file uploaded with the form
+            self.cleaned_data["cover_image"] = self.cleaned_data["cover_upload"]
+
         # for accessibility, this puts all errors at the top of the form, in addition to next to
         # their respective inputs
         error_list = []
@@ -0,0 +1,60 @@
+import hashlib
+import time
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Model
+
+VERSION_KEY_PREFIX = "catalog:fragments:version:"
+FRAGMENT_KEY_PREFIX = "catalog:fragments:"
+
+
+def fragment_cache():
+    return caches[settings.CATALOG_FRAGMENT_CACHE]
+
+
+def _version_key(label: str) -> str:
+    return VERSION_KEY_PREFIX + label.lower()
+
+
+def model_versions(labels: Iterable[str]) -> dict[str, int]:
+    """Current version counter of each model (e.g. "catalog.Book"), in one cache round trip."""
+    cache = fragment_cache()
+    keys = {_version_key(label): label for label in labels}
+    versions = cache.get_many(keys.keys())
+    for key in keys.keys() - versions.keys():
+        # starting from the current time (instead of 1) means a counter that was evicted can never
+        # come back with a value that old fragments were cached under
+        cache.add(key, time.time_ns(), timeout=None)
+        versions[key] = cache.get(key)
+    return {label: versions[key] for key, label in keys.items()}
+
+
+def bump_model_version(label: str) -> None:
+    """Invalidate every fragment that depends on the model (the old keys simply expire)."""
+    cache = fragment_cache()
+    key = _version_key(label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # not set yet, so nothing can have been cached under it
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def _identity(value) -> str:
+    if isinstance(value, Model):
+        return f"{value._meta.label_lower}:{value.pk}"
+    # querysets, lists and paginator pages are keyed by the objects in them
+    if isinstance(value, Iterable) and not isinstance(value, (str, bytes, dict)):
+        return "[" + ",".join(_identity(item) for item in value) + "]"
+    return str(value)
+
+
+def fragment_key(name: str, depends: Iterable[str], vary_on: Iterable) -> str:
+    """Cache key for a fragment that changes with the given objects and model versions."""
+    versions = model_versions(sorted(set(depends)))
+    parts = [name, *(f"{label}={version}" for label, version in versions.items())]
+    parts.extend(_identity(value) for value in vary_on)
+    digest = hashlib.md5("|".join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f"{FRAGMENT_KEY_PREFIX}{name}:{digest}"
@@ -0,0 +1,299 @@
+"""Bulk catalog import: streams book records and upserts them in batches.
+
+A record is one book with its (denormalised) author, language, genres and copies:
+
+    isbn, title, summary, author_first_name, author_last_name, author_date_of_birth,
+    author_date_of_death, language, genres, copies, imprint, status
+
+In CSV, 'genres' are separated by ';' and 'copies' is a number of copies (all with the row's
+'imprint' and 'status'). In JSONL, 'genres' is a list and 'copies' is either a number or a list of
+{"id", "imprint", "status", "due_back"} objects. Copies without an id get one derived from the ISBN
+and their position, so importing the same file twice updates the copies instead of duplicating them.
+"""
+
+import csv
+import datetime
+import json
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import IO
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .counters import invalidate_counters
+from .fragments import bump_model_version
+from .models import Author, Book, BookInstance, Genre, Language
+from .search import reindex_books
+
+# namespace for the ids of copies that don't have one in the input
+COPY_ID_NAMESPACE = uuid.UUID("5d0c1a53-3e0f-4c4e-9f43-0f4e7b0a8a11")
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def read_records(file: IO[str], format: str) -> Iterator[dict]:
+    """Yield the raw records of a CSV or JSONL file one at a time."""
+    if format == "csv":
+        yield from csv.DictReader(file)
+    elif format == "jsonl":
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown format: {format}")
+
+
+def _text(record: dict, key: str) -> str:
+    value = record.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _date(record: dict, key: str) -> datetime.date | None:
+    value = _text(record, key)
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        raise InvalidRecord(f"{key} is not an ISO date: {value!r}")
+
+
+def clean_record(record: dict) -> dict:
+    """Normalise a raw record, raising InvalidRecord if it can't be imported."""
+    isbn = _text(record, "isbn")
+    title = _text(record, "title")
+    if not isbn or len(isbn) > 13:
+        raise InvalidRecord(f"invalid ISBN: {isbn!r}")
+    if not title:
+        raise InvalidRecord(f"missing title for ISBN {isbn}")
+
+    genres = record.get("genres") or []
+    if isinstance(genres, str):
+        genres = genres.split(";")
+    genres = [name.strip() for name in genres if name and name.strip()]
+
+    copies = record.get("copies") or []
+    if not isinstance(copies, list):
+        try:
+            count = int(copies)
+        except ValueError:
+            raise InvalidRecord(f"copies is not a number: {copies!r}")
+        copies = [{} for _ in range(count)]
+    cleaned_copies = []
+    for position, copy in enumerate(copies):
+        status = _text(copy, "status") or _text(record, "status")
+        if status and status not in BookInstance.LOAN_STATUS.values:
+            raise InvalidRecord(f"unknown status {status!r} for ISBN {isbn}")
+        copy_id = _text(copy, "id")
+        try:
+            copy_id = (
+                uuid.UUID(copy_id)
+                if copy_id
+                else uuid.uuid5(COPY_ID_NAMESPACE, f"{isbn}/{position}")
+            )
+        except ValueError:
+            raise InvalidRecord(f"copy id is not a UUID: {copy_id!r}")
+        cleaned_copies.append(
+            {
+                "id": copy_id,
+                "imprint": _text(copy, "imprint") or _text(record, "imprint"),
+                "status": status or BookInstance.LOAN_STATUS.Maintenance,
+                "due_back": _date(copy, "due_back"),
+            }
+        )
+
+    first_name = _text(record, "author_first_name")
+    last_name = _text(record, "author_last_name")
+    return {
+        "isbn": isbn,
+        "title": title,
+        "summary": _text(record, "summary"),
+        "author": (first_name, last_name) if first_name or last_name else None,
+        "author_date_of_birth": _date(record, "author_date_of_birth"),
+        "author_date_of_death": _date(record, "author_date_of_death"),
+        "language": _text(record, "language") or None,
+        "genres": genres,
+        "copies": cleaned_copies,
+    }
+
+
+@dataclass
+class ImportStats:
+    records: int = 0
+    books: int = 0
+    copies: int = 0
+    skipped: int = 0
+
+
+class CatalogImporter:
+    """Upserts cleaned records a batch at a time, each batch in its own transaction.
+
+    Memory use only depends on the batch size: nothing from previous batches is kept except a
+    bounded cache of author ids (authors have no unique key, so they're looked up by name).
+    """
+
+    def __init__(self, author_cache_size: int = 10_000):
+        self.stats = ImportStats()
+        self._authors: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self._author_cache_size = author_cache_size
+
+    def import_batch(self, records: Iterable[dict]) -> list[int]:
+        """Upsert a batch of cleaned records, returning the ids of the books in it."""
+        # a later record for the same ISBN wins (postgres refuses to upsert a row twice in one
+        # statement)
+        records = list({record["isbn"]: record for record in records}.values())
+        if not records:
+            return []
+
+        with transaction.atomic():
+            authors = self._author_ids(records)
+            languages = self._language_ids(records)
+            genres = self._genre_ids(records)
+
+            Book.objects.bulk_create(
+                [
+                    Book(
+                        isbn=record["isbn"],
+                        title=record["title"],
+                        summary=record["summary"],
+                        author_id=authors.get(record["author"]),
+                        language_id=languages.get(record["language"]),
+                    )
+                    for record in records
+                ],
+                update_conflicts=True,
+                unique_fields=["isbn"],
+                update_fields=["title", "summary", "author", "language"],
+            )
+            # not every backend returns the ids of updated rows, so they're looked up
+            book_ids = dict(
+                Book.objects.filter(
+                    isbn__in=[record["isbn"] for record in records]
+                ).values_list("isbn", "pk")
+            )
+
+            # the input is the whole truth about a book's genres, so they're replaced
+            Through = Book.genre.through
+            Through.objects.filter(book_id__in=book_ids.values()).delete()
+            Through.objects.bulk_create(
+                [
+                    Through(book_id=book_id, genre_id=genre_id)
+                    for book_id, genre_id in {
+                        (book_ids[record["isbn"]], genres[name.lower()])
+                        for record in records
+                        for name in record["genres"]
+                    }
+                ]
+            )
+
+            copies = {
+                copy["id"]: BookInstance(book_id=book_ids[record["isbn"]], **copy)
+                for record in records
+                for copy in record["copies"]
+            }
+            BookInstance.objects.bulk_create(
+                copies.values(),
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=["book", "imprint", "status", "due_back"],
+            )
+
+            # bulk operations don't send the signals that keep the search index up to date
+            reindex_books(book_ids.values())
+
+        self.stats.records += len(records)
+        self.stats.books += len(book_ids)
+        self.stats.copies += len(copies)
+        return list(book_ids.values())
+
+    def finish(self) -> None:
+        """Invalidate what the skipped model signals would have (call once at the end)."""
+        invalidate_counters()
+        for model in (Author, Language, Genre, Book, BookInstance):
+            bump_model_version(model._meta.label)
+
+    def _author_ids(self, records: list[dict]) -> dict[tuple[str, str], int]:
+        details = {}
+        for record in records:
+            if record["author"]:
+                dates = details.setdefault(record["author"], {})
+                if record["author_date_of_birth"]:
+                    dates["date_of_birth"] = record["author_date_of_birth"]
+                if record["author_date_of_death"]:
+                    dates["date_of_death"] = record["author_date_of_death"]
+
+        ids = {}
+        missing = set()
+        created = set()
+        for name in details:
+            if name in self._authors:
+                self._authors.move_to_end(name)
+                ids[name] = self._authors[name]
+            else:
+                missing.add(name)
+
+        if missing:
+            # a superset of the missing names (every first name x every last name), narrowed down
+            # in python; the lowest id wins if there are duplicate authors
+            candidates = Author.objects.filter(
+                first_name__in={first for first, _last in missing},
+                last_name__in={last for _first, last in missing},
+            ).order_by("-pk")
+            for author in candidates.values_list("first_name", "last_name", "pk"):
+                if author[:2] in missing:
+                    ids[author[:2]] = author[2]
+            new = [
+                Author(first_name=first, last_name=last, **details[(first, last)])
+                for first, last in missing
+                if (first, last) not in ids
+            ]
+            for author in Author.objects.bulk_create(new):
+                ids[(author.first_name, author.last_name)] = author.pk
+                created.add((author.first_name, author.last_name))
+
+        # only authors that already existed (cached or not) can have outdated dates
+        changed = []
+        for name, dates in details.items():
+            if dates and name not in created:
+                changed.append(Author(pk=ids[name], **dates))
+        for field in ("date_of_birth", "date_of_death"):
+            to_update = [author for author in changed if getattr(author, field)]
+            if to_update:
+                Author.objects.bulk_update(to_update, [field])
+
+        for name, pk in ids.items():
+            self._authors[name] = pk
+        while len(self._authors) > self._author_cache_size:
+            self._authors.popitem(last=False)
+        return ids
+
+    def _language_ids(self, records: list[dict]) -> dict[str, int]:
+        names = {record["language"] for record in records if record["language"]}
+        if not names:
+            return {}
+        Language.objects.bulk_create(
+            [Language(name=name) for name in names], ignore_conflicts=True
+        )
+        return dict(Language.objects.filter(name__in=names).values_list("name", "pk"))
+
+    def _genre_ids(self, records: list[dict]) -> dict[str, int]:
+        """Ids of the batch's genres, keyed by lower case name."""
+        # the first spelling seen is the one created; existing genres keep theirs
+        names = {}
+        for record in records:
+            for name in record["genres"]:
+                names.setdefault(name.lower(), name)
+        if not names:
+            return {}
+        # 'ON CONFLICT DO NOTHING' also covers the case-insensitive unique constraint
+        Genre.objects.bulk_create(
+            [Genre(name=name) for name in names.values()], ignore_conflicts=True
+        )
+        return dict(
+            Genre.objects.annotate(lower_name=Lower("name"))
+            .filter(lower_name__in=names.keys())
+            .values_list("lower_name", "pk")
+        )
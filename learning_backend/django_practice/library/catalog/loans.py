@@ -0,0 +1,167 @@
+"""Loan state machine: checking out, returning, renewing and reserving copies of books.
+
+    Available --reserve--> Reserved --checkout (same borrower)--> On loan --return--> Available
+    Available --checkout--> On loan --renew--> On loan
+
+Every operation takes a batch of copy ids and runs in a single transaction: the copies are locked
+('SELECT ... FOR UPDATE', in primary key order so concurrent batches can't deadlock), checked
+against the transition, and the ones allowed to change are written with one UPDATE of just the
+changed columns. Copies that can't change are reported back instead of failing the whole batch.
+"""
+
+import datetime
+import uuid
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .counters import invalidate_counters
+from .fragments import bump_model_version
+from .models import BookInstance
+
+STATUS = BookInstance.LOAN_STATUS
+
+# same default as the renewal forms
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+
+@dataclass
+class LoanResult:
+    # copies that were changed
+    changed: list[uuid.UUID] = field(default_factory=list)
+    # copies that weren't, with the reason why
+    skipped: dict[uuid.UUID, str] = field(default_factory=dict)
+
+
+def default_due_date() -> datetime.date:
+    return datetime.date.today() + LOAN_PERIOD
+
+
+def _describe(status: str) -> str:
+    # 'status' is allowed to be blank
+    if status not in STATUS.values:
+        return "has no status"
+    return f"is {STATUS(status).label.lower()}"
+
+
+def _invalidate() -> None:
+    # queryset .update() doesn't send the signals that normally do this
+    invalidate_counters()
+    bump_model_version(BookInstance._meta.label)
+
+
+def _transition(
+    copy_ids: Iterable,
+    allowed: Callable[[str, int | None], bool],
+    changes: dict,
+    skip_locked: bool,
+) -> LoanResult:
+    """Apply 'changes' to the copies whose (status, borrower id) are 'allowed' to change."""
+    ids = sorted({uuid.UUID(str(copy_id)) for copy_id in copy_ids})
+    result = LoanResult()
+    if not ids:
+        return result
+
+    with transaction.atomic():
+        # with 'skip_locked', copies locked by another transaction are left out (and reported as
+        # busy) instead of waiting for that transaction to finish
+        rows = (
+            BookInstance.objects.select_for_update(skip_locked=skip_locked)
+            .filter(pk__in=ids)
+            .order_by("pk")
+            .values_list("pk", "status", "borrower_id")
+        )
+        for pk, status, borrower_id in rows:
+            if allowed(status, borrower_id):
+                result.changed.append(pk)
+            else:
+                result.skipped[pk] = _describe(status)
+
+        absent = set(ids) - set(result.changed) - result.skipped.keys()
+        if absent:
+            # only copies that exist can have been skipped for being locked
+            busy = set(
+                BookInstance.objects.filter(pk__in=absent).values_list("pk", flat=True)
+            )
+            for pk in sorted(absent):
+                result.skipped[pk] = (
+                    "is being changed by someone else"
+                    if pk in busy
+                    else "doesn't exist"
+                )
+
+        if result.changed:
+            BookInstance.objects.filter(pk__in=result.changed).update(**changes)
+            transaction.on_commit(_invalidate)
+    return result
+
+
+def checkout_copies(
+    copy_ids: Iterable,
+    borrower,
+    due_back: datetime.date | None = None,
+    *,
+    skip_locked: bool = False,
+) -> LoanResult:
+    """Lend available copies (or copies reserved for the same borrower) to 'borrower'."""
+    return _transition(
+        copy_ids,
+        lambda status, borrower_id: status == STATUS.Available
+        or (status == STATUS.Reserved and borrower_id == borrower.pk),
+        {
+            "status": STATUS.OnLoan,
+            "borrower": borrower,
+            "due_back": due_back or default_due_date(),
+        },
+        skip_locked,
+    )
+
+
+def return_copies(copy_ids: Iterable, *, skip_locked: bool = False) -> LoanResult:
+    """Make copies that were on loan available again."""
+    return _transition(
+        copy_ids,
+        lambda status, borrower_id: status == STATUS.OnLoan,
+        {"status": STATUS.Available, "borrower": None, "due_back": None},
+        skip_locked,
+    )
+
+
+def renew_copies(
+    copy_ids: Iterable, due_back: datetime.date, *, skip_locked: bool = False
+) -> LoanResult:
+    """Move the due date of copies that are on loan."""
+    return _transition(
+        copy_ids,
+        lambda status, borrower_id: status == STATUS.OnLoan,
+        {"due_back": due_back},
+        skip_locked,
+    )
+
+
+def set_copies_status(
+    copy_ids: Iterable, status: str, *, skip_locked: bool = False
+) -> LoanResult:
+    """Take copies that aren't lent or reserved out of circulation (Maintenance), or put them
+    back (Available)."""
+    if status not in (STATUS.Available, STATUS.Maintenance):
+        raise ValueError(f"Copies can't be set to {status!r} directly")
+    return _transition(
+        copy_ids,
+        lambda current, borrower_id: current not in (STATUS.OnLoan, STATUS.Reserved),
+        {"status": status, "borrower": None, "due_back": None},
+        skip_locked,
+    )
+
+
+def reserve_copies(
+    copy_ids: Iterable, borrower, *, skip_locked: bool = False
+) -> LoanResult:
+    """Hold available copies for 'borrower' until they check them out."""
+    return _transition(
+        copy_ids,
+        lambda status, borrower_id: status == STATUS.Available,
+        {"status": STATUS.Reserved, "borrower": borrower, "due_back": None},
+        skip_locked,
+    )
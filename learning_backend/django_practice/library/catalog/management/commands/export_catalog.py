@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.exporter import CONTENT_TYPES, DATASETS, UNAVAILABLE_FORMATS, export
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the whole catalog (books, or copies of books) with author, language and genre "
+        "names as CSV, JSONL or Parquet, streaming it in constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=list(DATASETS))
+        parser.add_argument(
+            "--format", choices=[*CONTENT_TYPES, *UNAVAILABLE_FORMATS], default="csv"
+        )
+        parser.add_argument(
+            "--output", "-o", default="-", help="File to write to ('-' for stdout)"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched from the database (and encoded) at a time",
+        )
+
+    def handle(self, *args, **options):
+        format = options["format"]
+        if format in UNAVAILABLE_FORMATS:
+            raise CommandError(f"Can't export {format}: {UNAVAILABLE_FORMATS[format]}")
+        start = time.monotonic()
+        size = 0
+        output = options["output"]
+        file = sys.stdout.buffer if output == "-" else open(output, "wb")
+        try:
+            for chunk in export(options["dataset"], format, options["chunk_size"]):
+                file.write(chunk)
+                size += len(chunk)
+        finally:
+            if file is not sys.stdout.buffer:
+                file.close()
+        # stdout may be the export itself
+        self.stderr.write(
+            f"Wrote {size / 1024:.0f} KiB in {time.monotonic() - start:.1f}s",
+            style_func=self.style.SUCCESS,
+        )
@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import CatalogImporter, InvalidRecord, clean_record, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream books (with their authors, languages, genres and copies) from a CSV or JSONL file "
+        "into the catalog, upserting in batches. See 'catalog.importer' for the record format."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="CSV/JSONL file (optionally .gz), or '-' for stdin"
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format (defaults to the file extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Records upserted per transaction",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Progress file for resuming (defaults to '<path>.progress'; not used for stdin)",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and import from the beginning",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or self.guess_format(path)
+        checkpoint = (
+            None if path == "-" else (options["checkpoint"] or f"{path}.progress")
+        )
+
+        skip = 0
+        if checkpoint and not options["restart"]:
+            skip = self.read_checkpoint(checkpoint, path)
+            if skip:
+                self.stdout.write(f"Resuming after record {skip}")
+
+        importer = CatalogImporter()
+        start = time.monotonic()
+        position = skip
+        with self.open(path) as file:
+            records = islice(read_records(file, format), skip, None)
+            while batch := list(islice(records, options["batch_size"])):
+                cleaned = []
+                for offset, record in enumerate(batch, start=position + 1):
+                    try:
+                        cleaned.append(clean_record(record))
+                    except InvalidRecord as e:
+                        importer.stats.skipped += 1
+                        self.stderr.write(f"Skipping record {offset}: {e}")
+                importer.import_batch(cleaned)
+                position += len(batch)
+                # only written after the batch's transaction committed, so resuming never skips a
+                # record (at worst a batch is upserted twice, which changes nothing)
+                if checkpoint:
+                    self.write_checkpoint(checkpoint, path, position)
+
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f"{position} records, {importer.stats.books} books, "
+                    f"{importer.stats.copies} copies "
+                    f"({(position - skip) / elapsed:.0f} records/s)"
+                )
+
+        importer.finish()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        stats = importer.stats
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats.books} books and {stats.copies} copies from "
+                f"{stats.records} records ({stats.skipped} skipped) in "
+                f"{time.monotonic() - start:.1f}s"
+            )
+        )
+
+    def guess_format(self, path: str) -> str:
+        name = path.removesuffix(".gz")
+        if name.endswith(".csv"):
+            return "csv"
+        if name.endswith((".jsonl", ".ndjson")):
+            return "jsonl"
+        raise CommandError("Can't tell the format from the file name; pass --format")
+
+    def open(self, path: str):
+        if path == "-":
+            return sys.stdin
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8", newline="")
+        return open(path, encoding="utf-8", newline="")
+
+    def read_checkpoint(self, checkpoint: str, path: str) -> int:
+        try:
+            with open(checkpoint) as file:
+                progress = json.load(file)
+        except FileNotFoundError:
+            return 0
+        # a different file under the same name would resume at a meaningless position
+        if progress["size"] != os.path.getsize(path):
+            raise CommandError(
+                f"{path} changed since {checkpoint} was written; pass --restart to import it "
+                "from the beginning"
+            )
+        return progress["records"]
+
+    def write_checkpoint(self, checkpoint: str, path: str, records: int) -> None:
+        # written to a temporary file and renamed, so an interruption can't leave it half written
+        with open(f"{checkpoint}.tmp", "w") as file:
+            json.dump({"size": os.path.getsize(path), "records": records}, file)
+        os.replace(f"{checkpoint}.tmp", checkpoint)
@@ -0,0 +1,242 @@
+import datetime
+import json
+import random
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min, Q
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from catalog.models import Book, BookInstance
+from core.loadtest import LoadResult, Target, run_load, start_gunicorn, wait_for_server
+
+TARGETS = ["books", "book_detail", "all_borrowed", "my_borrowed", "renew"]
+PERCENTILES = [50, 90, 95, 99]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the catalog (book list and detail pages, loan lists and renewals) at a given "
+        "concurrency and report throughput and latency percentiles per endpoint. Run it against "
+        "a seeded database (see 'seed_catalog'), either on a server started by the command or "
+        "an already running one (--url)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server (by default gunicorn is started on --port)",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="gunicorn worker processes (when the command starts the server)",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=16, help="Simultaneous clients"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Requests measured"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=100, help="Unmeasured requests sent first"
+        )
+        parser.add_argument(
+            "--targets",
+            nargs="+",
+            choices=TARGETS,
+            default=TARGETS,
+            help="Endpoints to load",
+        )
+        parser.add_argument(
+            "--user",
+            help="Reader whose loans 'my_borrowed' lists (defaults to one with loans)",
+        )
+        parser.add_argument(
+            "--librarian",
+            help="User allowed to see all loans and renew them (defaults to one with the "
+            "'can_mark_returned' permission)",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=50,
+            help="Number of different books/copies the detail and renewal requests go to",
+        )
+        parser.add_argument(
+            "--json", help="Also write the results to this file (for comparing runs)"
+        )
+
+    def handle(self, *args, **options):
+        targets = [
+            target
+            for target in self.targets(options)
+            if target.name in options["targets"]
+        ]
+
+        server = None
+        base_url = options["url"]
+        if not base_url:
+            server = start_gunicorn(
+                settings.BASE_DIR, options["port"], options["workers"]
+            )
+            base_url = f"http://127.0.0.1:{options['port']}"
+        try:
+            wait_for_server(base_url + reverse("catalog:books"))
+            run_load(base_url, targets, options["concurrency"], options["warmup"])
+            result = run_load(
+                base_url, targets, options["concurrency"], options["requests"]
+            )
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.report(result)
+        if options["json"]:
+            with open(options["json"], "w") as file:
+                json.dump(self.summary(result, options), file, indent=2)
+
+    def report(self, result: LoadResult) -> None:
+        header = f"{'endpoint':<14} {'requests':>9} {'req/s':>9}"
+        header += "".join(f" {f'p{pct} ms':>9}" for pct in PERCENTILES)
+        self.stdout.write(header + f" {'errors':>7}")
+        for stats in [*result.stats.values(), result.total]:
+            line = (
+                f"{stats.name:<14} {stats.requests:>9} {result.throughput(stats):>9.1f}"
+            )
+            line += "".join(
+                f" {stats.percentile(pct) * 1000:>9.1f}" for pct in PERCENTILES
+            )
+            self.stdout.write(line + f" {stats.errors:>7}")
+
+    def summary(self, result: LoadResult, options: dict) -> dict:
+        return {
+            "date": datetime.datetime.now().isoformat(),
+            "concurrency": options["concurrency"],
+            "requests": options["requests"],
+            "elapsed": result.elapsed,
+            "endpoints": {
+                stats.name: {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "throughput": result.throughput(stats),
+                    **{
+                        f"p{pct}_ms": stats.percentile(pct) * 1000
+                        for pct in PERCENTILES
+                    },
+                }
+                for stats in [*result.stats.values(), result.total]
+            },
+        }
+
+    def targets(self, options) -> list[Target]:
+        sample = options["sample"]
+        books = self.sample_books(sample)
+        copies = list(
+            BookInstance.objects.filter(status=BookInstance.LOAN_STATUS.OnLoan)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:sample]
+        )
+        if not books or not copies:
+            raise CommandError(
+                "Needs books and loans to test against; run seed_catalog"
+            )
+
+        reader = self.session_headers(self.get_reader(options["user"]))
+        librarian = self.session_headers(self.get_librarian(options["librarian"]))
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        renew_paths = [
+            reverse("catalog:renew_book_librarian", args=[pk]) for pk in copies
+        ]
+        detail_paths = [reverse("catalog:book_detail", args=[pk]) for pk in books]
+        return [
+            Target("books", reverse("catalog:books")),
+            Target("book_detail", detail_paths[0], more_paths=detail_paths[1:]),
+            Target("all_borrowed", reverse("catalog:all_borrowed"), headers=librarian),
+            Target("my_borrowed", reverse("catalog:my_borrowed"), headers=reader),
+            Target(
+                "renew",
+                renew_paths[0],
+                method="POST",
+                body=urlencode(
+                    {
+                        "renewal_date": renewal_date.isoformat(),
+                        "csrfmiddlewaretoken": librarian["X-CSRFToken"],
+                    }
+                ).encode(),
+                headers={
+                    **librarian,
+                    "Content-Type": "application/x-www-form-urlencoded",
+                },
+                more_paths=renew_paths[1:],
+            ),
+        ]
+
+    def sample_books(self, count: int) -> list[int]:
+        # random ids between the lowest and highest (ORDER BY random() would sort every book)
+        bounds = Book.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            return []
+        ids = random.Random(0).sample(
+            range(bounds["low"], bounds["high"] + 1),
+            min(count * 2, bounds["high"] - bounds["low"] + 1),
+        )
+        return list(
+            Book.objects.filter(pk__in=ids).values_list("pk", flat=True)[:count]
+        )
+
+    def get_reader(self, username: str | None):
+        User = get_user_model()
+        if username:
+            return self.get_user(username)
+        user = User.objects.filter(
+            bookinstance__status=BookInstance.LOAN_STATUS.OnLoan
+        ).first()
+        if user is None:
+            raise CommandError("No user has loans; run seed_catalog or pass --user")
+        return user
+
+    def get_librarian(self, username: str | None):
+        User = get_user_model()
+        if username:
+            return self.get_user(username)
+        permission = Q(
+            user_permissions__codename="can_mark_returned",
+            user_permissions__content_type__app_label="catalog",
+        )
+        user = User.objects.filter(permission | Q(is_superuser=True)).first()
+        if user is None:
+            raise CommandError(
+                "No user can renew loans; run seed_catalog or pass --librarian"
+            )
+        return user
+
+    def get_user(self, username: str):
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {username}")
+
+    def session_headers(self, user) -> dict[str, str]:
+        """Cookie (and CSRF token) headers of a logged in session for 'user'.
+
+        The session is created directly in the session store, which the server has to share
+        (database or redis sessions, not a per-process cache).
+        """
+        client = Client()
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        # CSRF only compares the cookie with the submitted token, so any well-formed secret works
+        csrf = get_random_string(32)
+        return {
+            "Cookie": f"{settings.SESSION_COOKIE_NAME}={session}; "
+            f"{settings.CSRF_COOKIE_NAME}={csrf}",
+            "X-CSRFToken": csrf,
+        }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalog.covers import is_cover_stale, process_cover
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the resized cover renditions for books whose renditions are missing or out of "
+        "date (e.g. existing covers, or uploads whose background job was lost to a restart)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate every cover (e.g. after changing the widths/formats)",
+        )
+
+    def handle(self, *args, **options):
+        books = Book.objects.only("cover_image", "cover_renditions").order_by("pk")
+        count = 0
+        for book in books.iterator():
+            if (options["all"] and book.cover_image) or is_cover_stale(book):
+                process_cover(book.pk, force=options["all"])
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} covers"))
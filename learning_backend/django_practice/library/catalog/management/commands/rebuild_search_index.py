@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import reindex_all_books
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalog search index for every book (e.g. after bulk imports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of books to reindex per query",
+        )
+
+    def handle(self, *args, **options):
+        count = reindex_all_books(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} books"))
@@ -0,0 +1,44 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from catalog.overdue import scan_overdue
+
+
+class Command(BaseCommand):
+    help = (
+        "Email a reminder to every borrower with overdue loans (one email per borrower) and "
+        "record the run in 'catalog.OverdueScan'. Meant to be run daily by a scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Emails sent per batch over the mail connection",
+        )
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            help="Count loans due before this date as overdue (defaults to today)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the overdue loans without sending anything",
+        )
+
+    def handle(self, *args, **options):
+        scan = scan_overdue(
+            today=options["date"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{scan.overdue_loans} overdue loans of {scan.borrowers} borrowers: "
+                f"{scan.emails_sent} emails sent, {scan.emails_failed} failed, "
+                f"{scan.unreachable} unreachable ({scan.duration.total_seconds():.1f}s)"
+            )
+        )
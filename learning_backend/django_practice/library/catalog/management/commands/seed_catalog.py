@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.seeding import CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the catalog with random (but reproducible) books, authors, copies, loans and "
+        "users for performance testing. Seeded users are '<prefix>-reader-<n>' plus a "
+        "'<prefix>-librarian' who can see and renew every loan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--copies-per-book", type=int, default=3)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed (same seed, same data)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Books inserted per transaction",
+        )
+        parser.add_argument(
+            "--prefix", default="seed", help="Prefix of the seeded usernames"
+        )
+        parser.add_argument(
+            "--password", default="password", help="Password of every seeded user"
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+
+        def progress(stats):
+            self.stdout.write(
+                f"{stats.books}/{options['books']} books, {stats.copies} copies "
+                f"({stats.books / (time.monotonic() - start):.0f} books/s)"
+            )
+
+        seeder = CatalogSeeder(
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            prefix=options["prefix"],
+            password=options["password"],
+            progress=progress,
+        )
+        stats = seeder.seed(
+            options["books"], options["copies_per_book"], options["users"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {stats.books} books by {stats.authors} authors, {stats.copies} copies "
+                f"({stats.loans} on loan) and {stats.users} users in "
+                f"{time.monotonic() - start:.1f}s"
+            )
+        )
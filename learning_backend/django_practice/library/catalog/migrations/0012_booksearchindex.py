@@ -0,0 +1,82 @@
+# Generated by Django 5.0.4 on 2026-10-18 14:41
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+POSTGRES_INDEXES = [
+    (
+        "catalog_booksearchindex_vector_gin",
+        "CREATE INDEX catalog_booksearchindex_vector_gin ON catalog_booksearchindex "
+        "USING gin (search_vector)",
+    ),
+    # trigram indexes back the typo-tolerant search mode ('%>' operator)
+    (
+        "catalog_booksearchindex_title_trgm",
+        "CREATE INDEX catalog_booksearchindex_title_trgm ON catalog_booksearchindex "
+        "USING gin (title gin_trgm_ops)",
+    ),
+    (
+        "catalog_booksearchindex_authors_trgm",
+        "CREATE INDEX catalog_booksearchindex_authors_trgm ON catalog_booksearchindex "
+        "USING gin (authors gin_trgm_ops)",
+    ),
+]
+
+# operator classes (trigram) and a GIN index on a column Django only knows as a
+# SearchVectorField are simpler to write as SQL than to declare in Meta.indexes
+def create_search_indexes(apps, schema_editor):
+    for _name, sql in POSTGRES_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    for name, _sql in POSTGRES_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+# existing books, which are otherwise only indexed when saved (or by 'rebuild_search_index')
+def index_existing_books(apps, schema_editor):
+    from catalog.search import reindex_all_books
+
+    reindex_all_books(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_alter_book_cover_image_height_and_more"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name="BookSearchIndex",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="catalog.book",
+                    ),
+                ),
+                ("title", models.TextField()),
+                ("authors", models.TextField(blank=True)),
+                ("genres", models.TextField(blank=True)),
+                ("summary", models.TextField(blank=True)),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        editable=False, null=True
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        # nothing to undo: the table is dropped with the model
+        migrations.RunPython(index_existing_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_booksearchindex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="cover_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="cover_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                upload_to="cover-images/",
+                verbose_name="Cover Image",
+            ),
+        ),
+    ]
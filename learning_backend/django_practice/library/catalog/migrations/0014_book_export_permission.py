@@ -0,0 +1,20 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_book_cover_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={
+                "base_manager_name": "prefetch_manager",
+                "permissions": (("can_export_catalog", "Export the whole catalog"),),
+            },
+        ),
+    ]
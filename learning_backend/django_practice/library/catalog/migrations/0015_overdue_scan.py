@@ -0,0 +1,49 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_book_export_permission"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OverdueScan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started_at", models.DateTimeField()),
+                ("duration", models.DurationField(null=True)),
+                ("overdue_loans", models.PositiveIntegerField(default=0)),
+                ("borrowers", models.PositiveIntegerField(default=0)),
+                ("unreachable", models.PositiveIntegerField(default=0)),
+                ("emails_sent", models.PositiveIntegerField(default=0)),
+                ("emails_failed", models.PositiveIntegerField(default=0)),
+                ("dry_run", models.BooleanField(default=False)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+                "get_latest_by": "started_at",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="bookinstance",
+            index=models.Index(
+                condition=models.Q(("status", "o")),
+                fields=["due_back"],
+                name="bookinstance_on_loan_due_idx",
+            ),
+        ),
+    ]
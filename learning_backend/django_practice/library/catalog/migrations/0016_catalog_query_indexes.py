@@ -0,0 +1,53 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:08
+
+from django.conf import settings
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # indexes are built concurrently (so the tables stay writable), which can't happen inside a
+    # transaction
+    atomic = False
+
+    dependencies = [
+        ("catalog", "0015_overdue_scan"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="author",
+            index=models.Index(
+                fields=["last_name", "first_name", "id"], name="author_name_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="book",
+            index=models.Index(fields=["-title", "id"], name="book_title_desc_idx"),
+        ),
+        # the widened index is built before the one it replaces is dropped, so copies on loan are
+        # never left without an index
+        AddIndexConcurrently(
+            model_name="bookinstance",
+            index=models.Index(
+                condition=models.Q(("status", "o")),
+                fields=["due_back", "id"],
+                name="bookinstance_on_loan_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="bookinstance",
+            name="bookinstance_on_loan_due_idx",
+        ),
+        AddIndexConcurrently(
+            model_name="bookinstance",
+            index=models.Index(
+                fields=["borrower", "status", "due_back", "id"],
+                name="bookinstance_borrower_idx",
+            ),
+        ),
+    ]
@@ -4,6 +4,7 @@ from typing import override
 
 import auto_prefetch
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import UniqueConstraint
@@ -44,6 +45,10 @@ class Genre(ExportModelOperationsMixin("genre"), models.Model):
         ]
 
 
+# largest cover image accepted (uploaded with the form or directly to the storage)
+MAX_COVER_SIZE = 1024 * 1024
+
+
 # auto-prefetching optimizes many-to-one/many relationship queries where if a field in a related
 # model is accessed, it performs a prefretch_related() call equivalent
 class Book(ExportModelOperationsMixin("book"), auto_prefetch.Model):
@@ -73,14 +78,18 @@ class Book(ExportModelOperationsMixin("book"), auto_prefetch.Model):
     cover_image = models.ImageField(
         "Cover Image",
         upload_to="cover-images/",
-        width_field="cover_image_width",
-        height_field="cover_image_height",
         null=True,
         blank=True,
     )
 
+    # filled in by the cover pipeline ('catalog.covers') after upload, rather than by the
+    # ImageField's 'width_field'/'height_field', which read the image from storage whenever a book
+    # with a cover but no dimensions is loaded
     cover_image_width = models.IntegerField(null=True, blank=True, editable=False)
     cover_image_height = models.IntegerField(null=True, blank=True, editable=False)
+    # resized copies of the cover: {"source": cover name, "formats": {format: [[width, height,
+    # name], ...]}}
+    cover_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         """String for representing the Model object."""
@@ -92,14 +101,19 @@ class Book(ExportModelOperationsMixin("book"), auto_prefetch.Model):
 
     @override
     def clean(self) -> None:
-        if self.cover_image and self.cover_image.size > 1024 * 1024:
+        if self.cover_image and self.cover_image.size > MAX_COVER_SIZE:
             raise ValidationError(
                 "Image file too large: must be less than 1MB",
                 code="cover_image_too_large",
             )
 
     class Meta(auto_prefetch.Model.Meta):
-        pass
+        permissions = (("can_export_catalog", "Export the whole catalog"),)
+        indexes = [
+            # BookListView's order ('-title', plus the primary key that cursor pagination adds as
+            # a tie-breaker), so pages are read off the index instead of sorting every book
+            models.Index(fields=["-title", "id"], name="book_title_desc_idx"),
+        ]
 
 
 class BookInstance(ExportModelOperationsMixin("bookinstance"), auto_prefetch.Model):
@@ -142,6 +156,21 @@ class BookInstance(ExportModelOperationsMixin("bookinstance"), auto_prefetch.Mod
     class Meta(auto_prefetch.Model.Meta):
         ordering = ["due_back"]
         permissions = (("can_mark_returned", "Set book as returned"),)
+        indexes = [
+            # partial index for 'scan_overdue' and AllLoanedBooksListView: only copies on loan
+            # have a meaningful due date, and they're a small part of all copies ('id' is the
+            # cursor pagination tie-breaker)
+            models.Index(
+                fields=["due_back", "id"],
+                condition=models.Q(status="o"),
+                name="bookinstance_on_loan_idx",
+            ),
+            # LoanedBooksByUserListView: a borrower's copies with a given status, by due date
+            models.Index(
+                fields=["borrower", "status", "due_back", "id"],
+                name="bookinstance_borrower_idx",
+            ),
+        ]
 
 
 class Author(ExportModelOperationsMixin("author"), models.Model):
@@ -154,6 +183,12 @@ class Author(ExportModelOperationsMixin("author"), models.Model):
 
     class Meta:
         ordering = ["last_name", "first_name"]
+        indexes = [
+            # the default ordering (AuthorListView), plus the cursor pagination tie-breaker
+            models.Index(
+                fields=["last_name", "first_name", "id"], name="author_name_idx"
+            ),
+        ]
 
     def get_absolute_url(self):
         """Returns the URL to access a particular author instance."""
@@ -180,3 +215,48 @@ class Language(ExportModelOperationsMixin("language"), models.Model):
     def __str__(self):
         """String for representing the Model object (in Admin site etc.)"""
         return self.name
+
+
+class BookSearchIndex(models.Model):
+    """Denormalized search document for a :model:`catalog.Book`, maintained by 'catalog.search'.
+
+    Author and genre names live in other tables, so they are copied here to be indexed together
+    with the book's own text ('search_vector' plus trigram indexes; see migration 0012).
+    """
+
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_index",
+    )
+    title = models.TextField()
+    authors = models.TextField(blank=True)
+    genres = models.TextField(blank=True)
+    summary = models.TextField(blank=True)
+    # only populated on postgres
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    def __str__(self):
+        return self.title
+
+
+class OverdueScan(models.Model):
+    """Metrics of one run of the 'scan_overdue' command (see 'catalog.overdue')."""
+
+    started_at = models.DateTimeField()
+    duration = models.DurationField(null=True)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    borrowers = models.PositiveIntegerField(default=0)
+    # borrowers that couldn't be emailed (no address, or loans without a borrower)
+    unreachable = models.PositiveIntegerField(default=0)
+    emails_sent = models.PositiveIntegerField(default=0)
+    emails_failed = models.PositiveIntegerField(default=0)
+    dry_run = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ["-started_at"]
+        get_latest_by = "started_at"
+
+    def __str__(self):
+        return f"Overdue scan at {self.started_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,139 @@
+"""Overdue loan reminders, sent in bulk by the 'scan_overdue' command.
+
+Overdue loans are streamed from the database (found through the partial index on 'due_back' of
+copies on loan) ordered by borrower, so each borrower's loans arrive together and become a single
+email. Emails are sent in batches over one connection to the configured 'EMAIL_BACKEND', so memory
+use only depends on the batch size, not on the number of loans.
+"""
+
+import datetime
+import logging
+import time
+from itertools import groupby
+from operator import itemgetter
+
+from django.core import mail
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import BookInstance, OverdueScan
+
+logger = logging.getLogger(__name__)
+
+
+def overdue_loans(today: datetime.date):
+    """(borrower id, email, username, title, due date) of every overdue loan, by borrower."""
+    return (
+        BookInstance.objects.filter(
+            status=BookInstance.LOAN_STATUS.OnLoan, due_back__lt=today
+        )
+        .order_by("borrower_id", "due_back")
+        .values_list(
+            "borrower_id",
+            "borrower__email",
+            "borrower__username",
+            "book__title",
+            "due_back",
+        )
+    )
+
+
+def reminder(email: str, username: str, loans: list, today: datetime.date):
+    context = {
+        "username": username,
+        "loans": [
+            {
+                "title": title or "Untitled",
+                "due_back": due_back,
+                "days": (today - due_back).days,
+            }
+            for title, due_back in loans
+        ],
+    }
+    # subjects can't contain newlines
+    subject = "".join(
+        render_to_string("catalog/email/overdue_subject.txt", context).splitlines()
+    )
+    body = render_to_string("catalog/email/overdue_message.txt", context)
+    return mail.EmailMessage(subject, body, to=[email])
+
+
+class _Sender:
+    """Sends reminders a batch at a time over a single connection, counting the outcome."""
+
+    def __init__(self, scan: OverdueScan, batch_size: int):
+        self.scan = scan
+        self.batch_size = batch_size
+        self.batch = []
+        self.connection = mail.get_connection()
+
+    def add(self, message) -> None:
+        self.batch.append(message)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.batch:
+            return
+        try:
+            # opening an open connection does nothing; the backends close connections they had
+            # to open themselves in 'send_messages()', so it's opened here to be kept open
+            self.connection.open()
+            self.scan.emails_sent += self.connection.send_messages(self.batch) or 0
+        except Exception:
+            # the SMTP backend gives up on the rest of a batch at the first error, so the whole
+            # batch is counted as failed (the next batch reopens the connection)
+            logger.exception("Sending %d overdue reminders failed", len(self.batch))
+            self.scan.emails_failed += len(self.batch)
+            self.connection.close()
+        self.batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+
+def scan_overdue(
+    today: datetime.date | None = None,
+    batch_size: int = 100,
+    chunk_size: int = 2000,
+    dry_run: bool = False,
+) -> OverdueScan:
+    """Email every borrower with overdue loans and record the run's metrics.
+
+    With 'dry_run' nothing is sent, but the loans and borrowers are still counted.
+    """
+    today = today or datetime.date.today()
+    scan = OverdueScan(started_at=timezone.now(), dry_run=dry_run)
+    start = time.monotonic()
+
+    rows = overdue_loans(today).iterator(chunk_size=chunk_size)
+    with _Sender(scan, batch_size) as sender:
+        for borrower_id, group in groupby(rows, key=itemgetter(0)):
+            group = list(group)
+            # every row of the group has the same borrower details
+            _id, email, username, _title, _due_back = group[0]
+            loans = [(title, due_back) for *_borrower, title, due_back in group]
+            scan.overdue_loans += len(loans)
+            scan.borrowers += borrower_id is not None
+            if borrower_id is None or not email:
+                scan.unreachable += 1
+            elif not dry_run:
+                sender.add(reminder(email, username, loans, today))
+
+    scan.duration = datetime.timedelta(seconds=time.monotonic() - start)
+    scan.save()
+    logger.info(
+        "Overdue scan: %d loans, %d borrowers, %d emails sent, %d failed, %d unreachable",
+        scan.overdue_loans,
+        scan.borrowers,
+        scan.emails_sent,
+        scan.emails_failed,
+        scan.unreachable,
+    )
+    return scan
@@ -0,0 +1,301 @@
+from collections.abc import Sequence
+from typing import Any, override
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+CURSOR_SALT = "catalog.pagination.cursor"
+
+
+class CursorPaginator:
+    """Keyset paginator that seeks past the last seen sort key instead of using OFFSET.
+
+    Each page is fetched with 'WHERE (sort key) > (last seen sort key) LIMIT per_page + 1', so the
+    cost of a page does not depend on how deep it is, and no 'COUNT(*)' is needed since the extra
+    row tells us whether there is a next page. The trade-off is that pages can only be reached by
+    following next/previous links (no jumping to page N, and no total page count).
+    """
+
+    # the total is never computed, but templates expect these attributes on a paginator
+    count = None
+    num_pages = None
+
+    def __init__(self, queryset: QuerySet, per_page: int, ordering: Sequence[str]):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        if not all(isinstance(field, str) for field in ordering):
+            raise ImproperlyConfigured(
+                "CursorPaginator can only order by field names, not expressions"
+            )
+        self.ordering = [
+            (field.removeprefix("-"), field.startswith("-")) for field in ordering
+        ]
+        if any("__" in name for name, _descending in self.ordering):
+            raise ImproperlyConfigured(
+                "CursorPaginator can only order by fields on the model itself"
+            )
+        # the primary key is unique, so adding it as the last sort key guarantees a total order
+        # (otherwise rows with the same title/due date could be skipped or repeated)
+        if not any(
+            name in ("pk", queryset.model._meta.pk.name) for name, _ in self.ordering
+        ):
+            self.ordering.append(("pk", False))
+        # cursors from another list (or an older ordering) can't be replayed against this one
+        self.salt = f"{CURSOR_SALT}:{queryset.model._meta.label}:{self.ordering}"
+
+    def page(self, cursor: str | None) -> "CursorPage":
+        queryset, values, number, backwards = self._page_query(cursor)
+        return self._page(list(queryset), values, number, backwards)
+
+    async def apage(self, cursor: str | None) -> "CursorPage":
+        """Same as 'page()', but fetches the rows with the async ORM."""
+        queryset, values, number, backwards = self._page_query(cursor)
+        return self._page([row async for row in queryset], values, number, backwards)
+
+    def _page_query(self, cursor: str | None):
+        if not cursor:
+            direction, values, number = "n", None, 1
+        else:
+            try:
+                direction, values, number = signing.loads(cursor, salt=self.salt)
+            except (signing.BadSignature, TypeError, ValueError):
+                raise InvalidPage(_("That page contains no results"))
+
+        backwards = direction == "p"
+        queryset = self.queryset.order_by(*self._order_by(backwards))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        # one extra row tells us whether there is anything past this page
+        return queryset[: self.per_page + 1], values, number, backwards
+
+    def _page(
+        self, rows: list, values: list | None, number: int, backwards: bool
+    ) -> "CursorPage":
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if backwards:
+            rows.reverse()
+            return CursorPage(rows, number, self, has_next=True, has_previous=has_more)
+        return CursorPage(
+            rows, number, self, has_next=has_more, has_previous=values is not None
+        )
+
+    def cursor_for(self, obj: Any, number: int, backwards: bool = False) -> str:
+        values = [_jsonable(getattr(obj, name)) for name, _descending in self.ordering]
+        return signing.dumps(
+            ["p" if backwards else "n", values, number], salt=self.salt, compress=True
+        )
+
+    def _order_by(self, backwards: bool) -> list:
+        # NULLs always sort as if they were greater than any value (postgres' default) so the
+        # order is the same on every backend
+        order_by = []
+        for name, descending in self.ordering:
+            if descending != backwards:
+                order_by.append(F(name).desc(nulls_first=True))
+            else:
+                order_by.append(F(name).asc(nulls_last=True))
+        return order_by
+
+    def _after(self, values: list, backwards: bool) -> Q:
+        """Build the lexicographic 'comes after (values)' condition for the sort keys."""
+        # built from the last key outwards: (k1 > v1) OR (k1 = v1 AND ((k2 > v2) OR (k2 = v2 AND
+        # ...))), where None means nothing matches (a row equal on every key is not "after")
+        condition = None
+        for (name, descending), value in reversed(list(zip(self.ordering, values))):
+            descending = descending != backwards
+            # NULLs come last when ascending and first when descending
+            nulls_last = not descending
+
+            if value is None:
+                tie = Q(**{f"{name}__isnull": True})
+                past = None if nulls_last else Q(**{f"{name}__isnull": False})
+            else:
+                tie = Q(**{name: value})
+                past = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                if nulls_last:
+                    past |= Q(**{f"{name}__isnull": True})
+
+            after_tie = tie & condition if condition is not None else None
+            if past is not None and after_tie is not None:
+                condition = past | after_tie
+            else:
+                condition = past if past is not None else after_tie
+        return condition if condition is not None else Q(pk__in=[])
+
+
+class CursorPage(Sequence):
+    """Stand-in for 'django.core.paginator.Page' where page "numbers" are cursor tokens."""
+
+    def __init__(
+        self,
+        object_list: list,
+        number: int,
+        paginator: CursorPaginator,
+        has_next: bool,
+        has_previous: bool,
+    ):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __repr__(self):
+        return f"<Page {self.number}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+    # these return tokens rather than numbers, but the pagination links just put them in the 'page'
+    # query parameter so the templates don't need to know the difference
+    def next_page_number(self) -> str:
+        if not self.has_next():
+            raise InvalidPage(_("That page contains no results"))
+        return self.paginator.cursor_for(self.object_list[-1], self.number + 1)
+
+    def previous_page_number(self) -> str:
+        if not self.has_previous():
+            raise InvalidPage(_("That page number is less than 1"))
+        return self.paginator.cursor_for(
+            self.object_list[0], self.number - 1, backwards=True
+        )
+
+
+class CursorPaginationMixin:
+    """Opt-in keyset pagination for ListViews (enabled by 'settings.CATALOG_CURSOR_PAGINATION').
+
+    The sort keys are taken from the queryset's ordering (or the model's Meta.ordering), so views
+    don't need any extra configuration beyond adding the mixin before 'generic.ListView'.
+    """
+
+    @override
+    def paginate_queryset(self, queryset, page_size):
+        if not settings.CATALOG_CURSOR_PAGINATION:
+            return super().paginate_queryset(queryset, page_size)  # type: ignore
+
+        paginator = self._cursor_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self._cursor())
+        except InvalidPage as e:
+            raise Http404(_("Invalid page: %(message)s") % {"message": str(e)})
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Async version of 'paginate_queryset()' (for both cursor and page number pagination)."""
+        if not settings.CATALOG_CURSOR_PAGINATION:
+            return await apaginate_by_number(self, queryset, page_size)
+
+        paginator = self._cursor_paginator(queryset, page_size)
+        try:
+            page = await paginator.apage(self._cursor())
+        except InvalidPage as e:
+            raise Http404(_("Invalid page: %(message)s") % {"message": str(e)})
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def _cursor_paginator(self, queryset, page_size) -> CursorPaginator:
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return CursorPaginator(queryset, page_size, ordering)
+
+    def _cursor(self) -> str | None:
+        page_kwarg = self.page_kwarg  # type: ignore
+        cursor = self.kwargs.get(page_kwarg) or self.request.GET.get(page_kwarg)  # type: ignore
+        # plain page numbers are left over from the OFFSET paginator, so only the first page is
+        # meaningful
+        if cursor == "1":
+            cursor = None
+        return cursor
+
+
+async def apaginate_by_number(view, queryset, page_size):
+    """Async equivalent of 'MultipleObjectMixin.paginate_queryset()' (OFFSET pagination)."""
+    paginator = view.get_paginator(
+        queryset,
+        page_size,
+        orphans=view.get_paginate_orphans(),
+        allow_empty_first_page=view.get_allow_empty(),
+    )
+    # 'count' is a cached property, so filling it in up front means the paginator never runs its
+    # own (sync) COUNT query
+    paginator.count = await queryset.acount()
+    page_kwarg = view.page_kwarg
+    page = view.kwargs.get(page_kwarg) or view.request.GET.get(page_kwarg) or 1
+    try:
+        page_number = int(page)
+    except ValueError:
+        if page == "last":
+            page_number = paginator.num_pages
+        else:
+            raise Http404(_("Page is not “last”, nor can it be converted to an int."))
+    try:
+        page = paginator.page(page_number)
+    except InvalidPage as e:
+        raise Http404(
+            _("Invalid page (%(page_number)s): %(message)s")
+            % {"page_number": page_number, "message": str(e)}
+        )
+    page.object_list = [obj async for obj in page.object_list]
+    return (paginator, page, page.object_list, page.has_other_pages())
+
+
+def _jsonable(value):
+    # dates and UUIDs become strings, which the ORM converts back when filtering
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Page-number paginator that takes the count of a whole (unfiltered) table from Postgres'
+    statistics ('pg_class.reltuples', kept current by autovacuum) instead of 'COUNT(*)', which
+    reads every row; for the admin's changelists of big tables.
+
+    Filtered querysets, other databases and tables estimated at fewer than 'exact_below' rows
+    (where counting is cheap and the statistics least accurate) are counted exactly.
+    """
+
+    exact_below = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if (
+            isinstance(queryset, QuerySet)
+            and not queryset.query.where
+            and connections[queryset.db].vendor == "postgresql"
+        ):
+            estimate = self.estimate(queryset)
+            if estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate(queryset: QuerySet) -> int:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 for tables that were never analyzed
+        return row[0] if row else -1
@@ -0,0 +1,148 @@
+import re
+from collections.abc import Iterable
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Q, QuerySet
+from django.db.models.functions import Greatest
+
+from .models import Book, BookSearchIndex
+
+
+class SearchMode:
+    # whole words, ranked by relevance (title > authors > genres > summary)
+    RANKED = "ranked"
+    # every word may be the start of a longer word, for search-as-you-type
+    PREFIX = "prefix"
+    # prefix matching, plus titles/author names that are merely similar (typos)
+    FUZZY = "fuzzy"
+
+    choices = [
+        (RANKED, "Exact words"),
+        (PREFIX, "Starts with"),
+        (FUZZY, "Typo tolerant"),
+    ]
+
+
+def _words(query: str) -> list[str]:
+    # only keep word characters so user input can never be interpreted as query syntax
+    return re.findall(r"\w+", query.lower())
+
+
+def search_books(query: str, mode: str = SearchMode.RANKED) -> QuerySet[Book]:
+    """Return the books matching 'query', annotated with 'rank' and ordered best match first."""
+    words = _words(query)
+    if not words:
+        return Book.objects.none()
+
+    return _search(Book.objects.all(), query, words, mode).order_by(
+        "-rank", "title", "pk"
+    )
+
+
+def _search(queryset: QuerySet, query: str, words: list[str], mode: str):
+    vector = F("search_index__search_vector")
+    if mode == SearchMode.RANKED:
+        # built from the sanitized words only, like the other modes, so operators in the user's
+        # input (OR, -excluded, "phrases") aren't interpreted; 'plain' requires every word
+        search_query = SearchQuery(" ".join(words), search_type="plain")
+    else:
+        search_query = SearchQuery(
+            " & ".join(f"{word}:*" for word in words), search_type="raw"
+        )
+
+    rank = SearchRank(vector, search_query)
+    if mode != SearchMode.FUZZY:
+        return queryset.annotate(rank=rank).filter(
+            search_index__search_vector=search_query
+        )
+
+    # '%>' (trigram_word_similar) is what the trigram GIN indexes can answer, while the
+    # similarity function is only used to rank the rows that already matched (how similar counts
+    # as a match is set by postgres' 'pg_trgm.word_similarity_threshold', 0.6 by default)
+    return queryset.annotate(
+        rank=Greatest(
+            rank,
+            TrigramWordSimilarity(query, "search_index__title"),
+            TrigramWordSimilarity(query, "search_index__authors"),
+            output_field=FloatField(),
+        )
+    ).filter(
+        Q(search_index__search_vector=search_query)
+        | Q(search_index__title__trigram_word_similar=query)
+        | Q(search_index__authors__trigram_word_similar=query)
+    )
+
+
+def _index_models(apps=None):
+    # migrations pass their historical app registry, since the models may have changed since
+    if apps is None:
+        return Book, BookSearchIndex
+    return apps.get_model("catalog", "Book"), apps.get_model(
+        "catalog", "BookSearchIndex"
+    )
+
+
+def reindex_books(book_ids: Iterable[int], *, apps=None) -> None:
+    """Rebuild the search documents for the given books (one upsert for the whole batch)."""
+    book_model, index_model = _index_models(apps)
+    books = (
+        book_model._default_manager.filter(pk__in=list(book_ids))
+        .select_related("author")
+        .prefetch_related("genre")
+    )
+    documents = [
+        index_model(
+            book=book,
+            title=book.title,
+            authors=(
+                f"{book.author.first_name} {book.author.last_name}"
+                if book.author
+                else ""
+            ),
+            genres=" ".join(genre.name for genre in book.genre.all()),
+            summary=book.summary,
+        )
+        for book in books
+    ]
+    if not documents:
+        return
+
+    index_model._default_manager.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["book"],
+        update_fields=["title", "authors", "genres", "summary"],
+    )
+    # weights are what SearchRank uses to favour title matches over summary matches
+    index_model._default_manager.filter(
+        book__in=[document.book_id for document in documents]  # type: ignore
+    ).update(
+        search_vector=SearchVector("title", weight="A")
+        + SearchVector("authors", weight="B")
+        + SearchVector("genres", weight="C")
+        + SearchVector("summary", weight="D")
+    )
+
+
+def reindex_all_books(batch_size: int = 1000, *, apps=None) -> int:
+    """Rebuild the whole search index in batches, returning the number of books indexed."""
+    book_model, _index_model = _index_models(apps)
+    count = 0
+    batch = []
+    for pk in (
+        book_model._default_manager.order_by("pk")
+        .values_list("pk", flat=True)
+        .iterator()
+    ):
+        batch.append(pk)
+        if len(batch) == batch_size:
+            reindex_books(batch, apps=apps)
+            count += len(batch)
+            batch = []
+    reindex_books(batch, apps=apps)
+    return count + len(batch)
@@ -0,0 +1,235 @@
+"""Synthetic catalog data for performance testing ('manage.py seed_catalog').
+
+Everything is inserted with 'bulk_create()' a batch at a time (one transaction per batch), so
+seeding millions of copies only holds one batch in memory. The data is random but reproducible:
+the same seed produces the same catalog.
+"""
+
+import datetime
+import random
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Lower
+
+from .counters import invalidate_counters
+from .fragments import bump_model_version
+from .models import Author, Book, BookInstance, Genre, Language
+from .search import reindex_books
+
+GENRES = [
+    "Fantasy",
+    "Science Fiction",
+    "Mystery",
+    "Thriller",
+    "Romance",
+    "Horror",
+    "History",
+    "Biography",
+    "Poetry",
+    "Philosophy",
+    "Travel",
+    "Cookery",
+]
+LANGUAGES = ["English", "French", "German", "Spanish", "Japanese", "Italian"]
+WORDS = (
+    "shadow river empire glass winter garden machine silent last city house star "
+    "memory dragon letter island night secret storm crown mirror iron song broken"
+).split()
+FIRST_NAMES = (
+    "Ada Ursula Frank Iain Octavia Jorge Italo Haruki Toni Ngugi Clarice Orhan Wislawa "
+    "Gabriel Chimamanda Kazuo Olga Naguib Isabel Stanislaw"
+).split()
+LAST_NAMES = (
+    "Tolkien Herbert Banks Butler Borges Calvino Murakami Morrison Thiongo Lispector Pamuk "
+    "Szymborska Marquez Adichie Ishiguro Tokarczuk Mahfouz Allende Lem"
+).split()
+
+# share of copies in each status ('o' copies get a borrower and a due date around today)
+STATUS_WEIGHTS = {
+    BookInstance.LOAN_STATUS.Available: 40,
+    BookInstance.LOAN_STATUS.OnLoan: 40,
+    BookInstance.LOAN_STATUS.Reserved: 10,
+    BookInstance.LOAN_STATUS.Maintenance: 10,
+}
+
+
+@dataclass
+class SeedStats:
+    users: int = 0
+    authors: int = 0
+    books: int = 0
+    copies: int = 0
+    loans: int = 0
+
+
+class CatalogSeeder:
+    def __init__(
+        self,
+        seed: int = 0,
+        batch_size: int = 1000,
+        prefix: str = "seed",
+        password: str = "password",
+        progress: Callable[[SeedStats], None] | None = None,
+    ):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.password = password
+        self.progress = progress or (lambda stats: None)
+        self.stats = SeedStats()
+
+    def seed(self, books: int, copies_per_book: int, users: int) -> SeedStats:
+        user_ids = self.seed_users(users)
+        self.seed_librarian()
+        language_ids = self._ids(Language, LANGUAGES)
+        genre_ids = self._ids(Genre, GENRES)
+        # a handful of books per author, like a real catalog
+        author_ids = self.seed_authors(max(1, books // 5))
+
+        for start in range(0, books, self.batch_size):
+            count = min(self.batch_size, books - start)
+            with transaction.atomic():
+                book_ids = self.seed_books(count, author_ids, language_ids, genre_ids)
+                self.seed_copies(book_ids, copies_per_book, user_ids)
+                # bulk_create() doesn't send the signals that keep the index up to date
+                reindex_books(book_ids)
+            self.progress(self.stats)
+
+        invalidate_counters()
+        for model in (Author, Language, Genre, Book, BookInstance):
+            bump_model_version(model._meta.label)
+        return self.stats
+
+    def seed_users(self, count: int) -> list[int]:
+        User = get_user_model()
+        # hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password(self.password)
+        usernames = [f"{self.prefix}-reader-{n}" for n in range(count)]
+        for start in range(0, count, self.batch_size):
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=username,
+                        email=f"{username}@example.com",
+                        password=password,
+                    )
+                    for username in usernames[start : start + self.batch_size]
+                ],
+                ignore_conflicts=True,
+            )
+        self.stats.users = count
+        return list(
+            User.objects.filter(username__in=usernames).values_list("pk", flat=True)
+        )
+
+    def seed_librarian(self):
+        """A user allowed to see every loan and renew them (for the load test)."""
+        User = get_user_model()
+        librarian, _created = User.objects.get_or_create(
+            username=f"{self.prefix}-librarian",
+            defaults={
+                "email": f"{self.prefix}-librarian@example.com",
+                "password": make_password(self.password),
+            },
+        )
+        librarian.user_permissions.add(
+            Permission.objects.get(
+                codename="can_mark_returned", content_type__app_label="catalog"
+            )
+        )
+        return librarian
+
+    def seed_authors(self, count: int) -> list[int]:
+        ids = []
+        for start in range(0, count, self.batch_size):
+            authors = Author.objects.bulk_create(
+                [
+                    Author(
+                        first_name=self.random.choice(FIRST_NAMES),
+                        last_name=self.random.choice(LAST_NAMES),
+                        date_of_birth=datetime.date(1900, 1, 1)
+                        + datetime.timedelta(days=self.random.randrange(36500)),
+                    )
+                    for _ in range(min(self.batch_size, count - start))
+                ]
+            )
+            ids.extend(author.pk for author in authors)
+        self.stats.authors += count
+        return ids
+
+    def seed_books(self, count, author_ids, language_ids, genre_ids) -> list[int]:
+        # ISBNs continue after the highest book id, so seeding again adds more books
+        first = (Book.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+        books = Book.objects.bulk_create(
+            [
+                Book(
+                    title=self._words(1, 4).title(),
+                    summary=self._words(20, 60).capitalize() + ".",
+                    isbn=f"9{first + n:012d}",
+                    author_id=self.random.choice(author_ids),
+                    language_id=self.random.choice(language_ids),
+                )
+                for n in range(count)
+            ]
+        )
+        Through = Book.genre.through
+        Through.objects.bulk_create(
+            [
+                Through(book_id=book.pk, genre_id=genre_id)
+                for book in books
+                for genre_id in self.random.sample(genre_ids, self.random.randint(1, 3))
+            ]
+        )
+        self.stats.books += count
+        return [book.pk for book in books]
+
+    def seed_copies(self, book_ids, copies_per_book, user_ids) -> None:
+        today = datetime.date.today()
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        copies = []
+        for book_id in book_ids:
+            for status in self.random.choices(statuses, weights, k=copies_per_book):
+                copy = BookInstance(
+                    # from the seeded generator instead of uuid4(), so the ids are reproducible
+                    id=uuid.UUID(int=self.random.getrandbits(128), version=4),
+                    book_id=book_id,
+                    imprint=f"{self.random.choice(WORDS).title()} Press, "
+                    f"{self.random.randint(1950, 2024)}",
+                    status=status,
+                )
+                if user_ids and status in (
+                    BookInstance.LOAN_STATUS.OnLoan,
+                    BookInstance.LOAN_STATUS.Reserved,
+                ):
+                    copy.borrower_id = self.random.choice(user_ids)
+                if status == BookInstance.LOAN_STATUS.OnLoan:
+                    # some already overdue
+                    copy.due_back = today + datetime.timedelta(
+                        days=self.random.randint(-14, 21)
+                    )
+                    self.stats.loans += 1
+                copies.append(copy)
+        BookInstance.objects.bulk_create(copies, batch_size=self.batch_size)
+        self.stats.copies += len(copies)
+
+    def _ids(self, model, names: list[str]) -> list[int]:
+        model.objects.bulk_create(
+            [model(name=name) for name in names], ignore_conflicts=True
+        )
+        # genre names are unique regardless of case, so an existing "fantasy" is reused
+        return list(
+            model.objects.annotate(lower_name=Lower("name"))
+            .filter(lower_name__in=[name.lower() for name in names])
+            .values_list("pk", flat=True)
+        )
+
+    def _words(self, least: int, most: int) -> str:
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(least, most)))
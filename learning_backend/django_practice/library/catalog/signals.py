@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .counters import invalidate_counters
+from .covers import delete_renditions, is_cover_stale, schedule_cover_processing
+from .fragments import bump_model_version
+from .models import Author, Book, BookInstance, Genre, Language
+from .search import reindex_books
+
+
+# 'sender' limits the receiver to a single model, so it is registered once per model; queryset
+# .update()/.bulk_create() do NOT send these signals, which is why the counters cache also has a
+# timeout bounding how stale it can get
+@receiver(post_save, sender=Book, dispatch_uid="counters_book_saved")
+@receiver(post_delete, sender=Book, dispatch_uid="counters_book_deleted")
+@receiver(post_save, sender=BookInstance, dispatch_uid="counters_bookinstance_saved")
+@receiver(
+    post_delete, sender=BookInstance, dispatch_uid="counters_bookinstance_deleted"
+)
+@receiver(post_save, sender=Author, dispatch_uid="counters_author_saved")
+@receiver(post_delete, sender=Author, dispatch_uid="counters_author_deleted")
+@receiver(post_save, sender=Genre, dispatch_uid="counters_genre_saved")
+@receiver(post_delete, sender=Genre, dispatch_uid="counters_genre_deleted")
+def invalidate_counters_on_change(sender, **kwargs):
+    invalidate_counters()
+
+
+# cached template fragments declare the models they depend on, so any change to one of those
+# models moves every such fragment onto a new key
+@receiver(post_save, sender=Book, dispatch_uid="fragments_book_saved")
+@receiver(post_delete, sender=Book, dispatch_uid="fragments_book_deleted")
+@receiver(post_save, sender=BookInstance, dispatch_uid="fragments_bookinstance_saved")
+@receiver(
+    post_delete, sender=BookInstance, dispatch_uid="fragments_bookinstance_deleted"
+)
+@receiver(post_save, sender=Author, dispatch_uid="fragments_author_saved")
+@receiver(post_delete, sender=Author, dispatch_uid="fragments_author_deleted")
+@receiver(post_save, sender=Genre, dispatch_uid="fragments_genre_saved")
+@receiver(post_delete, sender=Genre, dispatch_uid="fragments_genre_deleted")
+@receiver(post_save, sender=Language, dispatch_uid="fragments_language_saved")
+@receiver(post_delete, sender=Language, dispatch_uid="fragments_language_deleted")
+def bump_fragment_version(sender, **kwargs):
+    bump_model_version(sender._meta.label)
+
+
+@receiver(m2m_changed, sender=Book.genre.through, dispatch_uid="fragments_book_genres")
+def bump_fragment_version_for_genres(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_model_version(Book._meta.label)
+
+
+# search documents include the author and genre names, so changes to those have to be copied onto
+# every book that references them
+@receiver(post_save, sender=Book, dispatch_uid="search_book_saved")
+def reindex_saved_book(sender, instance, raw=False, **kwargs):
+    # 'raw' is set when loading fixtures, where related rows may not exist yet
+    if not raw:
+        reindex_books([instance.pk])
+
+
+@receiver(post_save, sender=Author, dispatch_uid="search_author_saved")
+def reindex_author_books(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_books(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Genre, dispatch_uid="search_genre_saved")
+def reindex_genre_books(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_books(instance.book_set.values_list("pk", flat=True))
+
+
+# the M2M rows are gone by 'post_delete', so the affected books are looked up beforehand
+@receiver(pre_delete, sender=Genre, dispatch_uid="search_genre_deleting")
+def remember_genre_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Genre, dispatch_uid="search_genre_deleted")
+def reindex_deleted_genre_books(sender, instance, **kwargs):
+    reindex_books(getattr(instance, "_search_book_ids", []))
+
+
+@receiver(m2m_changed, sender=Book.genre.through, dispatch_uid="search_book_genres")
+def reindex_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            reindex_books([instance.pk])
+    # changed from the genre side ('genre.book_set.add(...)'), where 'clear()' doesn't say which
+    # books were affected
+    elif action == "pre_clear":
+        instance._search_book_ids = list(instance.book_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        reindex_books(getattr(instance, "_search_book_ids", []))
+    elif action in ("post_add", "post_remove"):
+        reindex_books(pk_set)
+
+
+# covers are resized/re-encoded in the background whenever the uploaded image changes
+@receiver(post_save, sender=Book, dispatch_uid="covers_book_saved")
+def process_saved_cover(sender, instance, raw=False, **kwargs):
+    if not raw and is_cover_stale(instance):
+        schedule_cover_processing(instance.pk)
+
+
+# the original upload is deleted by django-cleanup, but it doesn't know about the renditions
+@receiver(post_delete, sender=Book, dispatch_uid="covers_book_deleted")
+def delete_deleted_cover_renditions(sender, instance, **kwargs):
+    renditions, storage = instance.cover_renditions, instance.cover_image.storage
+    transaction.on_commit(lambda: delete_renditions(renditions, storage))
@@ -0,0 +1,60 @@
+// uploads the cover chosen in the book form straight to the media storage as soon as it's picked
+// (see 'catalog.views.cover_upload'), so the form is then submitted without the file; if anything
+// goes wrong the file is simply submitted with the form as usual
+const uploadUrl = document.currentScript.dataset.uploadUrl;
+const form = document.getElementById("book-form");
+const fileInput = form?.querySelector("#id_cover_image");
+const tokenInput = form?.querySelector("#id_cover_upload");
+let pendingUpload = null;
+
+async function uploadCover(file) {
+  const body = new FormData();
+  body.append("filename", file.name);
+  body.append("content_type", file.type);
+  const response = await fetch(uploadUrl, {
+    method: "POST",
+    body,
+    headers: { "X-CSRFToken": form.querySelector("[name=csrfmiddlewaretoken]").value },
+  });
+  if (!response.ok) {
+    throw new Error(`starting the upload failed (${response.status})`);
+  }
+  const target = await response.json();
+  const upload = await fetch(target.url, {
+    method: target.method,
+    headers: target.headers,
+    body: file,
+  });
+  if (!upload.ok) {
+    throw new Error(`the upload failed (${upload.status})`);
+  }
+  return target.token;
+}
+
+fileInput?.addEventListener("change", () => {
+  tokenInput.value = "";
+  const file = fileInput.files[0];
+  pendingUpload = file
+    ? uploadCover(file).then(
+        (token) => {
+          tokenInput.value = token;
+        },
+        (error) => console.warn("Uploading the cover directly failed:", error),
+      )
+    : null;
+});
+
+form?.addEventListener("submit", async (event) => {
+  if (!pendingUpload) {
+    return;
+  }
+  event.preventDefault();
+  await pendingUpload;
+  pendingUpload = null;
+  if (tokenInput.value) {
+    // already in the storage, so not sent again
+    fileInput.value = "";
+  }
+  // the form's submit button is named "submit", which hides the form's own submit()
+  HTMLFormElement.prototype.submit.call(form);
+});
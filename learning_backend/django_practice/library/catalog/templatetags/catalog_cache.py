@@ -0,0 +1,62 @@
+from django import template
+from django.conf import settings
+
+from catalog.fragments import fragment_cache, fragment_key
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, depends, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.depends = depends
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = fragment_key(self.fragment_name, self.depends, vary_on)
+        cache = fragment_cache()
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.CATALOG_FRAGMENT_TIMEOUT)
+        return value
+
+
+@register.tag("cachefragment")
+def do_cachefragment(parser, token):
+    """Cache a template fragment until any of the models it depends on are saved or deleted.
+
+    Usage::
+
+        {% load catalog_cache %}
+        {% cachefragment "name" depends="catalog.Book catalog.Author" [var1] [var2] .. %}
+            .. some expensive rendering ..
+        {% endcachefragment %}
+
+    Objects (or lists/querysets/pages of objects) passed as variables are part of the key, as is
+    anything else, like 'perms.catalog.change_book', that the fragment renders differently for.
+    Never render user-specific content in a fragment without varying on what makes it specific.
+    """
+    nodelist = parser.parse(("endcachefragment",))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least a fragment name"
+        )
+
+    depends = []
+    vary_on = []
+    for bit in tokens[2:]:
+        if bit.startswith("depends="):
+            depends.extend(bit.removeprefix("depends=").strip("\"'").split())
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    if not depends:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires a depends=\"app.Model ...\" argument"
+        )
+    # fragment name can't be a variable (same as the built-in 'cache' tag)
+    return FragmentCacheNode(nodelist, tokens[1].strip("\"'"), depends, vary_on)
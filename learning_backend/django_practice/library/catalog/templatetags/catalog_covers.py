@@ -0,0 +1,72 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from catalog.covers import FORMATS
+from catalog.models import Book
+
+register = template.Library()
+
+# matches the .cover-image width in book_list.scss
+DEFAULT_SIZES = "(max-width: 500px) 40vw, 200px"
+
+
+def _renditions(book: Book, format_name: str) -> list:
+    return book.cover_renditions.get("formats", {}).get(format_name, [])
+
+
+def _url(book: Book, name: str) -> str:
+    return book.cover_image.storage.url(name)
+
+
+@register.filter
+def cover_srcset(book: Book, format_name: str = "jpeg") -> str:
+    """'srcset' attribute value listing every width of the cover in the given format."""
+    return ", ".join(
+        f"{_url(book, name)} {width}w"
+        for width, _height, name in _renditions(book, format_name)
+    )
+
+
+@register.simple_tag
+def cover_picture(book: Book, sizes: str = DEFAULT_SIZES, alt: str = "cover_image"):
+    """Render a book's cover as a <picture>, letting the browser pick the best format and size.
+
+    Falls back to the original upload while the renditions are still being generated.
+    """
+    if not book.cover_image:
+        return ""
+
+    stored = book.cover_renditions.get("formats", {})
+    # in the configured order (most efficient first), since postgres' jsonb doesn't keep the order
+    # the formats were stored in
+    formats = [name for name in settings.CATALOG_COVER_FORMATS if name in stored]
+    if not formats:
+        return format_html(
+            '<img src="{}" alt="{}" loading="lazy">', book.cover_image.url, alt
+        )
+
+    # the last format is the most widely supported one, so it goes in the <img> itself
+    *modern, fallback = formats
+    smallest_width, smallest_height, smallest_name = _renditions(book, fallback)[0]
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (FORMATS[name][1], cover_srcset(book, name), sizes)
+            for name in modern
+            if name in FORMATS
+        ),
+    )
+    # width/height only give the browser the aspect ratio (to reserve space before loading)
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" '
+        'loading="lazy" decoding="async"></picture>',
+        sources,
+        _url(book, smallest_name),
+        cover_srcset(book, fallback),
+        sizes,
+        smallest_width,
+        smallest_height,
+        alt,
+    )
@@ -0,0 +1,20 @@
+from catalog.forms import CrispyBookForm
+from catalog.models import Author, Genre, Language
+
+
+def test_crispy_book_form_validation(benchmark, db_catalog):
+    data = {
+        "title": "A New Book",
+        "author": Author.objects.order_by("pk").values_list("pk", flat=True).first(),
+        "summary": "A book that isn't in the catalog yet.",
+        "isbn": "1234567890123",
+        "genre": list(Genre.objects.values_list("pk", flat=True)[:3]),
+        "language": Language.objects.values_list("pk", flat=True).first(),
+    }
+
+    def validate():
+        form = CrispyBookForm(data=data)
+        return form.is_valid(), form.errors
+
+    valid, errors = benchmark(validate)
+    assert valid, errors
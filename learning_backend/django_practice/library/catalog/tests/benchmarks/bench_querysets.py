@@ -0,0 +1,59 @@
+from urllib.parse import urlencode
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from catalog import views
+from catalog.models import BookInstance
+
+# every catalog ListView, with the query string it's benchmarked with
+LIST_VIEWS = [
+    (views.BookListView, {}),
+    (views.AuthorListView, {}),
+    (views.BookSearchView, {"q": "dragon"}),
+    (views.LoanedBooksByUserListView, {}),
+    (views.AllLoanedBooksListView, {}),
+    (views.AllLoanedBooksListView, {"search": "dra"}),
+]
+IDS = [
+    view_class.__name__ + (f"?{urlencode(params)}" if params else "")
+    for view_class, params in LIST_VIEWS
+]
+
+
+@pytest.fixture
+def make_view(rf, db_catalog):
+    # a reader with loans, so the per-borrower list isn't empty
+    user = (
+        get_user_model()
+        .objects.filter(bookinstance__status=BookInstance.LOAN_STATUS.OnLoan)
+        .first()
+    )
+
+    def make_view(view_class, params):
+        request = rf.get("/", params)
+        request.user = user
+        view = view_class()
+        view.setup(request)
+        return view
+
+    return make_view
+
+
+@pytest.mark.parametrize("view_class,params", LIST_VIEWS, ids=IDS)
+def test_queryset_construction(benchmark, make_view, view_class, params):
+    view = make_view(view_class, params)
+    # building the (lazy) queryset doesn't touch the database
+    benchmark(view.get_queryset)
+
+
+@pytest.mark.parametrize("view_class,params", LIST_VIEWS, ids=IDS)
+def test_queryset_evaluation(benchmark, make_view, view_class, params):
+    view = make_view(view_class, params)
+
+    def first_page():
+        queryset = view.get_queryset()
+        return list(queryset[: view.get_paginate_by(queryset)])
+
+    rows = benchmark(first_page)
+    assert rows
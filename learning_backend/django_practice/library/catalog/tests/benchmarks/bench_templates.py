@@ -0,0 +1,46 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.template import Context, Template
+from django.template.loader import render_to_string
+
+from catalog.models import Book, BookInstance
+from catalog.views import book_detail_queryset
+
+from .conftest import BOOKS
+
+
+@pytest.fixture
+def request_(rf):
+    request = rf.get("/")
+    request.user = AnonymousUser()
+    return request
+
+
+def test_render_book_list(benchmark, db_catalog, request_):
+    # one long page, with the authors the template shows already joined in
+    books = list(Book.objects.select_related("author").order_by("-title")[:BOOKS])
+    html = benchmark(
+        render_to_string, "catalog/book_list.html", {"book_list": books}, request_
+    )
+    assert books[0].title in html
+
+
+def test_render_book_detail(benchmark, db_catalog, request_):
+    # every copy is prefetched, so only rendering is measured
+    book = book_detail_queryset().get(pk=db_catalog["book_pk"])
+    html = benchmark(
+        render_to_string, "catalog/book_detail.html", {"book": book}, request_
+    )
+    assert html.count("is book #") == len(book.bookinstance_set.all())
+
+
+def test_run_extension_per_row(benchmark, db_catalog):
+    template = Template(
+        "{% load run_extension from book_detail_tags %}"
+        "{% for copy in copies %}"
+        "{% run_extension copy forloop.counter as text %}{{ text }}"
+        "{% endfor %}"
+    )
+    copies = list(BookInstance.objects.all()[:BOOKS])
+    html = benchmark(template.render, Context({"copies": copies}))
+    assert f"is book #{len(copies)} " in html
@@ -0,0 +1,50 @@
+"""Fixtures shared by the benchmarks.
+
+The catalog is seeded once per session (with 'CatalogSeeder', the same generator as
+'seed_catalog') and kept for every benchmark, since benchmarks only read it. Cached template
+fragments are turned off, so rendering benchmarks measure rendering rather than cache hits.
+"""
+
+import pytest
+from django.core.cache import cache
+
+from catalog.models import Book, BookInstance
+from catalog.seeding import CatalogSeeder
+
+BOOKS = 1000
+COPIES_PER_BOOK = 3
+# copies of the one book the detail page benchmarks render
+DETAIL_COPIES = 500
+
+
+@pytest.fixture(scope="session")
+def catalog(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        CatalogSeeder(seed=0).seed(
+            books=BOOKS, copies_per_book=COPIES_PER_BOOK, users=50
+        )
+        book = Book.objects.order_by("pk").first()
+        BookInstance.objects.bulk_create(
+            [
+                BookInstance(book=book, imprint="Benchmark Press", status="a")
+                for _ in range(DETAIL_COPIES)
+            ]
+        )
+        yield {"book_pk": book.pk}
+
+
+@pytest.fixture(autouse=True)
+def no_fragment_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "benchmarks": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    }
+    settings.CATALOG_FRAGMENT_CACHE = "benchmarks"
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def db_catalog(catalog, db):
+    """The seeded catalog, with database access for the benchmark itself."""
+    return catalog
@@ -0,0 +1,174 @@
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.admin import BookAdmin
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import EstimatedCountPaginator
+from core.models import User
+
+STATUS = BookInstance.LOAN_STATUS
+
+
+class CatalogAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="secret")
+        cls.reader = User.objects.create_user(username="reader", password="secret")
+        cls.author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        cls.genres = [Genre.objects.create(name=name) for name in ("SF", "Epic")]
+        cls.language = Language.objects.create(name="English")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_books(self, count, start=0):
+        books = []
+        for number in range(start, start + count):
+            book = Book.objects.create(
+                title=f"Dune {number}",
+                summary="Sand",
+                isbn=f"{number:013}",
+                author=self.author,
+                language=self.language,
+            )
+            book.genre.set(self.genres)
+            books.append(book)
+        return books
+
+    def add_copies(self, book, count, status=STATUS.Available, **fields):
+        return [
+            BookInstance.objects.create(
+                book=book, imprint="Ace", status=status, **fields
+            )
+            for _ in range(count)
+        ]
+
+    def count_queries(self, url) -> int:
+        # once first, so what's cached per session (the user, its permissions) isn't counted
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_dont_grow_with_rows(self):
+        books = self.add_books(2)
+        for book in books:
+            self.add_copies(book, 1, STATUS.OnLoan, borrower=self.reader)
+        book_queries = self.count_queries(reverse("admin:catalog_book_changelist"))
+        copy_queries = self.count_queries(
+            reverse("admin:catalog_bookinstance_changelist")
+        )
+
+        for book in self.add_books(5, start=2):
+            self.add_copies(book, 1, STATUS.OnLoan, borrower=self.reader)
+        self.assertEqual(
+            self.count_queries(reverse("admin:catalog_book_changelist")), book_queries
+        )
+        self.assertEqual(
+            self.count_queries(reverse("admin:catalog_bookinstance_changelist")),
+            copy_queries,
+        )
+
+    def test_inline_lists_first_copies_only(self):
+        (book,) = self.add_books(1)
+        self.add_copies(book, BookAdmin.BooksInstanceInline.max_shown + 5)
+        response = self.client.get(reverse("admin:catalog_book_change", args=[book.pk]))
+        formset = response.context["inline_admin_formsets"][0].formset
+        self.assertEqual(
+            len(formset.initial_forms), BookAdmin.BooksInstanceInline.max_shown
+        )
+        self.assertContains(response, f"?book__id__exact={book.pk}")
+
+    def test_actions_change_copies_in_bulk(self):
+        (book,) = self.add_books(1)
+        on_loan = self.add_copies(book, 2, STATUS.OnLoan, borrower=self.reader)
+        available = self.add_copies(book, 1)
+        url = reverse("admin:catalog_bookinstance_changelist")
+
+        response = self.client.post(
+            url,
+            {
+                "action": "send_to_maintenance",
+                "_selected_action": [copy.pk for copy in on_loan + available],
+            },
+            follow=True,
+        )
+        self.assertContains(response, "Updated 1 copies")
+        self.assertContains(response, "Skipped 2 copies (2: is on loan)")
+        self.assertEqual(
+            BookInstance.objects.get(pk=available[0].pk).status, STATUS.Maintenance
+        )
+
+        self.client.post(
+            url,
+            {
+                "action": "mark_returned",
+                "_selected_action": [copy.pk for copy in on_loan],
+            },
+        )
+        returned = BookInstance.objects.filter(pk__in=[copy.pk for copy in on_loan])
+        self.assertEqual(
+            {(copy.status, copy.borrower_id) for copy in returned},
+            {(STATUS.Available, None)},
+        )
+
+    def test_mark_returned_needs_permission(self):
+        staff = User.objects.create_user(
+            username="staff", password="secret", is_staff=True
+        )
+        staff.user_permissions.add(
+            Permission.objects.get(codename="change_bookinstance")
+        )
+        self.client.force_login(staff)
+        response = self.client.get(reverse("admin:catalog_bookinstance_changelist"))
+        actions = [
+            name for name, _ in response.context["action_form"].fields["action"].choices
+        ]
+        self.assertIn("mark_available", actions)
+        self.assertNotIn("mark_returned", actions)
+
+        staff.user_permissions.add(Permission.objects.get(codename="can_mark_returned"))
+        staff = User.objects.get(pk=staff.pk)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("admin:catalog_bookinstance_changelist"))
+        actions = [
+            name for name, _ in response.context["action_form"].fields["action"].choices
+        ]
+        self.assertIn("mark_returned", actions)
+
+    def test_estimated_count_only_for_unfiltered_postgres(self):
+        self.add_books(3)
+        with mock.patch.object(
+            EstimatedCountPaginator, "estimate", return_value=50_000
+        ) as estimate:
+            # Postgres' statistics are only read there
+            paginator = EstimatedCountPaginator(Book.objects.order_by("pk"), 10)
+            if connection.vendor == "postgresql":
+                self.assertEqual(paginator.count, 50_000)
+            else:
+                self.assertEqual(paginator.count, 3)
+                estimate.assert_not_called()
+            filtered = EstimatedCountPaginator(
+                Book.objects.filter(title="Dune 1").order_by("pk"), 10
+            )
+            self.assertEqual(filtered.count, 1)
+
+    def test_search_and_author_page(self):
+        (book,) = self.add_books(1)
+        self.add_copies(book, 1)
+        response = self.client.get(
+            reverse("admin:catalog_bookinstance_changelist"), {"q": "Dune"}
+        )
+        self.assertContains(response, "1 result")
+        response = self.client.get(
+            reverse("admin:catalog_author_change", args=[self.author.pk])
+        )
+        self.assertContains(response, f"?author__id__exact={self.author.pk}")
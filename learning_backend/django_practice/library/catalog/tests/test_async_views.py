@@ -0,0 +1,106 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from catalog import async_views
+from catalog.models import Author, Book, Genre, Language
+
+
+# the URLConf picks the async views at import time ('settings.CATALOG_ASYNC_VIEWS'), so they're
+# called directly with requests from the async request factory
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        language = Language.objects.create(name="English")
+        genre = Genre.objects.create(name="Fantasy")
+        cls.books = []
+        for number in range(5):
+            book = Book.objects.create(
+                title=f"Earthsea {number}",
+                summary="Wizards",
+                isbn=f"{number:013d}",
+                author=cls.author,
+                language=language,
+            )
+            book.genre.add(genre)
+            cls.books.append(book)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    def request(self, path):
+        request = self.factory.get(path)
+        request.user = AnonymousUser()
+        return request
+
+    async def render(self, response):
+        # rendering is left to Django's sync thread after the view returns, like under ASGI
+        return await sync_to_async(response.render)()
+
+    async def test_index(self):
+        response = await async_views.index(self.request(reverse("catalog:index")))
+        await self.render(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["num_books"], 5)
+        self.assertEqual(response.context_data["num_authors"], 1)
+
+    async def test_book_list_paginates(self):
+        view = async_views.BookListView.as_view()
+        response = await view(self.request(reverse("catalog:books") + "?page=2"))
+        await self.render(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context_data["is_paginated"])
+        self.assertEqual(response.context_data["page_obj"].number, 2)
+        # ordered by title descending, 2 per page
+        self.assertEqual(
+            [book.title for book in response.context_data["book_list"]],
+            ["Earthsea 2", "Earthsea 1"],
+        )
+
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    async def test_book_list_cursor_pagination(self):
+        view = async_views.BookListView.as_view()
+        response = await view(self.request(reverse("catalog:books")))
+        await self.render(response)
+        page = response.context_data["page_obj"]
+        self.assertEqual([book.title for book in page], ["Earthsea 4", "Earthsea 3"])
+
+        response = await view(
+            self.request(reverse("catalog:books") + f"?page={page.next_page_number()}")
+        )
+        await self.render(response)
+        self.assertEqual(
+            [book.title for book in response.context_data["page_obj"]],
+            ["Earthsea 2", "Earthsea 1"],
+        )
+
+    async def test_author_list(self):
+        view = async_views.AuthorListView.as_view()
+        response = await view(self.request(reverse("catalog:authors")))
+        await self.render(response)
+        self.assertEqual(list(response.context_data["author_list"]), [self.author])
+
+    async def test_book_detail(self):
+        book = self.books[0]
+        view = async_views.BookDetailView.as_view()
+        response = await view(
+            self.request(reverse("catalog:book_detail", args=[book.pk])), pk=book.pk
+        )
+        await self.render(response)
+        self.assertEqual(response.context_data["book"], book)
+        # prefetched by the async view itself, not lazily while rendering
+        self.assertEqual(
+            set(response.context_data["book"]._prefetched_objects_cache),
+            {"genre", "bookinstance_set"},
+        )
+        self.assertContains(response, book.title)
+
+    async def test_book_detail_missing(self):
+        view = async_views.BookDetailView.as_view()
+        with self.assertRaises(Http404):
+            await view(self.request(reverse("catalog:book_detail", args=[0])), pk=0)
@@ -0,0 +1,229 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth.models import Permission
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from catalog.models import Author, Book, Genre, Language
+from core.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_upload(width, height, name="cover.png"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "teal").save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+# workers=0 processes covers inline once the transaction commits, which the tests trigger with
+# 'captureOnCommitCallbacks(execute=True)'
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CATALOG_COVER_WORKERS=0,
+    CATALOG_COVER_WIDTHS=(200, 400, 600),
+    CATALOG_COVER_FORMATS=("webp", "jpeg"),
+)
+class CoverPipelineTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_book(self, cover):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Book.objects.create(
+                title="Cover story", summary="", isbn="1234567890123", cover_image=cover
+            )
+
+    def test_renditions_are_generated_after_upload(self):
+        book = self.create_book(image_upload(800, 400))
+        book.refresh_from_db()
+
+        self.assertEqual((book.cover_image_width, book.cover_image_height), (800, 400))
+        self.assertEqual(book.cover_renditions["source"], book.cover_image.name)
+        for format_name in ("webp", "jpeg"):
+            renditions = book.cover_renditions["formats"][format_name]
+            self.assertEqual(
+                [(width, height) for width, height, _name in renditions],
+                [(200, 100), (400, 200), (600, 300)],
+            )
+            for width, _height, name in renditions:
+                self.assertTrue(default_storage.exists(name))
+                with default_storage.open(name) as file:
+                    self.assertEqual(Image.open(file).width, width)
+
+    def test_small_covers_are_not_upscaled(self):
+        book = self.create_book(image_upload(150, 300))
+        book.refresh_from_db()
+        self.assertEqual(
+            [entry[:2] for entry in book.cover_renditions["formats"]["webp"]],
+            [[150, 300]],
+        )
+
+    def test_replacing_and_deleting_cover_removes_old_renditions(self):
+        book = self.create_book(image_upload(800, 400))
+        book.refresh_from_db()
+        old_names = [
+            name
+            for entries in book.cover_renditions["formats"].values()
+            for _width, _height, name in entries
+        ]
+
+        book.cover_image = image_upload(500, 500, "other.png")
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save()
+        book.refresh_from_db()
+        self.assertEqual(book.cover_image_width, 500)
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+
+        new_names = [name for _w, _h, name in book.cover_renditions["formats"]["webp"]]
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        for name in new_names:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_cover_picture_tag(self):
+        book = self.create_book(image_upload(800, 400))
+        book.refresh_from_db()
+        html = Template("{% load catalog_covers %}{% cover_picture book %}").render(
+            Context({"book": book})
+        )
+        self.assertIn('<source type="image/webp"', html)
+        self.assertRegex(html, r'<img src="[^"]+\.jpeg"')
+        self.assertIn("200w", html)
+        self.assertIn("600w", html)
+        # the aspect ratio of the smallest JPEG fallback
+        self.assertIn('width="200" height="100"', html)
+
+    def test_cover_picture_before_processing_uses_original(self):
+        # without executing the on-commit callbacks, nothing has been processed yet
+        book = Book.objects.create(
+            title="Pending",
+            summary="",
+            isbn="1234567890124",
+            cover_image=image_upload(80, 80),
+        )
+        html = Template("{% load catalog_covers %}{% cover_picture book %}").render(
+            Context({"book": book})
+        )
+        self.assertIn(f'src="{book.cover_image.url}"', html)
+        self.assertNotIn("<picture>", html)
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CATALOG_COVER_WORKERS=0,
+    CATALOG_COVER_WIDTHS=(200,),
+    CATALOG_COVER_FORMATS=("jpeg",),
+    CATALOG_DIRECT_COVER_UPLOADS=True,
+)
+class DirectCoverUploadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="librarian", password="secret")
+        cls.user.user_permissions.add(Permission.objects.get(codename="add_book"))
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.genre = Genre.objects.create(name="Science Fiction")
+        cls.language = Language.objects.create(name="English")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def start_upload(self, content_type="image/png"):
+        response = self.client.post(
+            reverse("catalog:cover_upload"),
+            {"filename": "cover.png", "content_type": content_type},
+        )
+        return response.status_code, response.json()
+
+    def put(self, upload, content):
+        return self.client.generic(
+            upload["method"],
+            upload["url"],
+            content,
+            content_type=upload["headers"]["Content-Type"],
+        )
+
+    def create_book(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("catalog:book_create"),
+                {
+                    "title": "The Dispossessed",
+                    "author": self.author.pk,
+                    "summary": "Anarres",
+                    "isbn": "1234567890123",
+                    "genre": [self.genre.pk],
+                    "language": self.language.pk,
+                    "cover_upload": token,
+                },
+            )
+
+    def test_cover_uploaded_to_storage_is_recorded(self):
+        response = self.client.get(reverse("catalog:book_create"))
+        # through the manifest, like every other static file
+        self.assertContains(
+            response, staticfiles_storage.url("catalog/js/cover_upload.js")
+        )
+
+        status, upload = self.start_upload()
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            self.put(upload, image_upload(300, 150).read()).status_code, 200
+        )
+
+        response = self.create_book(upload["token"])
+        self.assertEqual(response.status_code, 302)
+        book = Book.objects.get(isbn="1234567890123")
+        self.assertTrue(book.cover_image.name.startswith("cover-images/cover_"))
+        self.assertTrue(default_storage.exists(book.cover_image.name))
+        # processed like a cover uploaded with the form
+        self.assertEqual((book.cover_image_width, book.cover_image_height), (300, 150))
+
+    def test_invalid_uploads_are_rejected(self):
+        self.assertEqual(self.start_upload("text/html")[0], 400)
+
+        status, upload = self.start_upload()
+        # never uploaded
+        response = self.create_book(upload["token"])
+        self.assertFormError(
+            response.context["form"],
+            "cover_upload",
+            "The cover upload didn't finish, please upload it again",
+        )
+
+        self.put(upload, b"<html>not an image</html>")
+        response = self.create_book(upload["token"])
+        self.assertFormError(
+            response.context["form"], "cover_upload", "The cover isn't a valid image"
+        )
+        self.assertFalse(Book.objects.exists())
+
+        status, upload = self.start_upload()
+        self.put(upload, image_upload(300, 150).read())
+        other = User.objects.create_user(username="other")
+        other.user_permissions.add(Permission.objects.get(codename="add_book"))
+        self.client.force_login(other)
+        response = self.create_book(upload["token"])
+        self.assertFormError(
+            response.context["form"],
+            "cover_upload",
+            "The cover was uploaded by someone else",
+        )
+
+    def test_requires_book_permissions(self):
+        self.client.force_login(User.objects.create_user(username="reader"))
+        response = self.client.post(
+            reverse("catalog:cover_upload"),
+            {"filename": "cover.png", "content_type": "image/png"},
+        )
+        self.assertEqual(response.status_code, 403)
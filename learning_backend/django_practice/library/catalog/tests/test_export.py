@@ -0,0 +1,170 @@
+import csv
+import io
+import json
+import tempfile
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import exporter
+from catalog.exporter import export
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class ExportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(
+            first_name="Ursula", last_name="Le Guin", date_of_birth="1929-10-21"
+        )
+        language = Language.objects.create(name="English")
+        fantasy = Genre.objects.create(name="Fantasy")
+        classics = Genre.objects.create(name="Classics")
+        for number in range(5):
+            book = Book.objects.create(
+                title=f"Earthsea {number}",
+                summary="Wizards",
+                isbn=f"{number:013d}",
+                author=author,
+                language=language,
+            )
+            book.genre.add(fantasy, classics)
+            BookInstance.objects.create(book=book, imprint="Parnassus", status="a")
+        # no author, language or genres
+        Book.objects.create(title="Anonymous", summary="", isbn="9999999999999")
+
+
+class ExporterTest(ExportTestCase):
+    def test_csv_streams_in_chunks(self):
+        chunks = list(export("books", "csv", chunk_size=2))
+        # 6 books in chunks of 2
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]["author_last_name"], "Le Guin")
+        self.assertEqual(rows[0]["author_date_of_birth"], "1929-10-21")
+        self.assertEqual(rows[0]["genres"], "Classics;Fantasy")
+        self.assertEqual(rows[5]["language"], "")
+
+    def test_genres_are_prefetched_per_chunk(self):
+        # one query for the books (one cursor) and one for the genres of each chunk, rather than
+        # one per book
+        with self.assertNumQueries(4):
+            list(export("books", "jsonl", chunk_size=2))
+
+    def test_jsonl_copies(self):
+        lines = b"".join(export("copies", "jsonl")).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        row = json.loads(lines[0])
+        self.assertEqual(row["imprint"], "Parnassus")
+        self.assertEqual(row["genres"], ["Classics", "Fantasy"])
+        self.assertEqual(row["language"], "English")
+
+    def test_csv_export_can_be_imported(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv") as file:
+            for chunk in export("books", "csv"):
+                file.write(chunk)
+            file.flush()
+            out = io.StringIO()
+            call_command("import_catalog", file.name, stdout=out, stderr=io.StringIO())
+        # importing an export matches every row up with what's already there
+        self.assertIn("Imported 6 books", out.getvalue())
+        self.assertEqual(Book.objects.count(), 6)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+
+    @skipUnless(pq, "pyarrow is not installed")
+    def test_parquet(self):
+        data = b"".join(export("copies", "parquet", chunk_size=2))
+        table = pq.read_table(io.BytesIO(data))
+        self.assertEqual(table.num_rows, 5)
+        # one row group per chunk
+        self.assertEqual(pq.ParquetFile(io.BytesIO(data)).num_row_groups, 3)
+        self.assertEqual(table.column("genres")[0].as_py(), ["Classics", "Fantasy"])
+
+
+def without_pyarrow(test):
+    """As if pyarrow (an optional dependency) weren't installed."""
+    test = mock.patch.dict(
+        exporter.UNAVAILABLE_FORMATS, {"parquet": "pyarrow isn't installed"}
+    )(test)
+    return mock.patch.dict(
+        exporter.CONTENT_TYPES,
+        {"csv": "text/csv", "jsonl": "application/x-ndjson"},
+        clear=True,
+    )(test)
+
+
+class ExportCommandTest(ExportTestCase):
+    @without_pyarrow
+    def test_parquet_without_pyarrow(self):
+        with self.assertRaisesMessage(CommandError, "pyarrow"):
+            call_command("export_catalog", "books", format="parquet")
+
+
+class ExportViewTest(ExportTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            username="analyst", password="1X<ISRUkw+tuK"
+        )
+        self.client.login(username="analyst", password="1X<ISRUkw+tuK")
+
+    def test_requires_permission(self):
+        response = self.client.get(
+            reverse("catalog:catalog_export", args=["books", "csv"])
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_streams_export(self):
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="can_export_catalog")
+        )
+        response = self.client.get(
+            reverse("catalog:catalog_export", args=["copies", "jsonl"])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn("catalog-copies.jsonl", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+    async def test_streams_export_under_asgi(self):
+        await self.user.user_permissions.aadd(
+            await Permission.objects.aget(codename="can_export_catalog")
+        )
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse("catalog:catalog_export", args=["books", "csv"])
+        )
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 7)
+
+    def test_unknown_format(self):
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="can_export_catalog")
+        )
+        response = self.client.get(
+            reverse("catalog:catalog_export", args=["books", "xml"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    @without_pyarrow
+    def test_parquet_without_pyarrow(self):
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="can_export_catalog")
+        )
+        response = self.client.get(
+            reverse("catalog:catalog_export", args=["books", "parquet"])
+        )
+        self.assertEqual(response.status_code, 404)
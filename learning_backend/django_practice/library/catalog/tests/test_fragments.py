@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance
+
+
+class FragmentCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="John", last_name="Smith")
+        cls.book = Book.objects.create(
+            title="Original Title",
+            summary="My book summary",
+            isbn="1234567890123",
+            author=cls.author,
+        )
+        cls.librarian = get_user_model().objects.create_user(  # type: ignore
+            username="librarian", password="1X<ISRUkw+tuK"
+        )
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename="change_book")
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("catalog:book_detail", args=[self.book.pk])
+
+    def test_fragment_is_served_from_cache_until_a_model_changes(self):
+        self.assertContains(self.client.get(self.url), "Original Title")
+
+        # queryset updates don't send signals, so the cached fragment is still served
+        Book.objects.filter(pk=self.book.pk).update(title="Changed Title")
+        self.assertContains(self.client.get(self.url), "Original Title")
+
+        # saving any copy of any book invalidates fragments depending on BookInstance
+        BookInstance.objects.create(book=self.book, imprint="Imprint")
+        self.assertContains(self.client.get(self.url), "Changed Title")
+
+    def test_related_model_changes_invalidate(self):
+        self.assertContains(self.client.get(self.url), "Smith")
+        self.author.last_name = "Jones"
+        self.author.save()
+        self.assertContains(self.client.get(self.url), "Jones")
+
+    def test_permission_sections_are_not_shared_between_users(self):
+        update_url = reverse("catalog:book_update", args=[self.book.pk])
+
+        self.client.login(username="librarian", password="1X<ISRUkw+tuK")
+        self.assertContains(self.client.get(self.url), update_url)
+
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.url), update_url)
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.search import search_books
+
+CSV = """isbn,title,summary,author_first_name,author_last_name,language,genres,copies,imprint,status
+9780000000001,A Wizard of Earthsea,Magic school,Ursula,Le Guin,English,Fantasy;Classics,2,Parnassus,a
+9780000000002,The Dispossessed,Anarchist moon,Ursula,Le Guin,English,science fiction,1,Harper,o
+,No ISBN,,,,,,,,
+9780000000003,Kindred,Time travel,Octavia,Butler,English,FANTASY,0,,
+"""
+
+
+class ImportCatalogTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as file:
+            file.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        Genre.objects.create(name="Science Fiction")
+        out, err = self.run_import(self.write("books.csv", CSV), "--batch-size", "2")
+
+        self.assertIn("Skipping record 3", err)
+        self.assertIn("Imported 3 books and 3 copies", out)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 1)
+        # genre names are matched case-insensitively, both against existing genres and each other
+        self.assertEqual(
+            sorted(Genre.objects.values_list("name", flat=True)),
+            ["Classics", "Fantasy", "Science Fiction"],
+        )
+        earthsea = Book.objects.get(isbn="9780000000001")
+        self.assertEqual(str(earthsea.author), "Le Guin, Ursula")
+        self.assertEqual(
+            sorted(genre.name for genre in earthsea.genre.all()),
+            ["Classics", "Fantasy"],
+        )
+        self.assertEqual(
+            list(earthsea.bookinstance_set.values_list("imprint", "status")),
+            [("Parnassus", "a")] * 2,
+        )
+        # bulk inserts skip the signals, so the importer indexes the books itself
+        self.assertEqual(list(search_books("earthsea")), [earthsea])
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        path = self.write("books.csv", CSV)
+        self.run_import(path)
+        self.run_import(self.write("books.csv", CSV.replace("Magic school", "Dragons")))
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(BookInstance.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.objects.get(isbn="9780000000001").summary, "Dragons")
+
+    def test_jsonl_import(self):
+        copy_id = "0b7c3b9e-3a53-4b6e-8f0e-0a3c6f6d1a01"
+        record = {
+            "isbn": "9780000000004",
+            "title": "Parable of the Sower",
+            "author_first_name": "Octavia",
+            "author_last_name": "Butler",
+            "author_date_of_birth": "1947-06-22",
+            "genres": ["Dystopia"],
+            "copies": [
+                {"id": copy_id, "imprint": "Four Walls", "due_back": "2030-01-01"}
+            ],
+        }
+        self.run_import(self.write("books.jsonl", json.dumps(record) + "\n"))
+
+        copy = BookInstance.objects.get(pk=copy_id)
+        self.assertEqual(copy.book.title, "Parable of the Sower")
+        self.assertEqual(str(copy.due_back), "2030-01-01")
+        self.assertEqual(str(copy.book.author.date_of_birth), "1947-06-22")
+
+    def test_reimport_updates_existing_authors_dates(self):
+        butler = Author.objects.create(first_name="Octavia", last_name="Butler")
+        record = {
+            "isbn": "9780000000004",
+            "title": "Parable of the Sower",
+            "author_first_name": "Octavia",
+            "author_last_name": "Butler",
+            "author_date_of_birth": "1947-06-21",
+        }
+        # every run is a new importer, so the authors aren't in its cache yet
+        self.run_import(self.write("books.jsonl", json.dumps(record) + "\n"))
+        butler.refresh_from_db()
+        self.assertEqual(str(butler.date_of_birth), "1947-06-21")
+
+        record["author_date_of_birth"] = "1947-06-22"
+        self.run_import(self.write("books.jsonl", json.dumps(record) + "\n"))
+        butler.refresh_from_db()
+        self.assertEqual(str(butler.date_of_birth), "1947-06-22")
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write("books.csv", CSV)
+        with open(f"{path}.progress", "w") as file:
+            json.dump({"size": os.path.getsize(path), "records": 2}, file)
+
+        out, _err = self.run_import(path)
+        self.assertIn("Resuming after record 2", out)
+        self.assertEqual(
+            list(Book.objects.values_list("isbn", flat=True)), ["9780000000003"]
+        )
+        # finished, so the next run starts over
+        self.assertFalse(os.path.exists(f"{path}.progress"))
@@ -0,0 +1,141 @@
+import datetime
+import uuid
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.counters import get_counters
+from catalog.loans import (
+    checkout_copies,
+    default_due_date,
+    renew_copies,
+    reserve_copies,
+    return_copies,
+)
+from catalog.models import Book, BookInstance
+from core.models import User
+
+STATUS = BookInstance.LOAN_STATUS
+
+
+class LoanServiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username="reader", password="secret")
+        cls.other = User.objects.create_user(username="other", password="secret")
+        cls.book = Book.objects.create(
+            title="Dune", summary="Sand", isbn="0000000000001"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def copies(self, count, status=STATUS.Available, **fields):
+        return [
+            BookInstance.objects.create(
+                book=self.book, imprint="Ace", status=status, **fields
+            )
+            for _ in range(count)
+        ]
+
+    def test_checkout(self):
+        copy = self.copies(1)[0]
+        result = checkout_copies([copy.pk], self.reader)
+
+        self.assertEqual(result.changed, [copy.pk])
+        copy.refresh_from_db()
+        self.assertEqual(copy.status, STATUS.OnLoan)
+        self.assertEqual(copy.borrower, self.reader)
+        self.assertEqual(copy.due_back, default_due_date())
+
+    def test_checkout_of_reserved_copy_only_by_its_borrower(self):
+        copy = self.copies(1)[0]
+        reserve_copies([copy.pk], self.reader)
+
+        result = checkout_copies([copy.pk], self.other)
+        self.assertEqual(result.skipped, {copy.pk: "is reserved"})
+
+        result = checkout_copies([copy.pk], self.reader)
+        self.assertEqual(result.changed, [copy.pk])
+
+    def test_batch_return_skips_copies_that_are_not_on_loan(self):
+        loaned = self.copies(
+            3, STATUS.OnLoan, borrower=self.reader, due_back=datetime.date.today()
+        )
+        available = self.copies(1)[0]
+        missing = uuid.uuid4()
+
+        # ids may come in as strings (e.g. from a scanner)
+        result = return_copies(
+            [str(copy.pk) for copy in loaned] + [available.pk, missing]
+        )
+
+        self.assertEqual(sorted(result.changed), sorted(copy.pk for copy in loaned))
+        self.assertEqual(
+            result.skipped, {available.pk: "is available", missing: "doesn't exist"}
+        )
+        self.assertFalse(
+            BookInstance.objects.filter(
+                pk__in=result.changed, borrower__isnull=False
+            ).exists()
+        )
+
+    def test_batch_size_does_not_change_number_of_queries(self):
+        loaned = self.copies(50, STATUS.OnLoan, borrower=self.reader)
+        # savepoint, locking select, update, release
+        with self.assertNumQueries(4):
+            result = return_copies(copy.pk for copy in loaned)
+        self.assertEqual(len(result.changed), 50)
+
+    def test_renew_only_writes_due_date(self):
+        copy = self.copies(1, STATUS.OnLoan, borrower=self.reader)[0]
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        # changed behind the service's back; a whole-row save would overwrite it
+        BookInstance.objects.filter(pk=copy.pk).update(imprint="Gollancz")
+
+        renew_copies([copy.pk], due_back)
+
+        copy.refresh_from_db()
+        self.assertEqual(copy.due_back, due_back)
+        self.assertEqual(copy.imprint, "Gollancz")
+
+    def test_counters_invalidated_on_commit(self):
+        copy = self.copies(1, STATUS.OnLoan, borrower=self.reader)[0]
+        self.assertEqual(get_counters()["num_instances_available"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return_copies([copy.pk])
+
+        self.assertEqual(get_counters()["num_instances_available"], 1)
+
+
+class RenewViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(
+            username="librarian", password="secret"
+        )
+        cls.librarian.user_permissions.add(
+            Permission.objects.get(codename="can_mark_returned")
+        )
+        book = Book.objects.create(title="Dune", summary="Sand", isbn="0000000000001")
+        cls.copy = BookInstance.objects.create(
+            book=book, imprint="Ace", status=STATUS.Available
+        )
+
+    def test_renewing_a_copy_that_is_not_on_loan_shows_error(self):
+        self.client.login(username="librarian", password="secret")
+        for name in ("renew_book_librarian", "renew_book_librarian_function"):
+            response = self.client.post(
+                reverse(f"catalog:{name}", kwargs={"pk": self.copy.pk}),
+                {"renewal_date": datetime.date.today() + datetime.timedelta(weeks=2)},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.context["form"].non_field_errors(),
+                ["This copy can't be renewed: it is available."],
+            )
+        self.copy.refresh_from_db()
+        self.assertIsNone(self.copy.due_back)
@@ -0,0 +1,96 @@
+import datetime
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog.models import Book, BookInstance, OverdueScan
+from catalog.overdue import scan_overdue
+from core.models import User
+
+STATUS = BookInstance.LOAN_STATUS
+TODAY = datetime.date(2024, 5, 20)
+
+
+class ScanOverdueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title="Dune", summary="Sand", isbn="0000000000001")
+
+        def loan(borrower, due_back, status=STATUS.OnLoan):
+            BookInstance.objects.create(
+                book=book,
+                imprint="Ace",
+                status=status,
+                borrower=borrower,
+                due_back=due_back,
+            )
+
+        cls.readers = [
+            User.objects.create_user(
+                username=f"reader{n}", email=f"reader{n}@example.com"
+            )
+            for n in range(5)
+        ]
+        for reader in cls.readers:
+            loan(reader, TODAY - datetime.timedelta(days=3))
+            loan(reader, TODAY - datetime.timedelta(days=1))
+            # not overdue yet
+            loan(reader, TODAY)
+        # reserved copies have no meaningful due date
+        loan(cls.readers[0], TODAY - datetime.timedelta(days=10), STATUS.Reserved)
+        # can't be emailed
+        loan(
+            User.objects.create_user(username="no_email"),
+            TODAY - datetime.timedelta(days=2),
+        )
+        loan(None, TODAY - datetime.timedelta(days=2))
+
+    def test_one_email_per_borrower(self):
+        scan = scan_overdue(today=TODAY)
+
+        self.assertEqual(len(mail.outbox), 5)
+        message = next(m for m in mail.outbox if m.to == ["reader0@example.com"])
+        self.assertEqual(message.subject, "cshock.tech Library: 2 overdue books")
+        self.assertIn("Hi reader0,", message.body)
+        self.assertIn("(3 days ago)", message.body)
+        self.assertIn("(1 day ago)", message.body)
+
+        self.assertEqual(scan.overdue_loans, 12)
+        self.assertEqual(scan.borrowers, 6)
+        self.assertEqual(scan.unreachable, 2)
+        self.assertEqual(scan.emails_sent, 5)
+        self.assertEqual(OverdueScan.objects.latest(), scan)
+
+    def test_sends_in_batches_over_one_connection(self):
+        with mock.patch.object(
+            EmailBackend, "send_messages", autospec=True, return_value=2
+        ) as send_messages:
+            scan = scan_overdue(today=TODAY, batch_size=2)
+
+        self.assertEqual(
+            [len(call.args[1]) for call in send_messages.call_args_list], [2, 2, 1]
+        )
+        self.assertEqual(
+            len({call.args[0] for call in send_messages.call_args_list}), 1
+        )
+        self.assertEqual(scan.emails_sent, 6)
+
+    def test_failed_batch_is_counted_and_scan_continues(self):
+        with mock.patch.object(
+            EmailBackend, "send_messages", side_effect=[OSError, 2, 1]
+        ), self.assertLogs("catalog.overdue", "ERROR"):
+            scan = scan_overdue(today=TODAY, batch_size=2)
+
+        self.assertEqual(scan.emails_failed, 2)
+        self.assertEqual(scan.emails_sent, 3)
+
+    def test_dry_run(self):
+        call_command("scan_overdue", "--dry-run", f"--date={TODAY}", stdout=mock.Mock())
+
+        self.assertEqual(mail.outbox, [])
+        scan = OverdueScan.objects.latest()
+        self.assertTrue(scan.dry_run)
+        self.assertEqual(scan.overdue_loans, 12)
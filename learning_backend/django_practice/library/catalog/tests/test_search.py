@@ -0,0 +1,115 @@
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, BookSearchIndex, Genre
+from catalog.search import SearchMode, reindex_all_books, search_books
+
+
+class SearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        cls.fantasy = Genre.objects.create(name="Fantasy")
+        cls.wizard = Book.objects.create(
+            title="A Wizard of Earthsea",
+            summary="A young mage on the islands of Earthsea",
+            isbn="1111111111111",
+            author=cls.author,
+        )
+        cls.wizard.genre.add(cls.fantasy)
+        cls.dispossessed = Book.objects.create(
+            title="The Dispossessed",
+            summary="An anarchist physicist travels to a neighbouring wizard-free world",
+            isbn="2222222222222",
+            author=cls.author,
+        )
+
+
+class SearchBooksTest(SearchTestCase):
+    def test_matches_title_summary_author_and_genre(self):
+        self.assertEqual(list(search_books("earthsea")), [self.wizard])
+        self.assertEqual(list(search_books("physicist")), [self.dispossessed])
+        self.assertEqual(len(search_books("guin")), 2)
+        self.assertEqual(list(search_books("fantasy")), [self.wizard])
+
+    def test_title_matches_rank_above_summary_matches(self):
+        self.assertEqual(list(search_books("wizard")), [self.wizard, self.dispossessed])
+
+    def test_prefix_mode(self):
+        self.assertEqual(list(search_books("earth")), [])
+        self.assertEqual(list(search_books("earth", SearchMode.PREFIX)), [self.wizard])
+
+    def test_query_syntax_is_not_interpreted(self):
+        # every word must match: no book has both, so OR wasn't taken as an operator
+        self.assertEqual(list(search_books("earthsea OR physicist")), [])
+        # nor '-' as an exclusion (the other book would match)
+        self.assertEqual(list(search_books("guin -physicist")), [self.dispossessed])
+        self.assertEqual(list(search_books('"earthsea*')), [self.wizard])
+        self.assertEqual(list(search_books("  ")), [])
+
+    def test_index_follows_related_changes(self):
+        self.author.first_name = "Ursula K."
+        self.author.last_name = "LeGuin"
+        self.author.save()
+        self.assertEqual(len(search_books("leguin")), 2)
+
+        self.fantasy.book_set.add(self.dispossessed)
+        self.assertEqual(len(search_books("fantasy")), 2)
+        self.fantasy.delete()
+        self.assertEqual(len(search_books("fantasy")), 0)
+
+    def test_reindex_all_books(self):
+        self.assertEqual(reindex_all_books(batch_size=1), 2)
+        self.assertEqual(list(search_books("earthsea")), [self.wizard])
+
+    def test_migration_indexes_existing_books(self):
+        BookSearchIndex.objects.all().delete()
+        self.assertEqual(list(search_books("earthsea")), [])
+
+        # with the app registry as of the migration, like 'migrate' runs it
+        executor = MigrationExecutor(connection)
+        state = executor.loader.project_state(("catalog", "0012_booksearchindex"))
+        migration = import_module("catalog.migrations.0012_booksearchindex")
+        migration.index_existing_books(state.apps, None)
+        self.assertEqual(list(search_books("earthsea")), [self.wizard])
+
+
+class BookSearchViewTest(SearchTestCase):
+    def test_search_page(self):
+        response = self.client.get(
+            reverse("catalog:book_search"), {"q": "earth", "mode": SearchMode.PREFIX}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "catalog/book_search.html")
+        self.assertEqual(list(response.context["book_list"]), [self.wizard])
+
+    def test_empty_search_page(self):
+        response = self.client.get(reverse("catalog:book_search"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["book_list"]), 0)
+
+    def test_loaned_books_search(self):
+        user = get_user_model().objects.create_user(  # type: ignore
+            username="librarian", password="1X<ISRUkw+tuK"
+        )
+        user.user_permissions.add(Permission.objects.get(codename="can_mark_returned"))
+        for book in (self.wizard, self.dispossessed):
+            BookInstance.objects.create(
+                book=book, imprint="Imprint", status=BookInstance.LOAN_STATUS.OnLoan
+            )
+        self.client.login(username="librarian", password="1X<ISRUkw+tuK")
+
+        response = self.client.get(
+            reverse("catalog:all_borrowed"), {"search": "earths"}
+        )
+        self.assertEqual(
+            [copy.book for copy in response.context["books_list"]], [self.wizard]
+        )
+        response = self.client.get(reverse("catalog:all_borrowed"))
+        self.assertEqual(len(response.context["books_list"]), 2)
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase
+
+from catalog.models import Book, BookInstance, BookSearchIndex
+from catalog.seeding import CatalogSeeder
+from core.models import User
+
+
+class SeedCatalogTest(TestCase):
+    def test_seeds_requested_amounts(self):
+        call_command(
+            "seed_catalog",
+            "--books=25",
+            "--copies-per-book=4",
+            "--users=10",
+            "--batch-size=10",
+            stdout=StringIO(),
+        )
+        self.assertEqual(Book.objects.count(), 25)
+        self.assertEqual(BookInstance.objects.count(), 100)
+        self.assertEqual(
+            User.objects.filter(username__startswith="seed-reader-").count(), 10
+        )
+        # bulk inserts skip the signals, so the search index is filled by the seeder itself
+        self.assertEqual(BookSearchIndex.objects.count(), 25)
+        self.assertFalse(
+            BookInstance.objects.filter(
+                status=BookInstance.LOAN_STATUS.OnLoan, borrower__isnull=True
+            ).exists()
+        )
+        librarian = User.objects.get(username="seed-librarian")
+        self.assertTrue(librarian.has_perm("catalog.can_mark_returned"))
+
+    def test_same_seed_same_data(self):
+        CatalogSeeder(seed=7).seed(books=5, copies_per_book=2, users=3)
+        first = list(BookInstance.objects.values_list("id", "status").order_by("id"))
+        titles = list(Book.objects.values_list("title", flat=True).order_by("pk"))
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+
+        CatalogSeeder(seed=7).seed(books=5, copies_per_book=2, users=3)
+        self.assertEqual(
+            list(BookInstance.objects.values_list("id", "status").order_by("id")), first
+        )
+        self.assertEqual(
+            list(Book.objects.values_list("title", flat=True).order_by("pk")), titles
+        )
+
+
+class LoadTestCommandTest(LiveServerTestCase):
+    def setUp(self):
+        CatalogSeeder().seed(books=10, copies_per_book=3, users=5)
+
+    def test_reports_every_endpoint(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            call_command(
+                "load_test",
+                f"--url={self.live_server_url}",
+                "--requests=20",
+                "--warmup=0",
+                "--concurrency=2",
+                f"--json={path}",
+                stdout=out,
+            )
+            with open(path) as file:
+                results = json.load(file)
+
+        endpoints = results["endpoints"]
+        for name in ("books", "book_detail", "all_borrowed", "my_borrowed", "renew"):
+            self.assertIn(name, out.getvalue())
+            self.assertEqual(endpoints[name]["requests"], 4)
+            # logged in (with a valid CSRF token for the renewals) and allowed
+            self.assertEqual(endpoints[name]["errors"], 0)
+        self.assertGreater(endpoints["total"]["p50_ms"], 0)
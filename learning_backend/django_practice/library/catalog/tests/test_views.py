@@ -6,7 +6,10 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import (
     Permission,
 )
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
@@ -67,6 +70,148 @@ class AuthorListViewTest(TestCase):
                 )
         self.assertFalse(response.context["page_obj"].has_next())
 
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_sequential_forwards_and_backwards(self):
+        authors = list(Author.objects.all())
+        seen = []
+        response = self.client.get(reverse("catalog:authors"))
+        while True:
+            seen.extend(response.context["author_list"])
+            if not response.context["page_obj"].has_next():
+                break
+            response = self.client.get(
+                reverse("catalog:authors"),
+                {"page": response.context["page_obj"].next_page_number()},
+            )
+        self.assertEqual(seen, authors)
+
+        seen = []
+        while True:
+            seen[:0] = response.context["author_list"]
+            if not response.context["page_obj"].has_previous():
+                break
+            response = self.client.get(
+                reverse("catalog:authors"),
+                {"page": response.context["page_obj"].previous_page_number()},
+            )
+        self.assertEqual(seen, authors)
+        self.assertEqual(response.context["page_obj"].number, 1)
+
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_does_not_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("catalog:authors"))
+        self.assertTrue(response.context["is_paginated"])
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_invalid_cursor_is_404(self):
+        response = self.client.get(reverse("catalog:authors"), {"page": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class DetailViewQueryCountTest(TestCase):
+    # book (joined with author and language), genres and copies; anonymous requests don't load a
+    # session or permissions
+    BOOK_DETAIL_QUERIES = 3
+    # author, books and the books' genres
+    AUTHOR_DETAIL_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name="John", last_name="Smith")
+        cls.language = Language.objects.create(name="English")
+        cls.book = cls.add_book(0)
+
+    @classmethod
+    def add_book(cls, index):
+        book = Book.objects.create(
+            title=f"Book {index}",
+            summary="My book summary",
+            isbn=f"{index:013d}",
+            author=cls.author,
+            language=cls.language,
+        )
+        book.genre.add(Genre.objects.create(name=f"Genre {index}"))
+        BookInstance.objects.create(book=book, imprint="Imprint")
+        return book
+
+    def add_copies_and_genres(self):
+        for index in range(5):
+            self.book.genre.add(Genre.objects.create(name=f"Extra genre {index}"))
+            BookInstance.objects.create(book=self.book, imprint="Imprint")
+            self.add_book(index + 1)
+
+    def test_book_detail_query_count_is_fixed(self):
+        for url in (
+            reverse("catalog:book_detail", args=[self.book.pk]),
+            reverse("catalog:book_detail_nonregexp", args=[self.book.pk]),
+        ):
+            with self.assertNumQueries(self.BOOK_DETAIL_QUERIES):
+                self.client.get(url)
+
+        self.add_copies_and_genres()
+        for url in (
+            reverse("catalog:book_detail", args=[self.book.pk]),
+            reverse("catalog:book_detail_nonregexp", args=[self.book.pk]),
+        ):
+            with self.assertNumQueries(self.BOOK_DETAIL_QUERIES):
+                response = self.client.get(url)
+            self.assertEqual(len(response.context["book"].bookinstance_set.all()), 6)
+
+    def test_author_detail_query_count_is_fixed(self):
+        url = reverse("catalog:author_detail", args=[self.author.pk])
+        with self.assertNumQueries(self.AUTHOR_DETAIL_QUERIES):
+            self.client.get(url)
+
+        self.add_copies_and_genres()
+        with self.assertNumQueries(self.AUTHOR_DETAIL_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["author"].book_set.all()), 6)
+
+
+class IndexViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name="Anne", last_name="Memoir")
+        Genre.objects.create(name="Trash Fiction")
+        book = Book.objects.create(
+            title="Memories", summary="A summary", isbn="1234567890123", author=author
+        )
+        BookInstance.objects.create(
+            book=book, imprint="Imprint", status=BookInstance.LOAN_STATUS.Available
+        )
+        BookInstance.objects.create(book=book, imprint="Imprint")
+
+    def setUp(self):
+        # the cache is not reset between tests like the DB is
+        cache.clear()
+
+    def test_counters(self):
+        response = self.client.get(reverse("catalog:index"))
+        self.assertEqual(response.context["num_books"], 1)
+        self.assertEqual(response.context["num_books_containing_memor"], 1)
+        self.assertEqual(response.context["num_instances"], 2)
+        self.assertEqual(response.context["num_instances_available"], 1)
+        self.assertEqual(response.context["num_authors"], 1)
+        self.assertEqual(response.context["num_genre_containing_trash"], 1)
+
+    def test_counters_computed_in_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse("catalog:index"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("catalog:index"))
+
+    def test_counters_invalidated_on_save_and_delete(self):
+        self.client.get(reverse("catalog:index"))
+        author = Author.objects.create(first_name="New", last_name="Author")
+        response = self.client.get(reverse("catalog:index"))
+        self.assertEqual(response.context["num_authors"], 2)
+
+        author.delete()
+        response = self.client.get(reverse("catalog:index"))
+        self.assertEqual(response.context["num_authors"], 1)
+
 
 class TestUserTestCase(TestCase):
     def setUp(self) -> None:
@@ -172,6 +317,34 @@ class LoanedBookInstancesByUserListViewTest(TestUserTestCase):
             self.assertTrue(last_date <= book.due_back)
             last_date = book.due_back
 
+    @override_settings(CATALOG_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_with_duplicate_due_dates(self):
+        BookInstance.objects.update(status=BookInstance.LOAN_STATUS.OnLoan)
+        # a NULL due date sorts after every other date
+        BookInstance.objects.filter(
+            pk=BookInstance.objects.filter(borrower=self.test_user1).first().pk  # type: ignore
+        ).update(due_back=None)
+
+        response = self.login_and_get_view_and_assert_logged_in()
+        seen = []
+        while True:
+            seen.extend(response.context[AllLoanedBooksListView.context_object_name])  # type: ignore
+            if not response.context["page_obj"].has_next():
+                break
+            response = self.client.get(
+                reverse("catalog:my_borrowed"),
+                {"page": response.context["page_obj"].next_page_number()},
+            )
+        self.assertEqual(
+            sorted(book.pk for book in seen),
+            sorted(
+                BookInstance.objects.filter(borrower=self.test_user1).values_list(
+                    "pk", flat=True
+                )
+            ),
+        )
+        self.assertIsNone(seen[-1].due_back)
+
 
 class RenewBookInstancesViewTest(TestUserTestCase):
     def setUp(self):
@@ -1,15 +1,22 @@
+from django.conf import settings
 from django.urls import path, re_path
 
-from . import views
+from . import async_views, views
 
 app_name = __package__
 
+# the async module has the same names for the views it provides
+read_views = async_views if settings.CATALOG_ASYNC_VIEWS else views
+
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("books/", views.BookListView.as_view(), name="books"),
+    path("", read_views.index, name="index"),
+    path("books/", read_views.BookListView.as_view(), name="books"),
+    path("books/search/", views.BookSearchView.as_view(), name="book_search"),
     # 're_path()' performs match using regexp (takes a string argument though)
     # - NOTE: capture groups without names are passed as positional arguments to the view function
-    re_path(r"^book/(?P<pk>\d+)/$", views.BookDetailView.as_view(), name="book_detail"),
+    re_path(
+        r"^book/(?P<pk>\d+)/$", read_views.BookDetailView.as_view(), name="book_detail"
+    ),
     # equivalent to former line, except adding the optional kwargs argument
     # - NOTE: conflict between kwargs and captured argument names will prefer the kwargs value
     path(
@@ -18,7 +25,7 @@ urlpatterns = [
         {"extra_info": "some goodies"},
         name="book_detail_nonregexp",
     ),
-    path("authors/", views.AuthorListView.as_view(), name="authors"),
+    path("authors/", read_views.AuthorListView.as_view(), name="authors"),
     path("authors/<int:pk>/", views.AuthorDetailView.as_view(), name="author_detail"),
     path("mybooks/", views.LoanedBooksByUserListView.as_view(), name="my_borrowed"),
     path("loanedbooks/", views.AllLoanedBooksListView.as_view(), name="all_borrowed"),
@@ -52,6 +59,7 @@ urlpatterns = [
         views.BookCreate.as_view(),
         name="book_create",
     ),
+    path("book/cover-upload/", views.cover_upload, name="cover_upload"),
     path(
         "author/<int:pk>/update/",
         views.AuthorUpdate.as_view(),
@@ -67,5 +75,10 @@ urlpatterns = [
         views.AuthorCreate.as_view(),
         name="author_create",
     ),
+    path(
+        "export/<str:dataset>.<str:format>",
+        views.export_catalog,
+        name="catalog_export",
+    ),
     path("session-playground/", views.sessionPlayground, name="session_playground"),
 ]
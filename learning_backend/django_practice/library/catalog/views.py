@@ -1,54 +1,60 @@
 import datetime
 from typing import Any, override
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch
 from django.db.models.base import Model as Model
 from django.forms import BaseModelForm
-from django.http import HttpRequest, HttpResponseRedirect
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse, reverse_lazy
 from django.views import generic
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, DeleteView, UpdateView
 
+from .counters import get_counters
+from .covers import prefetch_cover_urls, start_cover_upload
+from .exporter import CONTENT_TYPES, DATASETS, export, stream_async
 from .forms import CrispyBookForm, RenewBookForm, RenewBookModelForm
-from .models import Author, Book, BookInstance, Genre
+from .loans import renew_copies
+from .models import Author, Book, BookInstance
+from .pagination import CursorPaginationMixin
+from .search import SearchMode, search_books
 
 
 # function-based view
 def index(request):
     """View function for home page of site."""
 
-    num_books = Book.objects.all().count()  # all() is implied by default.
-    num_instances = BookInstance.objects.count()
-
-    # Available books (status = 'a')
-    num_instances_available = BookInstance.objects.filter(
-        status__exact=BookInstance.LOAN_STATUS.Available
-    ).count()
-
-    num_authors = Author.objects.count()
-
-    num_books_containing_memor = Book.objects.filter(title__icontains="memor").count()
-    num_genre_containing_trash: int = Genre.objects.filter(
-        name__icontains="trash"
-    ).count()
-
-    context = {
-        "num_books": num_books,
-        "num_instances": num_instances,
-        "num_instances_available": num_instances_available,
-        "num_authors": num_authors,
-        "num_books_containing_memor": num_books_containing_memor,
-        "num_genre_containing_trash": num_genre_containing_trash,
-    }
+    # all six counters come from the cache (or a single query on a cache miss), which is kept
+    # current by the model signals in 'catalog.signals'
+    context = get_counters()
 
     # Render the HTML template index.html with the data in the context variable
     return render(request, "catalog/index.html", context=context)
 
 
+def book_detail_queryset():
+    """Books with everything 'book_detail.html' renders: author, language, genres and copies."""
+    # select_related() joins the foreign keys into the same query, while prefetch_related() runs
+    # one extra query per relation for all the rows at once (required for reverse/many-to-many)
+    return Book.objects.select_related("author", "language").prefetch_related(
+        "genre", "bookinstance_set"
+    )
+
+
 # class-based view
-class BookListView(generic.ListView):
+class BookListView(CursorPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 2
     # your own name for the list as a template variable; defaults to 'model_name_list' (can always
@@ -64,6 +70,7 @@ class BookListView(generic.ListView):
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         context = super().get_context_data(**kwargs)
         context["some_data"] = "This is just some data"
+        prefetch_cover_urls(context["book_list"])
         # can attach the view object to the context for arbitrary access in the template
         context["view"] = self
         context["viewfunction"] = lambda: self.lazymethod("Hello from a lambda!")
@@ -73,6 +80,32 @@ class BookListView(generic.ListView):
         return string + " (called lazily from the template)"
 
 
+class BookSearchView(generic.ListView):
+    """Full-text search over book titles, summaries, author names and genre names."""
+
+    model = Book
+    paginate_by = 10
+    context_object_name = "book_list"
+    template_name = "catalog/book_search.html"
+
+    @override
+    def get_queryset(self):
+        self.search = self.request.GET.get("q", "")
+        self.mode = self.request.GET.get("mode", SearchMode.RANKED)
+        if self.mode not in dict(SearchMode.choices):
+            self.mode = SearchMode.RANKED
+        # already ordered by relevance
+        return search_books(self.search, self.mode)
+
+    @override
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context["search"] = self.search
+        context["mode"] = self.mode
+        context["modes"] = SearchMode.choices
+        return context
+
+
 class BookDetailView(generic.DetailView):
     """Display an individual :model:`catalog.Book (does not hyperlink if in first line for views
     🙄)`
@@ -98,6 +131,9 @@ class BookDetailView(generic.DetailView):
     model = Book
     # defaults to 'model_name' (can always access 'object' as well)
     context_object_name = "book"
+    # everything the template touches is loaded up front, so the query count doesn't grow with the
+    # number of copies or genres
+    queryset = book_detail_queryset()
     # Can specify your own template name/location (defaults to looking in
     # <app_name>/templates/<app_name>/<model_name>_detail.html)
 
@@ -106,11 +142,12 @@ class BookDetailView(generic.DetailView):
 # don't get the default handling from the class)
 def book_detail_view_fun(request, pk, **kwargs):
     # same as querying the model, excepting Book.DoesNotExist error and raising Http404 when needed
-    book = get_object_or_404(Book, pk=pk)
+    # (also accepts a queryset instead of a model)
+    book = get_object_or_404(book_detail_queryset(), pk=pk)
     return render(request, "catalog/book_detail.html", context={"book": book})
 
 
-class AuthorListView(generic.ListView):
+class AuthorListView(CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 2
     context_object_name = "author_list"
@@ -120,6 +157,29 @@ class AuthorListView(generic.ListView):
 class AuthorDetailView(generic.DetailView):
     model = Author
     context_object_name = "author"
+    # one query for the author, one for all their books and one for all those books' genres
+    queryset = Author.objects.prefetch_related(
+        Prefetch("book_set", queryset=Book.objects.prefetch_related("genre"))
+    )
+
+
+@login_required
+@permission_required("catalog.can_export_catalog", raise_exception=True)
+def export_catalog(request, dataset, format):
+    """Stream the whole catalog ('books' or 'copies') as CSV, JSONL or Parquet."""
+    if dataset not in DATASETS or format not in CONTENT_TYPES:
+        raise Http404("Unknown export")
+
+    chunks = export(dataset, format)
+    # under ASGI a sync iterator would be read into memory in full before sending, so it's handed
+    # over as an async one instead
+    if isinstance(request, ASGIRequest):
+        chunks = stream_async(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[format])
+    response["Content-Disposition"] = (
+        f'attachment; filename="catalog-{dataset}.{format}"'
+    )
+    return response
 
 
 def sessionPlayground(request: HttpRequest):
@@ -144,7 +204,9 @@ def sessionPlayground(request: HttpRequest):
     )
 
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class LoanedBooksByUserListView(
+    LoginRequiredMixin, CursorPaginationMixin, generic.ListView
+):
     """Generic class-based view listing books on loan to current user."""
 
     model = BookInstance
@@ -160,7 +222,9 @@ class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
         )
 
 
-class AllLoanedBooksListView(PermissionRequiredMixin, generic.ListView):
+class AllLoanedBooksListView(
+    PermissionRequiredMixin, CursorPaginationMixin, generic.ListView
+):
     """All loaned books. Accessible only to users with the 'catalog.can_mark_returned'
     permission."""
 
@@ -171,13 +235,16 @@ class AllLoanedBooksListView(PermissionRequiredMixin, generic.ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return (
-            BookInstance.objects.filter(
-                book__title__icontains=self.request.GET.get("search", "")
+        queryset = BookInstance.objects.filter(
+            status__exact=BookInstance.LOAN_STATUS.OnLoan
+        ).order_by("due_back")
+        search = self.request.GET.get("search", "")
+        if search:
+            # prefix mode so partially typed words still match
+            queryset = queryset.filter(
+                book__in=search_books(search, SearchMode.PREFIX).values("pk")
             )
-            .filter(status__exact=BookInstance.LOAN_STATUS.OnLoan)
-            .order_by("due_back")
-        )
+        return queryset
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         context = super().get_context_data(**kwargs)
@@ -220,8 +287,16 @@ class RenewBookLibrarianView(PermissionRequiredMixin, generic.FormView):
 
     @override
     def form_valid(self, form):
-        self.book_instance.due_back = form.cleaned_data["renewal_date"]
-        self.book_instance.save()
+        # only the due date is written, and only if the copy is still on loan once it's locked
+        result = renew_copies(
+            [self.book_instance.pk], form.cleaned_data["renewal_date"]
+        )
+        if not result.changed:
+            form.add_error(
+                None,
+                f"This copy can't be renewed: it {result.skipped[self.book_instance.pk]}.",
+            )
+            return self.form_invalid(form)
         return super().form_valid(form)
 
 
@@ -246,10 +321,14 @@ def renew_book_librarian(request, pk):
         # Check if the form is valid
         if form.is_valid():
             # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
-            book_instance.due_back = form.cleaned_data["renewal_date"]
-            book_instance.save()
-            # redirect to a new URL
-            return HttpResponseRedirect(reverse("catalog:all_borrowed"))
+            result = renew_copies([book_instance.pk], form.cleaned_data["renewal_date"])
+            if result.changed:
+                # redirect to a new URL
+                return HttpResponseRedirect(reverse("catalog:all_borrowed"))
+            form.add_error(
+                None,
+                f"This copy can't be renewed: it {result.skipped[book_instance.pk]}.",
+            )
 
     # If this is a GET (or any other method) create the default form
     else:
@@ -302,10 +381,50 @@ class AuthorDelete(PermissionRequiredMixin, DeleteView):
             )
 
 
-class BookCreate(PermissionRequiredMixin, CreateView):
+@require_POST
+@login_required
+def cover_upload(request):
+    """Starts uploading a book cover from the browser straight to the media storage (see
+    'catalog.covers.start_cover_upload')."""
+    if not settings.CATALOG_DIRECT_COVER_UPLOADS:
+        raise Http404
+    if not request.user.has_perm("catalog.add_book") and not request.user.has_perm(
+        "catalog.change_book"
+    ):
+        raise PermissionDenied
+    try:
+        upload = start_cover_upload(
+            request.user,
+            request.POST.get("filename", ""),
+            request.POST.get("content_type", ""),
+        )
+    except ValidationError as error:
+        return JsonResponse({"errors": error.messages}, status=400)
+    return JsonResponse(upload)
+
+
+class BookFormMixin:
+    """Book create/update form, with covers uploaded by 'cover_upload.js' when enabled."""
+
+    form_class = CrispyBookForm
+
+    @override
+    def get_form_kwargs(self) -> dict[str, Any]:
+        kwargs = super().get_form_kwargs()  # type: ignore
+        kwargs["user"] = self.request.user  # type: ignore
+        return kwargs
+
+    @override
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)  # type: ignore
+        if settings.CATALOG_DIRECT_COVER_UPLOADS:
+            context["cover_upload_url"] = reverse("catalog:cover_upload")
+        return context
+
+
+class BookCreate(PermissionRequiredMixin, BookFormMixin, CreateView):
     model = Book
     permission_required = "catalog.add_book"
-    form_class = CrispyBookForm
 
     @override
     def get_form(self, form_class: type[BaseModelForm] | None = None) -> BaseModelForm:
@@ -314,10 +433,9 @@ class BookCreate(PermissionRequiredMixin, CreateView):
         return form
 
 
-class BookUpdate(PermissionRequiredMixin, UpdateView):
+class BookUpdate(PermissionRequiredMixin, BookFormMixin, UpdateView):
     model = Book
     permission_required = "catalog.change_book"
-    form_class = CrispyBookForm
 
     @override
     def get_form(self, form_class: type[BaseModelForm] | None = None) -> BaseModelForm:
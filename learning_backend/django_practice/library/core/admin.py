@@ -1,6 +1,141 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import ProfiledRequest, ProfilingSession, User
+from .profiler import collapsed, merge, publish_sessions, top_functions
 
 # Register your models here.
-admin.site.register(User, UserAdmin)
\ No newline at end of file
+admin.site.register(User, UserAdmin)
+
+
+@admin.register(ProfilingSession)
+class ProfilingSessionAdmin(admin.ModelAdmin):
+    """Starting a session needs the 'add' permission, seeing the results the 'view' one."""
+
+    list_display = (
+        "__str__",
+        "path_regex",
+        "profiled_requests",
+        "max_requests",
+        "expires_at",
+        "active",
+        "created_by",
+    )
+    readonly_fields = ("profiled_requests", "created_by", "report")
+    actions = ["stop"]
+
+    class ProfiledRequestInline(admin.TabularInline):
+        model = ProfiledRequest
+        fields = (
+            "started_at",
+            "method",
+            "path",
+            "view_name",
+            "status_code",
+            "duration",
+        )
+        readonly_fields = fields
+        can_delete = False
+        extra = 0
+
+        def has_add_permission(self, request: HttpRequest, obj=None) -> bool:
+            return False
+
+    inlines = [ProfiledRequestInline]
+
+    def get_inlines(self, request: HttpRequest, obj=None):
+        return self.inlines if obj else []
+
+    # sessions can't be edited once started, only stopped
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+    def get_fields(self, request: HttpRequest, obj=None):
+        if obj is None:
+            return ("path_regex", "max_requests", "interval_ms", "expires_at")
+        return (
+            "path_regex",
+            ("profiled_requests", "max_requests"),
+            "interval_ms",
+            "expires_at",
+            "created_by",
+            "report",
+        )
+
+    @admin.display(boolean=True)
+    def active(self, obj: ProfilingSession) -> bool:
+        return obj.active
+
+    @admin.display(description="Top functions (by samples)")
+    def report(self, obj: ProfilingSession):
+        stacks = merge(obj.requests.values_list("stacks", flat=True))
+        if not stacks:
+            return "No samples yet"
+        total = sum(stacks.values())
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td>{:.1f}%</td><td>{:.1f}%</td></tr>",
+            (
+                (
+                    function.name,
+                    function.own,
+                    function.own / total * 100,
+                    function.total / total * 100,
+                )
+                for function in top_functions(stacks)
+            ),
+        )
+        return format_html(
+            '<p>{} samples. <a href="{}" download>Collapsed stacks</a> (for flamegraph.pl, '
+            "speedscope or inferno)</p><table><tr><th>Function</th><th>Samples</th>"
+            "<th>Own</th><th>Including calls</th></tr>{}</table>",
+            total,
+            reverse("admin:core_profilingsession_collapsed", args=[obj.pk]),
+            rows,
+        )
+
+    def save_model(self, request: HttpRequest, obj: ProfilingSession, form, change):
+        obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(publish_sessions)
+
+    def delete_model(self, request: HttpRequest, obj: ProfilingSession):
+        super().delete_model(request, obj)
+        transaction.on_commit(publish_sessions)
+
+    def delete_queryset(self, request: HttpRequest, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(publish_sessions)
+
+    @admin.action(description="Stop the selected sessions", permissions=["add"])
+    def stop(self, request: HttpRequest, queryset):
+        stopped = queryset.update(stopped=True)
+        transaction.on_commit(publish_sessions)
+        self.message_user(request, f"Stopped {stopped} sessions")
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/collapsed/",
+                self.admin_site.admin_view(self.collapsed_view),
+                name="core_profilingsession_collapsed",
+            ),
+            *super().get_urls(),
+        ]
+
+    def collapsed_view(self, request: HttpRequest, pk: int) -> HttpResponse:
+        session = get_object_or_404(ProfilingSession, pk=pk)
+        if not self.has_view_permission(request, session):
+            raise PermissionDenied
+        stacks = merge(session.requests.values_list("stacks", flat=True))
+        response = HttpResponse(collapsed(stacks), content_type="text/plain")
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{session.pk}.collapsed.txt"'
+        )
+        return response
@@ -3,12 +3,25 @@ from typing import override
 from django.apps import AppConfig
 from django.contrib import admin
 from django.contrib.admin.apps import AdminConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
 
+    @override
+    def ready(self) -> None:
+        from django.conf import settings
+
+        # importing the module connects the receivers declared with @receiver
+        from . import backends, storage  # noqa: F401
+
+        if settings.SERVER_TIMING:
+            from .timing import instrument
+
+            instrument()
+
 
 class AllAuthCompatibleAdminConfig(AdminConfig):
     @override
@@ -18,3 +31,9 @@ class AllAuthCompatibleAdminConfig(AdminConfig):
         from allauth.account.decorators import secure_admin_login
 
         admin.site.login = secure_admin_login(admin.site.login)  # type: ignore
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # the .scss sources are compiled to css by postcss ('npm run css-watch'), and only the css
+    # needs collecting
+    ignore_patterns = [*BaseStaticFilesConfig.ignore_patterns, "*.scss"]
@@ -0,0 +1,175 @@
+"""Authentication backends that keep users and their permissions in the cache.
+
+Django's backends load the user row on every request (from the ID in the session) and the user's
+permission sets the first time a request checks one ('perms.catalog.*' in templates,
+'PermissionRequiredMixin'), which is 1-3 queries per authenticated page. These cache both, and
+fetch them together in one cache round trip when the session's user is loaded.
+
+A user's entries are deleted when the user is saved or deleted, or their groups or own permissions
+change. Changes that can affect any number of users (a group's permissions, a deleted group or
+permission) bump a version number that cached permission sets are checked against instead.
+"""
+
+import time
+
+from allauth.account.auth_backends import AuthenticationBackend
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+User = get_user_model()
+
+USER_KEY_PREFIX = "auth:user:"
+PERMISSIONS_KEY_PREFIX = "auth:permissions:"
+VERSION_KEY = "auth:permissions:version"
+
+
+def auth_cache():
+    return caches[settings.AUTH_CACHE]
+
+
+def _user_key(pk) -> str:
+    return f"{USER_KEY_PREFIX}{pk}"
+
+
+def _permissions_key(pk) -> str:
+    return f"{PERMISSIONS_KEY_PREFIX}{pk}"
+
+
+def permissions_version() -> int:
+    cache = auth_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # starting from the current time, like the catalog's fragment versions, so an evicted
+        # counter can't come back with a value old permission sets were cached under
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_user(pk) -> None:
+    """Forget the user's cached row and permissions."""
+    auth_cache().delete_many([_user_key(pk), _permissions_key(pk)])
+
+
+def invalidate_permissions(pks=None) -> None:
+    """Forget the cached permissions of the given users, or of everyone."""
+    cache = auth_cache()
+    if pks is not None:
+        cache.delete_many([_permissions_key(pk) for pk in pks])
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # not set yet, so nothing can have been cached under it
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class CachedBackendMixin:
+    """Caches what 'ModelBackend' loads from the database (see the module docstring)."""
+
+    def get_user(self, user_id):
+        cache = auth_cache()
+        user_key, permissions_key = _user_key(user_id), _permissions_key(user_id)
+        cached = cache.get_many([user_key, permissions_key, VERSION_KEY])
+
+        user = cached.get(user_key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(user_key, user, settings.AUTH_CACHE_TIMEOUT)
+            return user
+        if not self.user_can_authenticate(user):
+            return None
+
+        permissions = cached.get(permissions_key)
+        if permissions is not None and permissions[0] == cached.get(VERSION_KEY):
+            # what ModelBackend would otherwise query the first time a permission is checked
+            user._user_perm_cache, user._group_perm_cache = permissions[1:]
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if (
+            obj is not None
+            or not user_obj.is_active
+            or user_obj.is_anonymous
+            or hasattr(user_obj, "_perm_cache")
+        ):
+            return super().get_all_permissions(user_obj, obj)
+
+        loaded = hasattr(user_obj, "_user_perm_cache") and hasattr(
+            user_obj, "_group_perm_cache"
+        )
+        # read before querying, so a change made meanwhile leaves the entry already stale
+        version = None if loaded else permissions_version()
+        permissions = super().get_all_permissions(user_obj, obj)
+        if not loaded:
+            auth_cache().set(
+                _permissions_key(user_obj.pk),
+                (version, user_obj._user_perm_cache, user_obj._group_perm_cache),
+                settings.AUTH_CACHE_TIMEOUT,
+            )
+        return permissions
+
+
+class CachedModelBackend(CachedBackendMixin, ModelBackend):
+    pass
+
+
+class CachedAuthenticationBackend(CachedBackendMixin, AuthenticationBackend):
+    pass
+
+
+def _on_commit_too(invalidate, *args) -> None:
+    # invalidated right away and once more after the transaction commits, since a request in
+    # between could cache the rows from before the change
+    invalidate(*args)
+    transaction.on_commit(lambda: invalidate(*args))
+
+
+@receiver(post_save, sender=User, dispatch_uid="auth_cache_user_saved")
+@receiver(post_delete, sender=User, dispatch_uid="auth_cache_user_deleted")
+def user_changed(sender, instance, **kwargs):
+    _on_commit_too(invalidate_user, instance.pk)
+
+
+@receiver(
+    m2m_changed, sender=User.groups.through, dispatch_uid="auth_cache_user_groups"
+)
+@receiver(
+    m2m_changed,
+    sender=User.user_permissions.through,
+    dispatch_uid="auth_cache_user_permissions",
+)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # user.groups / user.user_permissions
+        _on_commit_too(invalidate_permissions, [instance.pk])
+    elif pk_set is not None:
+        # group.user_set / permission.user_set
+        _on_commit_too(invalidate_permissions, pk_set)
+    else:
+        # cleared from the group or permission side: the users are no longer known
+        _on_commit_too(invalidate_permissions)
+
+
+@receiver(
+    m2m_changed, sender=Group.permissions.through, dispatch_uid="auth_cache_group_perms"
+)
+def group_permissions_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        _on_commit_too(invalidate_permissions)
+
+
+@receiver(post_delete, sender=Group, dispatch_uid="auth_cache_group_deleted")
+@receiver(post_save, sender=Permission, dispatch_uid="auth_cache_permission_saved")
+@receiver(post_delete, sender=Permission, dispatch_uid="auth_cache_permission_deleted")
+def permissions_changed(sender, **kwargs):
+    _on_commit_too(invalidate_permissions)
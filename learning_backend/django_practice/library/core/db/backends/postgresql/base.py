@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import override
+
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django_prometheus.db.backends.common import get_postgres_cursor_class
+from django_prometheus.db.backends.postgresql import base
+from django_prometheus.db.common import ExportingCursorWrapper
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "django_db_pool_checkout_seconds",
+    "Time taken to check a connection out of the pool (including waiting for one)",
+    ["alias"],
+)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Postgres backend (with django-prometheus metrics) that can check connections out of a
+    per-process psycopg connection pool.
+
+    Pooling is enabled by a "pool" dict in OPTIONS holding psycopg_pool.ConnectionPool arguments
+    (e.g. min_size, max_size, timeout), mirroring the OPTIONS["pool"] setting that Django itself
+    supports from 5.1. Each gunicorn worker gets its own pool since it is only opened on first use
+    (after the fork). CONN_MAX_AGE should be 0 so connections go back to the pool at the end of
+    every request instead of being held by the thread.
+    """
+
+    # shared by every thread's wrapper in the process, keyed by alias and database name (the test
+    # runner switches NAME to the test database)
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        options = self.settings_dict["OPTIONS"].get("pool")
+        # the "no db" alias is used for creating/dropping databases and shouldn't be pooled
+        if not options or self.alias == "__no_db__":
+            return None
+
+        key = (self.alias, self.settings_dict["NAME"])
+        with self._pools_lock:
+            if key not in self._pools:
+                # only imported when pooling is enabled
+                from psycopg_pool import ConnectionPool
+
+                connect_kwargs = self.get_connection_params()
+                # Django sets autocommit itself once it has the connection
+                connect_kwargs["autocommit"] = True
+                self._pools[key] = ConnectionPool(
+                    kwargs=connect_kwargs,
+                    # don't open during startup, so the pool is created after forking
+                    open=False,
+                    configure=self._configure_pooled_connection,
+                    check=(
+                        ConnectionPool.check_connection
+                        if self.settings_dict["CONN_HEALTH_CHECKS"]
+                        else None
+                    ),
+                    name=self.alias,
+                    **(options if isinstance(options, dict) else {}),
+                )
+            return self._pools[key]
+
+    @override
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # not a libpq connection parameter
+        params.pop("pool", None)
+        return params
+
+    @override
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get(
+                "isolation_level", IsolationLevel.READ_COMMITTED
+            )
+        )
+        # opening is a no-op once the pool is open
+        pool.open()
+        start = time.perf_counter()
+        connection = pool.getconn()
+        POOL_CHECKOUT_SECONDS.labels(self.alias).observe(time.perf_counter() - start)
+        return connection
+
+    def _configure_pooled_connection(self, connection):
+        # same per-connection setup the parent backends do in get_new_connection(), but only run
+        # once per physical connection rather than on every checkout
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        if isolation_level is not None:
+            connection.isolation_level = IsolationLevel(isolation_level)
+        connection.cursor_factory = ExportingCursorWrapper(
+            connection.cursor_factory or get_postgres_cursor_class(),
+            self.alias,
+            self.vendor,
+        )
+
+    @override
+    def _close(self):
+        pool = self.pool
+        if self.connection is not None and pool is not None:
+            with self.wrap_database_errors:
+                # the pool rolls back anything left open and resets the connection
+                pool.putconn(self.connection)
+            return
+        return super()._close()
+
+
+class PoolCollector:
+    """Exports the psycopg pool statistics when prometheus scrapes /metrics."""
+
+    def collect(self):
+        size = GaugeMetricFamily(
+            "django_db_pool_size",
+            "Connections currently managed by the pool",
+            labels=["alias"],
+        )
+        available = GaugeMetricFamily(
+            "django_db_pool_available",
+            "Idle connections in the pool",
+            labels=["alias"],
+        )
+        max_size = GaugeMetricFamily(
+            "django_db_pool_max_size", "Maximum size of the pool", labels=["alias"]
+        )
+        waiting = GaugeMetricFamily(
+            "django_db_pool_requests_waiting",
+            "Checkouts currently waiting for a connection",
+            labels=["alias"],
+        )
+        wait_seconds = CounterMetricFamily(
+            "django_db_pool_wait_seconds",
+            "Total time checkouts spent waiting for a connection",
+            labels=["alias"],
+        )
+        timeouts = CounterMetricFamily(
+            "django_db_pool_requests_errors",
+            "Checkouts that timed out or failed",
+            labels=["alias"],
+        )
+        for (alias, _name), pool in list(DatabaseWrapper._pools.items()):
+            stats = pool.get_stats()
+            size.add_metric([alias], stats.get("pool_size", 0))
+            available.add_metric([alias], stats.get("pool_available", 0))
+            max_size.add_metric([alias], stats.get("pool_max", 0))
+            waiting.add_metric([alias], stats.get("requests_waiting", 0))
+            wait_seconds.add_metric([alias], stats.get("requests_wait_ms", 0) / 1000)
+            timeouts.add_metric([alias], stats.get("requests_errors", 0))
+        return [size, available, max_size, waiting, wait_seconds, timeouts]
+
+
+REGISTRY.register(PoolCollector())
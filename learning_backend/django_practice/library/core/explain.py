@@ -0,0 +1,110 @@
+"""Query plan analysis for the 'index_advisor' command.
+
+Every query is run with 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)' (inside a transaction that is
+rolled back), and the plan is searched for sequential scans and for sorts that no index provides.
+"""
+
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+
+@dataclass
+class Finding:
+    # "seq scan" or "sort"
+    kind: str
+    table: str
+    detail: str
+    # rows read by the scan or fed into the sort
+    rows: int
+
+    def __str__(self):
+        if self.kind == "seq scan":
+            return f"sequential scan on {self.table} ({self.rows} rows): {self.detail}"
+        return f"sort without an index ({self.rows} rows): {self.detail}"
+
+
+@dataclass
+class Plan:
+    sql: str
+    findings: list[Finding] = field(default_factory=list)
+    # from the root of the analyzed plan
+    execution_ms: float | None = None
+    buffers_hit: int | None = None
+    buffers_read: int | None = None
+
+
+def explain(connection, sql: str, params, min_rows: int = 0) -> Plan:
+    """Plan 'sql' on 'connection', keeping findings that touch at least 'min_rows' rows."""
+    if connection.vendor == "postgresql":
+        return _explain_postgres(connection, sql, params, min_rows)
+    raise NotImplementedError(f"Can't explain queries on {connection.vendor}")
+
+
+def _explain_postgres(connection, sql, params, min_rows) -> Plan:
+    # ANALYZE really runs the query, so it's rolled back in case it has side effects
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+            result = cursor.fetchone()[0]
+        transaction.set_rollback(True, using=connection.alias)
+    # psycopg decodes json columns itself, but not every driver does
+    if isinstance(result, str):
+        result = json.loads(result)
+    root = result[0]
+
+    plan = Plan(
+        sql,
+        execution_ms=root.get("Execution Time"),
+        buffers_hit=root["Plan"].get("Shared Hit Blocks"),
+        buffers_read=root["Plan"].get("Shared Read Blocks"),
+    )
+    _walk(root["Plan"], plan, min_rows)
+    return plan
+
+
+def _rows(node: dict) -> int:
+    """Rows a node read, including the ones its filter threw away, over all its loops."""
+    per_loop = node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)
+    return per_loop * node.get("Actual Loops", 1)
+
+
+def _walk(node: dict, plan: Plan, min_rows: int) -> None:
+    children = node.get("Plans", [])
+    node_type = node["Node Type"]
+    if node_type == "Seq Scan" and _rows(node) >= min_rows:
+        plan.findings.append(
+            Finding(
+                "seq scan",
+                node["Relation Name"],
+                (
+                    f"filter {node['Filter']}; consider an index on the filtered columns"
+                    if "Filter" in node
+                    else "the whole table is read"
+                ),
+                _rows(node),
+            )
+        )
+    elif node_type in ("Sort", "Incremental Sort"):
+        rows = sum(_rows(child) for child in children)
+        if rows >= min_rows:
+            keys = ", ".join(node.get("Sort Key", []))
+            plan.findings.append(
+                Finding(
+                    "sort",
+                    _relation(node) or "?",
+                    f"ORDER BY {keys}; consider an index on ({keys})",
+                    rows,
+                )
+            )
+    for child in children:
+        _walk(child, plan, min_rows)
+
+
+def _relation(node: dict) -> str | None:
+    # the table a sort's rows come from, when there's only one
+    if "Relation Name" in node:
+        return node["Relation Name"]
+    children = node.get("Plans", [])
+    return _relation(children[0]) if len(children) == 1 else None
@@ -0,0 +1,184 @@
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import cycle
+from urllib.parse import urlsplit
+
+
+@dataclass
+class Target:
+    """One kind of request the load generator sends."""
+
+    name: str
+    path: str
+    method: str = "GET"
+    body: bytes | None = None
+    headers: dict[str, str] = field(default_factory=dict)
+    # more paths to take turns with (e.g. other books), so every request doesn't hit the same row
+    # (and the same cache entries)
+    more_paths: list[str] = field(default_factory=list)
+
+    @property
+    def paths(self) -> list[str]:
+        return [self.path, *self.more_paths]
+
+
+@dataclass
+class TargetStats:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies) + self.errors
+
+    def percentile(self, pct: float) -> float:
+        """Latency (in seconds) that 'pct' percent of the successful requests were faster than."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        # nearest-rank, so p99 of 100 samples is the 99th slowest rather than an interpolation
+        index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+@dataclass
+class LoadResult:
+    elapsed: float
+    stats: dict[str, TargetStats]
+
+    @property
+    def total(self) -> TargetStats:
+        total = TargetStats("total")
+        for stats in self.stats.values():
+            total.latencies.extend(stats.latencies)
+            total.errors += stats.errors
+        return total
+
+    def throughput(self, stats: TargetStats | None = None) -> float:
+        """Requests per second (for one target, or all of them)."""
+        stats = stats or self.total
+        return stats.requests / self.elapsed if self.elapsed else 0.0
+
+
+def run_load(
+    base_url: str, targets: list[Target], concurrency: int, requests: int
+) -> LoadResult:
+    """Send 'requests' requests spread over the targets from 'concurrency' keep-alive clients.
+
+    Every client cycles through the targets in order, so each one gets roughly the same share of
+    the requests (targets need distinct names). Responses with a status of 400 or more (or
+    connection errors) count as errors.
+    """
+    url = urlsplit(base_url)
+    stats = {target.name: TargetStats(target.name) for target in targets}
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def take() -> bool:
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def client(offset: int):
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+        order = cycle(
+            targets[offset % len(targets) :] + targets[: offset % len(targets)]
+        )
+        # each client starts at a different path too
+        paths = {
+            target.name: cycle(
+                target.paths[offset % len(target.paths) :]
+                + target.paths[: offset % len(target.paths)]
+            )
+            for target in targets
+        }
+        try:
+            while take():
+                target = next(order)
+                start = time.perf_counter()
+                try:
+                    connection.request(
+                        target.method,
+                        url.path.rstrip("/") + next(paths[target.name]),
+                        body=target.body,
+                        headers=target.headers,
+                    )
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status < 400
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                    # start over on a fresh connection
+                    connection.close()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if ok:
+                        stats[target.name].latencies.append(elapsed)
+                    else:
+                        stats[target.name].errors += 1
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=client, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return LoadResult(time.perf_counter() - start, stats)
+
+
+def wait_for_server(base_url: str, timeout: float = 30) -> None:
+    """Block until something answers HTTP requests at 'base_url'."""
+    url = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while True:
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=2)
+        try:
+            connection.request("HEAD", url.path or "/")
+            connection.getresponse().read()
+            return
+        except (OSError, http.client.HTTPException):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Nothing answered at {base_url} after {timeout}s")
+            time.sleep(0.2)
+        finally:
+            connection.close()
+
+
+def start_gunicorn(
+    base_dir, port: int, workers: int, env: dict[str, str] | None = None
+) -> subprocess.Popen:
+    """Start gunicorn with the project's config on 127.0.0.1:'port' (stop it with terminate())."""
+    # gunicorn.conf.py picks the app and worker class; the command line overrides the rest
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--config",
+            str(base_dir / "gunicorn.conf.py"),
+            "--workers",
+            str(workers),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--access-logfile",
+            os.devnull,
+            "--error-logfile",
+            "-",
+        ],
+        cwd=base_dir,
+        # see gunicorn.conf.py
+        env={**os.environ, "GUNICORN_ACCESS_LOG": "False", **(env or {})},
+    )
@@ -0,0 +1,297 @@
+"""Logging that doesn't make requests wait on the disk.
+
+'BackgroundHandler' puts records on a queue that a thread (one per process, started on the first
+record so it survives gunicorn forking workers) hands to the handler it wraps, usually a
+'SharedRotatingFileHandler' with the 'JsonFormatter'. Records carry the ID of the request they
+were logged in ('RequestIdMiddleware'), and 'RateLimitFilter' drops repeats of the same message
+beyond a limit per period, so an incident doesn't flood the logs.
+
+This module is also used by gunicorn's logging config (see gunicorn.conf.py), so it must not
+touch Django settings at import time.
+"""
+
+import copy
+import datetime
+import fcntl
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.module_loading import import_string
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# IDs sent by the proxy (nginx's $request_id) are kept if they look sane
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# attributes every LogRecord has, so anything else was passed with 'extra='
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class RequestIdMiddleware:
+    """Tags the request (and everything logged while handling it) with an ID, taken from the
+    'X-Request-ID' header when the proxy sets one, and echoes it in the response."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = request_id.set(self.request_id(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response["X-Request-ID"] = request.id
+        return response
+
+    async def __acall__(self, request):
+        token = request_id.set(self.request_id(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response["X-Request-ID"] = request.id
+        return response
+
+    @staticmethod
+    def request_id(request) -> str:
+        sent = request.headers.get("X-Request-ID", "")
+        request.id = sent if _REQUEST_ID.match(sent) else uuid.uuid4().hex
+        return request.id
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds 'request_id' to records (it has to run in the thread that logged them, which filters
+    on a 'BackgroundHandler' do)."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most 'limit' records of the same message (logger, level and unformatted
+    message) per 'period' seconds.
+
+    The next record of a message after its repeats were dropped says how many were, in
+    'repeats_suppressed'.
+    """
+
+    def __init__(self, limit: int = 20, period: float = 60.0):
+        super().__init__()
+        self.limit = limit
+        self.period = period
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        # {message: [records let through in this window, records dropped]}
+        self.counts: dict[tuple, list[int]] = {}
+
+    def filter(self, record):
+        key = (record.name, record.levelno, str(record.msg))
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.period:
+                self.window_start = now
+                # only the drop counts that haven't been reported yet carry over
+                self.counts = {
+                    key: [0, dropped]
+                    for key, (_passed, dropped) in self.counts.items()
+                    if dropped
+                }
+            counts = self.counts.setdefault(key, [0, 0])
+            if counts[0] >= self.limit:
+                counts[1] += 1
+                return False
+            counts[0] += 1
+            if counts[1]:
+                record.repeats_suppressed = counts[1]
+                counts[1] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with anything passed in 'extra=' as additional keys."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "request_id": getattr(record, "request_id", None),
+            "location": f"{record.module}:{record.funcName}:{record.lineno}",
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        # 'default=str' for extras like the request django.request logs
+        return json.dumps(entry, default=str)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """Wraps the handler class passed as "class_name" (built with the remaining options) and hands
+    it records from a background thread, so logging calls never block on I/O.
+
+    The formatter set on this handler is used by the wrapped one (formatting happens in the
+    background too). When the queue is full (the writer can't keep up) records are dropped rather
+    than waited for, and the number dropped is logged once there's room again.
+    """
+
+    def __init__(self, class_name: str, queue_size: int = 10000, **options):
+        super().__init__(queue.Queue(queue_size))
+        self.handler: logging.Handler = import_string(class_name)(**options)
+        self.queue_size = queue_size
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+        self.start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        self.handler.setFormatter(fmt)
+
+    def start(self) -> None:
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # a forked worker inherits the queue (and its locks) but not the writer thread
+            self.queue = queue.Queue(self.queue_size)
+            self.listener = logging.handlers.QueueListener(self.queue, self.handler)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def stop(self) -> None:
+        # writes out what's still queued
+        if self.listener and self.pid == os.getpid():
+            self.listener.stop()
+            self.pid = None
+
+    def close(self):
+        # logging.shutdown() (at exit) closes every handler
+        self.stop()
+        self.handler.close()
+        super().close()
+
+    def prepare(self, record):
+        # only the message and traceback text are kept: the arguments could change before the
+        # record is written, and a traceback keeps every frame of the stack alive
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                self.queue.put_nowait(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": f"Dropped {dropped} log records (queue full)",
+                        }
+                    )
+                )
+            except queue.Full:
+                self.dropped += dropped
+
+
+class SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates the file once it reaches 'maxBytes' or is 'interval' seconds old, and can be shared
+    by several processes (gunicorn workers).
+
+    A rollover holds a lock on '<filename>.lock' (whose modification time is when the current file
+    was started), and a process that finds the file was rotated by another one reopens it instead
+    of rotating again.
+    """
+
+    def __init__(
+        self,
+        filename,
+        maxBytes: int = 10 * 1024 * 1024,
+        backupCount: int = 5,
+        interval: float = 24 * 60 * 60,
+        encoding: str = "utf-8",
+    ):
+        super().__init__(
+            filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding
+        )
+        self.interval = interval
+        self.lock_path = self.baseFilename + ".lock"
+        if not os.path.exists(self.lock_path):
+            open(self.lock_path, "a").close()
+
+    def rotated(self) -> bool:
+        """Whether another process rotated (or someone removed) the file we're writing to."""
+        if self.stream is None:
+            return False
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+        ours = os.fstat(self.stream.fileno())
+        return (current.st_dev, current.st_ino) != (ours.st_dev, ours.st_ino)
+
+    def reopen(self) -> None:
+        if self.stream:
+            self.stream.close()
+        self.stream = self._open()
+
+    def shouldRollover(self, record):
+        if self.rotated():
+            self.reopen()
+        if super().shouldRollover(record):
+            return True
+        try:
+            started = os.stat(self.lock_path).st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - started >= self.interval
+
+    def doRollover(self):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self.rotated():
+                    self.reopen()
+                else:
+                    super().doRollover()
+                    os.utime(self.lock_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
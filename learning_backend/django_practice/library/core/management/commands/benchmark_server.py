@@ -0,0 +1,88 @@
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from core.loadtest import Target, run_load, start_gunicorn, wait_for_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn with sync (WSGI) and uvicorn (ASGI) workers in turn and compare their "
+        "throughput and latency on the read-heavy catalog pages"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modes",
+            nargs="+",
+            choices=["wsgi", "asgi"],
+            default=["wsgi", "asgi"],
+            help="Server modes to benchmark (see DJANGO_SERVER_MODE)",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=2, help="gunicorn worker processes"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=32, help="Simultaneous clients"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Requests measured per mode"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=100, help="Unmeasured requests sent first"
+        )
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        targets = self.targets()
+        base_url = f"http://127.0.0.1:{options['port']}"
+
+        results = {}
+        for mode in options["modes"]:
+            self.stdout.write(f"Benchmarking {mode}...")
+            server = self.start_server(mode, options["workers"], options["port"])
+            try:
+                wait_for_server(base_url + targets[0].path)
+                run_load(base_url, targets, options["concurrency"], options["warmup"])
+                results[mode] = run_load(
+                    base_url, targets, options["concurrency"], options["requests"]
+                )
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.stdout.write(
+            f"{'mode':<6} {'target':<14} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}"
+        )
+        for mode, result in results.items():
+            for stats in [*result.stats.values(), result.total]:
+                self.stdout.write(
+                    f"{mode:<6} {stats.name:<14} {result.throughput(stats):>9.1f} "
+                    f"{stats.percentile(50) * 1000:>9.1f} "
+                    f"{stats.percentile(99) * 1000:>9.1f} {stats.errors:>7}"
+                )
+
+    def targets(self) -> list[Target]:
+        book = Book.objects.order_by("pk").first()
+        author = Author.objects.order_by("pk").first()
+        if book is None or author is None:
+            raise CommandError(
+                "Needs at least one book and author to benchmark against"
+            )
+        return [
+            Target("index", reverse("catalog:index")),
+            Target("books", reverse("catalog:books")),
+            Target("book_detail", reverse("catalog:book_detail", args=[book.pk])),
+            Target("authors", reverse("catalog:authors")),
+        ]
+
+    def start_server(self, mode: str, workers: int, port: int) -> subprocess.Popen:
+        env = {
+            "DJANGO_SERVER_MODE": mode,
+            # only the server mode should differ between the runs
+            "CATALOG_ASYNC_VIEWS": str(mode == "asgi"),
+        }
+        return start_gunicorn(settings.BASE_DIR, port, workers, env)
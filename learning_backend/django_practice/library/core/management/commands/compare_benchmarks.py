@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def load_run(path: Path) -> tuple[str, dict[str, dict]]:
+    """(commit id, {benchmark name: stats}) of a pytest-benchmark JSON file."""
+    with open(path) as file:
+        run = json.load(file)
+    commit = run.get("commit_info", {}).get("id") or path.stem
+    return commit[:12], {
+        benchmark["fullname"]: benchmark["stats"] for benchmark in run["benchmarks"]
+    }
+
+
+def compare(
+    baseline: dict[str, dict], current: dict[str, dict], stat: str, threshold: float
+) -> list[tuple[str, float | None, float | None, float | None, bool]]:
+    """(name, baseline, current, change in percent, regressed) for every benchmark in either run."""
+    rows = []
+    for name in sorted(baseline.keys() | current.keys()):
+        before = baseline.get(name, {}).get(stat)
+        after = current.get(name, {}).get(stat)
+        change = (after - before) / before * 100 if before and after else None
+        rows.append(
+            (name, before, after, change, change is not None and change > threshold)
+        )
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare two pytest-benchmark runs (by default the last two saved under .benchmarks/) "
+        "and fail if any benchmark got slower than the threshold"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "runs",
+            nargs="*",
+            type=Path,
+            help="Baseline and current JSON files (one file is compared to the latest run)",
+        )
+        parser.add_argument(
+            "--storage",
+            type=Path,
+            default=settings.BASE_DIR.parent / ".benchmarks",
+            help="Where pytest-benchmark saved its runs",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="Slowdown (in percent) that counts as a regression",
+        )
+        parser.add_argument(
+            "--stat",
+            choices=["min", "median", "mean"],
+            default="median",
+            help="Statistic compared (min is the least noisy, mean the most)",
+        )
+
+    def handle(self, *args, **options):
+        baseline_path, current_path = self.pick_runs(
+            options["runs"], options["storage"]
+        )
+        baseline_commit, baseline = load_run(baseline_path)
+        current_commit, current = load_run(current_path)
+        self.stdout.write(
+            f"{options['stat']} of {baseline_path.name} ({baseline_commit}) -> "
+            f"{current_path.name} ({current_commit})"
+        )
+
+        rows = compare(baseline, current, options["stat"], options["threshold"])
+        width = max(len(name) for name, *_ in rows) if rows else 0
+        regressions = 0
+        for name, before, after, change, regressed in rows:
+            if before is None or after is None:
+                note = "new" if before is None else "removed"
+                self.stdout.write(f"{name:<{width}}  {note}")
+                continue
+            line = (
+                f"{name:<{width}}  {before * 1e6:>12.1f} us {after * 1e6:>12.1f} us "
+                f"{change:>+8.1f}%"
+            )
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + "  REGRESSION"))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(
+                f"{regressions} benchmark(s) got more than {options['threshold']}% slower"
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def pick_runs(self, runs: list[Path], storage: Path) -> tuple[Path, Path]:
+        if len(runs) == 2:
+            return runs[0], runs[1]
+        # autosaved runs are numbered per machine, so the latest ones are the most recently written
+        saved = sorted(storage.glob("**/*.json"), key=lambda path: path.stat().st_mtime)
+        if len(runs) == 1 and saved:
+            return runs[0], saved[-1]
+        if not runs and len(saved) >= 2:
+            return saved[-2], saved[-1]
+        raise CommandError(
+            "Need two benchmark runs to compare; run 'pytest' (twice) or pass the JSON files"
+        )
@@ -0,0 +1,152 @@
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.views.generic import ListView
+
+from core.explain import explain
+from core.queries import fingerprint
+
+
+class _Recorder:
+    """Execute wrapper keeping the SQL and parameters of every SELECT, once per query shape."""
+
+    def __init__(self):
+        self.queries: dict[str, tuple[str, str, object]] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith("SELECT"):
+            self.queries.setdefault(
+                fingerprint(sql), (context["connection"].alias, sql, params)
+            )
+        return execute(sql, params, many, context)
+
+
+def list_views(patterns=None, namespace=None):
+    """(URL name, view class, init kwargs) of every ListView in the URLConf whose URL takes no
+    arguments."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            nested = pattern.namespace or namespace
+            if namespace and pattern.namespace:
+                nested = f"{namespace}:{pattern.namespace}"
+            yield from list_views(pattern.url_patterns, nested)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            view_class = getattr(pattern.callback, "view_class", None)
+            if view_class and issubclass(view_class, ListView):
+                name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+                try:
+                    reverse(name)
+                except Exception:
+                    continue
+                yield name, view_class, pattern.callback.view_initkwargs
+
+
+def sync_view_class(view_class):
+    # the async views subclass the sync ones, whose queries are the same but run in this thread
+    # (where the recorder is installed)
+    return next(
+        cls
+        for cls in view_class.__mro__
+        if issubclass(cls, ListView) and not iscoroutinefunction(cls.get)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay every ListView's queries (including pagination and the template's own queries) "
+        "with EXPLAIN ANALYZE and report sequential scans and sorts that no index provides. Run "
+        "it against a seeded database; '--fail' makes it usable as a CI check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="Username the views are rendered for (defaults to a user with loans)",
+        )
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="Ignore scans and sorts of fewer rows than this",
+        )
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error if anything was found",
+        )
+        parser.add_argument(
+            "--verbose-sql",
+            action="store_true",
+            help="Print the full SQL of every query instead of only the problematic ones",
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        factory = RequestFactory()
+        total = 0
+
+        for name, view_class, initkwargs in list_views():
+            request = factory.get(reverse(name))
+            request.user = user
+            view = sync_view_class(view_class)(**initkwargs)
+            view.setup(request)
+
+            recorder = _Recorder()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                # 'get()' skips the login/permission checks in 'dispatch()'
+                response = view.get(request)
+                if hasattr(response, "render"):
+                    response.render()
+
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"{name} ({view_class.__name__}): {len(recorder.queries)} queries"
+                )
+            )
+            for alias, sql, params in recorder.queries.values():
+                plan = explain(connections[alias], sql, params, options["min_rows"])
+                total += len(plan.findings)
+                if plan.findings or options["verbose_sql"]:
+                    self.stdout.write(f"  {sql}")
+                if plan.execution_ms is not None:
+                    self.stdout.write(
+                        f"    {plan.execution_ms:.2f} ms, {plan.buffers_hit} buffers hit, "
+                        f"{plan.buffers_read} read"
+                    )
+                for finding in plan.findings:
+                    self.stdout.write(self.style.WARNING(f"    ! {finding}"))
+
+        if total:
+            message = f"{total} sequential scans or unindexed sorts found"
+            if options["fail"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS("No sequential scans or unindexed sorts")
+            )
+
+    def get_user(self, username: str | None):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username}")
+        # someone with loans, so the per-borrower views have rows to plan
+        user = (
+            User.objects.filter(bookinstance__isnull=False).first()
+            or User.objects.first()
+        )
+        if user is None:
+            raise CommandError("There are no users; seed the database first")
+        return user
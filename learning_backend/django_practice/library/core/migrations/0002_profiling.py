@@ -0,0 +1,104 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:23
+
+import core.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfilingSession",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "path_regex",
+                    models.CharField(
+                        blank=True,
+                        help_text="Only profile requests whose path matches this regular expression (searched anywhere in the path; blank for every request)",
+                        max_length=200,
+                        validators=[core.models.validate_regex],
+                    ),
+                ),
+                ("max_requests", models.PositiveIntegerField(default=20)),
+                (
+                    "profiled_requests",
+                    models.PositiveIntegerField(default=0, editable=False),
+                ),
+                (
+                    "interval_ms",
+                    models.PositiveIntegerField(
+                        default=5, help_text="Milliseconds between stack samples"
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        default=core.models.default_profiling_expiry,
+                        help_text="Stop profiling at this time even if fewer requests were profiled",
+                    ),
+                ),
+                ("stopped", models.BooleanField(default=False, editable=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        editable=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProfiledRequest",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2000)),
+                ("view_name", models.CharField(max_length=200)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("started_at", models.DateTimeField()),
+                ("duration", models.FloatField(help_text="Seconds")),
+                ("pid", models.PositiveIntegerField()),
+                ("stacks", models.JSONField(default=dict)),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="requests",
+                        to="core.profilingsession",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["started_at"],
+            },
+        ),
+    ]
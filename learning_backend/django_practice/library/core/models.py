@@ -1,6 +1,93 @@
 # Create your models here.
+import datetime
+import re
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
     pass
+
+
+def validate_regex(value: str) -> None:
+    try:
+        re.compile(value)
+    except re.error as error:
+        raise ValidationError(f"Not a valid regular expression: {error}")
+
+
+def default_profiling_expiry():
+    return timezone.now() + datetime.timedelta(minutes=15)
+
+
+class ProfilingSession(models.Model):
+    """Sampling profiler run over the next 'max_requests' requests (across all workers) whose
+    path matches 'path_regex' (see 'core.profiler')."""
+
+    path_regex = models.CharField(
+        max_length=200,
+        blank=True,
+        validators=[validate_regex],
+        help_text="Only profile requests whose path matches this regular expression (searched "
+        "anywhere in the path; blank for every request)",
+    )
+    max_requests = models.PositiveIntegerField(default=20)
+    profiled_requests = models.PositiveIntegerField(default=0, editable=False)
+    interval_ms = models.PositiveIntegerField(
+        default=5, help_text="Milliseconds between stack samples"
+    )
+    expires_at = models.DateTimeField(
+        default=default_profiling_expiry,
+        help_text="Stop profiling at this time even if fewer requests were profiled",
+    )
+    stopped = models.BooleanField(default=False, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, editable=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Profile of {self.path_regex or 'all requests'} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def active(self) -> bool:
+        return (
+            not self.stopped
+            and self.profiled_requests < self.max_requests
+            and self.expires_at > timezone.now()
+        )
+
+
+class ProfiledRequest(models.Model):
+    """Stack samples of one request profiled by a 'ProfilingSession'."""
+
+    session = models.ForeignKey(
+        ProfilingSession, on_delete=models.CASCADE, related_name="requests"
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    view_name = models.CharField(max_length=200)
+    status_code = models.PositiveSmallIntegerField()
+    started_at = models.DateTimeField()
+    duration = models.FloatField(help_text="Seconds")
+    # worker process, to tell which requests ran where
+    pid = models.PositiveIntegerField()
+    # {collapsed stack ("outer;...;inner" function names): number of samples}
+    stacks = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["started_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path}"
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
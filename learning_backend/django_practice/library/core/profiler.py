@@ -0,0 +1,299 @@
+"""On-demand sampling profiler, safe to leave installed in production.
+
+Staff with the permission to add a 'ProfilingSession' (in the admin) start one for a path regex
+and a number of requests. 'ProfilerMiddleware' then samples the stack of the thread handling each
+matching request every few milliseconds, in whichever worker process it lands, and saves the
+samples as a 'ProfiledRequest'. The admin merges them into a top-functions table and serves the
+collapsed stacks that flamegraph.pl, speedscope or inferno read.
+
+Idle cost: workers learn about sessions from a small state file ('settings.PROFILER_STATE_FILE',
+rewritten whenever a session starts or ends) instead of the database, so a request that isn't
+profiled makes no query and at most one 'stat()' per second per worker. The file has to be
+shared by every worker that should be profiled (it is by default, for workers on one machine).
+"""
+
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import ProfiledRequest, ProfilingSession
+from core.queries import QueryInspectionMiddleware
+
+# how often a worker checks whether the state file changed
+CHECK_INTERVAL = 1.0
+# frames deeper than this are cut off (keeping the outermost ones)
+MAX_DEPTH = 200
+# samples taken while the request's thread was running something else (under ASGI: awaiting, or
+# running sync code in another thread)
+ELSEWHERE = "[elsewhere]"
+
+
+def frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+def collapse(frame, stop_at) -> str:
+    """'outer;...;inner' function names from 'stop_at' (the frame that started profiling) down to
+    'frame', or ELSEWHERE if 'stop_at' isn't on the stack."""
+    names = []
+    while frame is not None and frame is not stop_at:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    if frame is None:
+        return ELSEWHERE
+    return ";".join(reversed(names[-MAX_DEPTH:]))
+
+
+class StackSampler:
+    """Samples one thread's stack from a background thread (so the profiled code isn't slowed
+    down by tracing every call, unlike cProfile)."""
+
+    def __init__(self, interval: float, thread_id: int | None = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        # the caller's frame: samples only keep the frames below it
+        self.stop_at = sys._getframe(1)
+        self.stacks = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> "StackSampler":
+        self.thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self.done.set()
+        self.thread.join()
+        return self.stacks
+
+    def run(self) -> None:
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame, self.stop_at)] += 1
+
+
+def merge(stacks) -> Counter:
+    """Add up the samples of several requests' stacks."""
+    total = Counter()
+    for request_stacks in stacks:
+        total.update(request_stacks)
+    return total
+
+
+def collapsed(stacks: Counter) -> str:
+    """The "stack count" lines flamegraph tools read."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+@dataclass
+class FunctionStats:
+    name: str
+    # samples with the function on top of the stack (running its own code)
+    own: int = 0
+    # samples with the function anywhere on the stack (itself or something it called)
+    total: int = 0
+
+
+def top_functions(stacks: Counter, limit: int = 30) -> list[FunctionStats]:
+    functions: dict[str, FunctionStats] = {}
+    for stack, count in stacks.items():
+        names = stack.split(";")
+        for name in set(names):
+            functions.setdefault(name, FunctionStats(name)).total += count
+        functions[names[-1]].own += count
+    return sorted(functions.values(), key=lambda stats: (-stats.own, -stats.total))[
+        :limit
+    ]
+
+
+@dataclass
+class _ActiveSession:
+    pk: int
+    path_regex: re.Pattern
+    interval: float
+    expires_at: datetime.datetime
+
+    def matches(self, path: str) -> bool:
+        return self.path_regex.search(path) is not None and (
+            self.expires_at > timezone.now()
+        )
+
+
+def publish_sessions() -> None:
+    """Write the active sessions to the state file, for every worker to pick up."""
+    path = Path(settings.PROFILER_STATE_FILE)
+    sessions = [
+        {
+            "pk": session.pk,
+            "path_regex": session.path_regex,
+            "interval": session.interval_ms / 1000,
+            "expires_at": session.expires_at.isoformat(),
+        }
+        for session in ProfilingSession.objects.filter(
+            stopped=False,
+            expires_at__gt=timezone.now(),
+            profiled_requests__lt=F("max_requests"),
+        )
+    ]
+    # written aside and renamed, so workers never read half a file
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temporary.write_text(json.dumps(sessions))
+    os.replace(temporary, path)
+
+
+class _State:
+    """This process' copy of the state file."""
+
+    def __init__(self):
+        self.checked = 0.0
+        self.path = None
+        self.mtime = None
+        self.sessions: list[_ActiveSession] = []
+
+    def sessions_for(self, path: str) -> list[_ActiveSession]:
+        now = time.monotonic()
+        if now - self.checked >= CHECK_INTERVAL:
+            self.checked = now
+            self.reload()
+        return [session for session in self.sessions if session.matches(path)]
+
+    def reload(self) -> None:
+        path = settings.PROFILER_STATE_FILE
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.path, self.mtime, self.sessions = path, None, []
+            return
+        if (path, mtime) == (self.path, self.mtime):
+            return
+        with open(path) as file:
+            sessions = json.load(file)
+        self.path, self.mtime = path, mtime
+        self.sessions = [
+            _ActiveSession(
+                session["pk"],
+                re.compile(session["path_regex"]),
+                session["interval"],
+                parse_datetime(session["expires_at"]),
+            )
+            for session in sessions
+        ]
+
+    def forget(self) -> None:
+        # checked again on the next request
+        self.checked = 0.0
+        self.mtime = None
+
+
+_state = _State()
+
+
+def claim(session: _ActiveSession) -> bool:
+    """Count a request against the session's limit, unless it's used up (by any worker)."""
+    claimed = ProfilingSession.objects.filter(
+        pk=session.pk,
+        stopped=False,
+        expires_at__gt=timezone.now(),
+        profiled_requests__lt=F("max_requests"),
+    ).update(profiled_requests=F("profiled_requests") + 1)
+    if not claimed:
+        # the session is over, so nobody needs to check it anymore
+        publish_sessions()
+        _state.forget()
+    return bool(claimed)
+
+
+def save(session: _ActiveSession, request, response, started_at, duration, stacks):
+    ProfiledRequest.objects.create(
+        session_id=session.pk,
+        method=request.method,
+        path=request.path[:2000],
+        view_name=QueryInspectionMiddleware.view_name(request),
+        status_code=response.status_code,
+        started_at=started_at,
+        duration=duration,
+        pid=os.getpid(),
+        stacks=dict(stacks),
+    )
+
+
+class ProfilerMiddleware:
+    """Samples the requests of active profiling sessions (see the module docstring).
+
+    Goes first in the middleware list, so the profile covers every other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        session = self.session(request)
+        if session is None or not claim(session):
+            return self.get_response(request)
+
+        started_at, start = timezone.now(), time.perf_counter()
+        sampler = StackSampler(session.interval).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        save(
+            session,
+            request,
+            response,
+            started_at,
+            time.perf_counter() - start,
+            stacks,
+        )
+        return response
+
+    async def __acall__(self, request):
+        session = self.session(request)
+        if session is None or not await sync_to_async(claim)(session):
+            return await self.get_response(request)
+
+        # samples the event loop's thread: sync code run in other threads (like the ORM) shows up
+        # as ELSEWHERE
+        started_at, start = timezone.now(), time.perf_counter()
+        sampler = StackSampler(session.interval).start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        await sync_to_async(save)(
+            session,
+            request,
+            response,
+            started_at,
+            time.perf_counter() - start,
+            stacks,
+        )
+        return response
+
+    @staticmethod
+    def session(request) -> _ActiveSession | None:
+        sessions = _state.sessions_for(request.path)
+        return sessions[0] if sessions else None
@@ -0,0 +1,206 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from prometheus_client import Counter as PrometheusCounter
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+# exported through django_prometheus' /metrics endpoint (it serves the default registry)
+VIEW_QUERIES = Histogram(
+    "django_view_queries",
+    "Number of SQL queries run per request, by URL name",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf")),
+)
+VIEW_QUERY_SECONDS = Histogram(
+    "django_view_query_seconds",
+    "Time spent in SQL queries per request, by URL name",
+    ["view"],
+)
+VIEW_N_PLUS_ONE = PrometheusCounter(
+    "django_view_n_plus_one",
+    "Requests that repeated the same query shape enough times to look like an N+1",
+    ["view"],
+)
+VIEW_QUERY_BUDGET_EXCEEDED = PrometheusCounter(
+    "django_view_query_budget_exceeded",
+    "Requests that ran more queries than their URL's budget",
+    ["view"],
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+# 'IN (?, ?, ?)' and multi-row 'VALUES (?, ?), (?, ?)' vary in length with the data
+_PLACEHOLDER_LIST = re.compile(
+    r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Reduce a query to its shape, so the same query with different values compares equal."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    """Records every query run on any database connection while it is active.
+
+    Unlike 'CaptureQueriesContext', this does not need DEBUG (it uses execute wrappers instead of
+    the connection's debug cursor), so it can run in production.
+    """
+
+    def __init__(self):
+        self.queries: list[tuple[str, float]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            # wrappers live on the (per-thread) connection handler, so installing them does not
+            # open a database connection
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def duration(self) -> float:
+        return sum(duration for _sql, duration in self.queries)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """Query shapes that were run at least 'threshold' times (likely N+1 patterns)."""
+        counts = Counter(fingerprint(sql) for sql, _duration in self.queries)
+        return {shape: count for shape, count in counts.items() if count >= threshold}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(view_name: str | None) -> int | None:
+    budgets = settings.QUERY_BUDGETS
+    return budgets.get(view_name, budgets.get("default"))
+
+
+class QueryInspectionMiddleware:
+    """Counts the queries each request runs, flags N+1 patterns and enforces query budgets.
+
+    Budgets come from 'settings.QUERY_BUDGETS' keyed by URL name ('namespace:name'), with a
+    "default" entry for everything else. Violations are logged and counted in prometheus, or
+    raised as 'QueryBudgetExceeded' when 'settings.QUERY_BUDGETS_STRICT' is on (in tests).
+    """
+
+    # async capable so that under ASGI it doesn't force the rest of the chain (and the async views)
+    # into a sync thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.QUERY_N_PLUS_ONE_THRESHOLD < 2:
+            raise ImproperlyConfigured("QUERY_N_PLUS_ONE_THRESHOLD must be at least 2")
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        self.report(self.view_name(request), recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        # connections belong to the thread that uses them, and the async ORM runs every query of a
+        # request in the same sync thread, so the wrappers are installed (and removed) there
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(recorder.record())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.report(self.view_name(request), recorder)
+        return response
+
+    @staticmethod
+    def view_name(request) -> str:
+        match = getattr(request, "resolver_match", None)
+        return (match.view_name if match else None) or "<unresolved>"
+
+    def report(self, view_name: str, recorder: QueryRecorder) -> None:
+        VIEW_QUERIES.labels(view_name).observe(recorder.count)
+        VIEW_QUERY_SECONDS.labels(view_name).observe(recorder.duration)
+
+        repeated = recorder.repeated(settings.QUERY_N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            VIEW_N_PLUS_ONE.labels(view_name).inc()
+            for shape, count in repeated.items():
+                logger.warning(
+                    "Possible N+1 in %s: query ran %d times: %s",
+                    view_name,
+                    count,
+                    shape,
+                )
+
+        budget = query_budget(view_name)
+        if budget is not None and recorder.count > budget:
+            VIEW_QUERY_BUDGET_EXCEEDED.labels(view_name).inc()
+            message = f"{view_name} ran {recorder.count} queries (budget {budget})"
+            if settings.QUERY_BUDGETS_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class QueryAssertionsMixin:
+    """TestCase mixin with query count helpers that also catch N+1 patterns."""
+
+    @contextmanager
+    def assertNoNPlusOne(self, threshold: int | None = None):
+        threshold = threshold or settings.QUERY_N_PLUS_ONE_THRESHOLD
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        repeated = recorder.repeated(threshold)
+        if repeated:
+            self.fail(  # type: ignore
+                "Repeated queries (possible N+1):\n"
+                + "\n".join(f"{count}x {shape}" for shape, count in repeated.items())
+            )
+
+    @contextmanager
+    def assertWithinQueryBudget(self, view_name: str):
+        budget = query_budget(view_name)
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        if budget is not None and recorder.count > budget:
+            self.fail(  # type: ignore
+                f"{view_name} ran {recorder.count} queries (budget {budget}):\n"
+                + "\n".join(sql for sql, _duration in recorder.queries)
+            )
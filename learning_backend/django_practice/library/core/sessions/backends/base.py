@@ -0,0 +1,32 @@
+from typing import override
+
+
+class UnchangedSessionMixin:
+    """Remembers the serialized session it loaded, so 'SessionMiddleware' can skip saving a session
+    that was marked modified but ends up byte-identical (like a nested value set to what it was).
+    """
+
+    loaded_key: str | None = None
+    loaded_data: bytes | None = None
+
+    @override
+    def load(self):
+        data = super().load()
+        # a session that failed to load (expired, tampered with) gets a new key when saved, or is
+        # marked modified to replace the cookie (signed cookies)
+        self.loaded_key = None if self.modified else self._session_key
+        self.loaded_data = self.serialized(data)
+        return data
+
+    def serialized(self, data) -> bytes:
+        return self.serializer().dumps(data)
+
+    def unchanged(self) -> bool:
+        """Whether saving would write back exactly what was loaded, under the same key (logging
+        in or out changes the key, even when the data stays the same)."""
+        return (
+            self.loaded_data is not None
+            and self.loaded_key is not None
+            and self.loaded_key == self._session_key
+            and self.serialized(self._session) == self.loaded_data
+        )
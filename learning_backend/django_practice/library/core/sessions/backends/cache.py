@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import cache
+
+from .base import UnchangedSessionMixin
+
+
+class SessionStore(UnchangedSessionMixin, cache.SessionStore):
+    pass
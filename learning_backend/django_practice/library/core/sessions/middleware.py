@@ -0,0 +1,21 @@
+from typing import override
+
+from django.contrib.sessions import middleware
+
+from .backends.base import UnchangedSessionMixin
+
+
+class SessionMiddleware(middleware.SessionMiddleware):
+    """Doesn't save sessions (or send their cookie again) when their data didn't actually change,
+    for the engines in core.sessions.backends."""
+
+    @override
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if (
+            isinstance(session, UnchangedSessionMixin)
+            and session.modified
+            and session.unchanged()
+        ):
+            session.modified = False
+        return super().process_response(request, response)
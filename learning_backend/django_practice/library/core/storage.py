@@ -1,36 +1,289 @@
+import gzip
 import importlib
+import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from hashlib import md5
+from typing import override
 from uuid import uuid4
 
-from django.contrib.staticfiles.storage import ManifestStaticFilesStorage as Base
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.utils import matches_patterns
+from django.core import signing
+from django.core.files.base import ContentFile
 from django.core.files.storage import Storage
+from django.dispatch import receiver
+from django.urls import reverse
+from django_cleanup.signals import cleanup_post_delete
 
+try:
+    # for the '.br' siblings of static files ('poetry install -E brotli')
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
 
-class HashOnlyManifestStaticFilesStorage(Base):
-    # remove the original file after creating cache-busting hashed version
-    def post_process(self, *args, **kwargs):
-        process = super().post_process(*args, **kwargs)
-        for name, hashed_name, processed in process:
-            yield name, hashed_name, processed
-            if processed:
-                # don't need to ship scss files; better way would be to exclude them from
-                # collectstatic but this works for now
-                if name.endswith(".scss"):
-                    os.remove(self.path(name))
-                    os.remove(self.path(hashed_name))
-                elif name != hashed_name:
-                    # Django isn't detecting source map URL comments correctly, so we need to keep the
-                    # unhashed source maps
-                    if not name.endswith(".map"):
-                        os.remove(self.path(name))
+logger = logging.getLogger(__name__)
+
+
+def _file_md5(path: str) -> str:
+    hasher = md5(usedforsecurity=False)
+    with open(path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            hasher.update(chunk)
+    # same length as the hash ManifestStaticFilesStorage puts in file names
+    return hasher.hexdigest()[:12]
+
+
+def _compress(path: str, content_addressed: bool) -> int:
+    """Write the '.gz' (and '.br', with brotli installed) siblings that nginx's gzip_static and
+    brotli_static serve instead of the file, returning how many were written.
+
+    Siblings of hashed files are never rewritten since their content can't change; others are
+    rewritten when older than the file. A sibling that wouldn't be smaller isn't written at all.
+    """
+    encoders = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append((".br", lambda data: brotli.compress(data, quality=11)))
+
+    mtime = os.stat(path).st_mtime_ns
+    data = None
+    written = 0
+    for suffix, encode in encoders:
+        try:
+            sibling_mtime = os.stat(path + suffix).st_mtime_ns
+        except FileNotFoundError:
+            sibling_mtime = None
+        if sibling_mtime is not None and (content_addressed or sibling_mtime >= mtime):
+            continue
+        if data is None:
+            with open(path, "rb") as file:
+                data = file.read()
+        compressed = encode(data)
+        if len(compressed) >= len(data):
+            if sibling_mtime is not None:
+                os.remove(path + suffix)
+            continue
+        # written aside and renamed, so nginx never serves half a file
+        temporary = f"{path}{suffix}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(compressed)
+        os.replace(temporary, path + suffix)
+        written += 1
+    return written
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage for the collectstatic build that nginx serves directly.
+
+    - Files are hashed in parallel (one process per core by default) and only when they changed
+      since the last build: the manifest also records each collected file's size, modification
+      time and hash, and collectstatic (without --clear) doesn't copy files that didn't change.
+    - Hashed files get precompressed '.gz'/'.br' siblings (see '_compress'), also in parallel.
+    - The unhashed originals are kept, since collectstatic would copy every one of them again on
+      the next build otherwise (source maps are referenced unhashed anyway, as Django doesn't
+      rewrite their URL comments correctly).
+    - What earlier builds left that this one doesn't reference (older hashed versions, files whose
+      sources were deleted, and their compressed siblings) is deleted afterwards, as --clear would.
+
+    Sources that shouldn't be shipped (like .scss) are left out by the ignore patterns of
+    'core.apps.StaticFilesConfig' rather than deleted here.
+    """
+
+    compressed_extensions = (
+        ".css",
+        ".js",
+        ".mjs",
+        ".map",
+        ".json",
+        ".svg",
+        ".txt",
+        ".html",
+        ".xml",
+        ".ico",
+        ".ttf",
+        ".otf",
+        ".eot",
+    )
+
+    def __init__(self, *args, workers: int | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workers = workers or os.cpu_count() or 1
+        self.adjustable: set[str] = set()
+        # {name: [size, modification time, hash]} of the collected files
+        self.sources: dict[str, list] = {}
+
+    def read_sources(self) -> dict[str, list]:
+        content = self.read_manifest()
+        return json.loads(content).get("sources", {}) if content else {}
+
+    @override
+    def file_hash(self, name, content=None):
+        # hashed up front in 'post_process' (adjustable files aren't: they're hashed again after
+        # their references are replaced)
+        if name in self.sources and name not in self.adjustable:
+            return self.sources[name][2]
+        return super().file_hash(name, content)
+
+    @override
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        self.adjustable = {
+            self.clean_name(path)
+            for path in paths
+            if matches_patterns(path, self._patterns)
+        }
+        self.hash_sources(paths)
+        yield from super().post_process(paths, dry_run, **options)
+        self.compress(paths)
+        self.prune(paths)
+
+    def hash_sources(self, paths) -> None:
+        previous = self.read_sources()
+        self.sources = {}
+        changed = []
+        for name in paths:
+            name = self.clean_name(name)
+            stat = os.stat(self.path(name))
+            signature = [stat.st_size, stat.st_mtime_ns]
+            if previous.get(name, [])[:2] == signature:
+                self.sources[name] = previous[name]
+            else:
+                changed.append((name, signature))
+
+        with ProcessPoolExecutor(self.workers) as pool:
+            digests = pool.map(
+                _file_md5,
+                [self.path(name) for name, _ in changed],
+                chunksize=max(len(changed) // (self.workers * 4), 1),
+            )
+            for (name, signature), digest in zip(changed, digests):
+                self.sources[name] = [*signature, digest]
+        logger.info(
+            "Hashed %s changed static files (%s unchanged)",
+            len(changed),
+            len(self.sources) - len(changed),
+        )
+
+    def compress(self, paths) -> None:
+        files = {
+            hashed_name: True
+            for name, hashed_name in self.hashed_files.items()
+            if hashed_name != name
+        }
+        for name in paths:
+            files.setdefault(self.clean_name(name), False)
+        files = {
+            name: content_addressed
+            for name, content_addressed in files.items()
+            if name.endswith(self.compressed_extensions)
+        }
+        with ProcessPoolExecutor(self.workers) as pool:
+            written = sum(
+                pool.map(
+                    _compress,
+                    [self.path(name) for name in files],
+                    files.values(),
+                    chunksize=max(len(files) // (self.workers * 4), 1),
+                )
+            )
+        logger.info("Wrote %s precompressed static files", written)
+
+    def prune(self, paths) -> None:
+        keep = {self.clean_name(name) for name in paths}
+        keep.update(self.hashed_files.values())
+        keep.add(self.manifest_name)
+        removed = 0
+        for directory, _directories, files in os.walk(self.location, topdown=False):
+            for file in files:
+                path = os.path.join(directory, file)
+                name = os.path.relpath(path, self.location).replace(os.sep, "/")
+                if name in keep or (
+                    name.endswith((".gz", ".br")) and name[:-3] in keep
+                ):
+                    continue
+                os.remove(path)
+                removed += 1
+            if directory != self.location and not os.listdir(directory):
+                os.rmdir(directory)
+        logger.info("Deleted %s static files no longer in the build", removed)
+
+    @override
+    def save_manifest(self):
+        # the same as Django's, plus the hashes of the collected files
+        self.manifest_hash = self.file_hash(
+            None, ContentFile(json.dumps(sorted(self.hashed_files.items())).encode())
+        )
+        payload = {
+            "paths": self.hashed_files,
+            "version": self.manifest_version,
+            "hash": self.manifest_hash,
+            "sources": self.sources,
+        }
+        if self.manifest_storage.exists(self.manifest_name):
+            self.manifest_storage.delete(self.manifest_name)
+        contents = json.dumps(payload).encode()
+        self.manifest_storage._save(self.manifest_name, ContentFile(contents))
+
+
+_MISSING = object()
+
+
+class MetadataCache:
+    """Per-process cache of file metadata ({name: {"exists"/"size"/"url": value}}), holding the
+    'max_size' most recently used files for 'ttl' seconds each."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def get(self, name: str, key: str):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry[0] < time.monotonic():
+                return _MISSING
+            self.entries.move_to_end(name)
+            return entry[1].get(key, _MISSING)
+
+    def set(self, name: str, **values) -> None:
+        if not self.max_size:
+            return
+        now = time.monotonic()
+        with self.lock:
+            expires, metadata = self.entries.get(name, (0.0, {}))
+            if expires < now:
+                expires, metadata = now + self.ttl, {}
+            metadata.update(values)
+            self.entries[name] = (expires, metadata)
+            self.entries.move_to_end(name)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def forget(self, name: str) -> None:
+        with self.lock:
+            self.entries.pop(name, None)
 
 
 # wraps a storage class passed via "class_name" option and adds a uuid to the filename to avoid
 # possible collisions
+#
+# it also caches the existence, size and URL of files (see MetadataCache, sized by the
+# "metadata_cache_size" and "metadata_ttl" options), since those can be a request to the object
+# storage each; files saved or deleted through this process are forgotten right away, but other
+# processes can see them as they were until their entry expires (only files found to exist are
+# cached, so a file can't be missing for that long), and signed URLs must outlive the TTL
 class UuidNameStorage:
     def __init__(self, **settings):
         class_name = settings.pop("class_name")
+        self.__metadata = MetadataCache(
+            settings.pop("metadata_cache_size", 1024), settings.pop("metadata_ttl", 300)
+        )
         module, name = class_name.rsplit(".", 1)
         class_ref = getattr(importlib.import_module(module), name)
         self.__base: Storage = class_ref(**settings)
@@ -49,3 +302,122 @@ class UuidNameStorage:
             logging.getLogger("django").error(f"Filename {filename} has no extension")
 
         return filename
+
+    def exists(self, name: str) -> bool:
+        exists = self.__metadata.get(name, "exists")
+        if exists is _MISSING:
+            exists = self.__base.exists(name)
+            if exists:
+                self.__metadata.set(name, exists=True)
+        return exists
+
+    def size(self, name: str) -> int:
+        size = self.__metadata.get(name, "size")
+        if size is _MISSING:
+            size = self.__base.size(name)
+            self.__metadata.set(name, exists=True, size=size)
+        return size
+
+    def url(self, name: str, *args, **kwargs) -> str:
+        # URLs with extra arguments (like another expiry for signed ones) aren't cached
+        if args or kwargs:
+            return self.__base.url(name, *args, **kwargs)
+        url = self.__metadata.get(name, "url")
+        if url is _MISSING:
+            url = self.__base.url(name)
+            self.__metadata.set(name, url=url)
+        return url
+
+    def save(self, name, content, max_length=None) -> str:
+        name = self.__base.save(name, content, max_length)
+        self.__metadata.forget(name)
+        return name
+
+    def delete(self, name: str) -> None:
+        self.__base.delete(name)
+        self.__metadata.forget(name)
+
+    def forget(self, name: str) -> None:
+        """Drop the cached metadata of a file changed or deleted behind this storage's back."""
+        self.__metadata.forget(name)
+
+    def prefetch(self, names, metadata=("exists", "size", "url")) -> None:
+        """Look up the metadata of many files at once (sizes concurrently, as they each take a
+        request to object storage), so that rendering a page of objects finds it all cached.
+
+        Files that turn out to be missing are left to be looked up when used.
+        """
+        names = [
+            name
+            for name in dict.fromkeys(names)
+            if name
+            and any(self.__metadata.get(name, key) is _MISSING for key in metadata)
+        ]
+        if not names or not self.__metadata.max_size:
+            return
+        if "url" in metadata:
+            # computed locally (for S3, even signed ones)
+            for name in names:
+                self.__metadata.set(name, url=self.__base.url(name))
+        if "exists" in metadata or "size" in metadata:
+            with ThreadPoolExecutor(min(len(names), 8)) as pool:
+                for name, size in zip(names, pool.map(self._size_or_none, names)):
+                    if size is not None:
+                        self.__metadata.set(name, exists=True, size=size)
+
+    def _size_or_none(self, name: str) -> int | None:
+        try:
+            return self.__base.size(name)
+        except Exception:
+            return None
+
+
+@receiver(cleanup_post_delete, dispatch_uid="storage_forget_cleaned_up_file")
+def forget_cleaned_up_file(sender, file, file_name, **kwargs):
+    # django-cleanup deletes replaced and deleted files after the transaction commits, through a
+    # storage it may have recovered from the field rather than the one the file was read with
+    forget = getattr(file.storage, "forget", None)
+    if forget is not None:
+        forget(file_name)
+
+
+DIRECT_UPLOAD_SALT = "core.storage.direct_upload"
+
+
+def direct_upload(
+    storage, name: str, content_type: str, max_size: int, expires: int = 3600
+) -> dict:
+    """Where and how a browser can upload a file straight to the storage, under 'name':
+    {"url", "method", "headers"} for a request whose body is the file.
+
+    For S3 (R2) it's a presigned PUT to the bucket, so the file never goes through a Django
+    worker; the size can't be limited that way, so whatever records the upload has to check it.
+    Other storages (the local file system) get the 'core.views.direct_upload' stand-in, which
+    enforces 'max_size' itself.
+    """
+    if hasattr(storage, "bucket_name"):
+        from storages.utils import clean_name
+
+        url = storage.connection.meta.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": storage.bucket_name,
+                "Key": storage._normalize_name(clean_name(name)),
+                "ContentType": content_type,
+            },
+            ExpiresIn=expires,
+            HttpMethod="PUT",
+        )
+    else:
+        token = signing.dumps(
+            {
+                "name": name,
+                "content_type": content_type,
+                "max_size": max_size,
+                "expires": time.time() + expires,
+            },
+            salt=DIRECT_UPLOAD_SALT,
+        )
+        url = reverse("direct_upload", args=[token])
+    # the content type is part of the signature
+    return {"url": url, "method": "PUT", "headers": {"Content-Type": content_type}}
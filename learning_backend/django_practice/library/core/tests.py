@@ -1,3 +1,778 @@
-from django.test import TestCase
+import datetime
+import json
+import logging
+import tempfile
+import time
+from collections import Counter
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.contrib.sessions.models import Session
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django_cleanup.signals import cleanup_post_delete
+from django.utils import timezone
+
+from catalog.models import Author, Book
+from core.backends import CachedModelBackend
+from core.explain import Plan, _walk
+from core.logs import (
+    BackgroundHandler,
+    JsonFormatter,
+    RateLimitFilter,
+    RequestIdFilter,
+    SharedRotatingFileHandler,
+    request_id,
+)
+from core.models import ProfiledRequest, ProfilingSession, User
+from core.profiler import StackSampler, _state, collapsed, top_functions
+from core.queries import (
+    VIEW_QUERIES,
+    QueryAssertionsMixin,
+    QueryBudgetExceeded,
+    QueryRecorder,
+    fingerprint,
+)
+from core.sessions.middleware import SessionMiddleware
+from core.storage import UuidNameStorage, direct_upload
+from core.timing import REQUEST_PHASE_SECONDS, Timeline, span_exporter
+
+
+class FingerprintTest(SimpleTestCase):
+    def test_values_are_normalized(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 1 AND b = 'x''y'"),
+            fingerprint("SELECT *  FROM t WHERE a = 22 AND b = 'z'"),
+        )
+
+    def test_in_lists_are_collapsed(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id IN (...)",
+        )
+
+
+class QueryInspectionTest(QueryAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(3):
+            Author.objects.create(first_name=f"First {index}", last_name="Last")
+
+    def test_recorder_flags_repeated_query_shapes(self):
+        with QueryRecorder().record() as recorder:
+            for author in Author.objects.all():
+                Author.objects.filter(pk=author.pk).exists()
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(len(recorder.repeated(threshold=3)), 1)
+
+    def test_assert_no_n_plus_one(self):
+        with self.assertRaises(AssertionError):
+            with self.assertNoNPlusOne(threshold=2):
+                for author in Author.objects.all():
+                    Author.objects.filter(pk=author.pk).exists()
+
+    @override_settings(QUERY_BUDGETS={"default": 0}, QUERY_BUDGETS_STRICT=True)
+    def test_middleware_enforces_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse("catalog:authors"))
+
+    @override_settings(QUERY_BUDGETS={"default": 0}, QUERY_BUDGETS_STRICT=True)
+    async def test_middleware_enforces_budget_under_asgi(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            await self.async_client.get(reverse("catalog:authors"))
+
+    @override_settings(QUERY_BUDGETS={"default": 0}, QUERY_BUDGETS_STRICT=False)
+    def test_middleware_exports_query_counts(self):
+        before = self._observed_count("catalog:authors")
+        response = self.client.get(reverse("catalog:authors"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._observed_count("catalog:authors"), before + 1)
+
+    def test_catalog_authors_within_budget(self):
+        with self.assertWithinQueryBudget("catalog:authors"):
+            self.client.get(reverse("catalog:authors"))
+
+    def _observed_count(self, view_name):
+        for metric in VIEW_QUERIES.collect():
+            for sample in metric.samples:
+                if (
+                    sample.name.endswith("_count")
+                    and sample.labels["view"] == view_name
+                ):
+                    return sample.value
+        return 0
+
+
+class ExplainTest(SimpleTestCase):
+    # shape of postgres' 'EXPLAIN (ANALYZE, FORMAT JSON)' output
+    PLAN = {
+        "Node Type": "Limit",
+        "Actual Rows": 10,
+        "Plans": [
+            {
+                "Node Type": "Sort",
+                "Sort Key": ["catalog_book.title DESC"],
+                "Actual Rows": 10,
+                "Plans": [
+                    {
+                        "Node Type": "Seq Scan",
+                        "Relation Name": "catalog_book",
+                        "Filter": "(author_id = 3)",
+                        "Actual Rows": 400,
+                        "Rows Removed by Filter": 9600,
+                    }
+                ],
+            }
+        ],
+    }
+
+    def test_reports_seq_scans_and_sorts(self):
+        plan = Plan("SELECT ...")
+        _walk(self.PLAN, plan, min_rows=1000)
+        self.assertEqual(
+            [str(finding) for finding in plan.findings],
+            [
+                "sort without an index (10000 rows): ORDER BY catalog_book.title DESC; "
+                "consider an index on (catalog_book.title DESC)",
+                "sequential scan on catalog_book (10000 rows): filter (author_id = 3); "
+                "consider an index on the filtered columns",
+            ],
+        )
+
+    def test_ignores_small_tables(self):
+        plan = Plan("SELECT ...")
+        _walk(self.PLAN, plan, min_rows=20000)
+        self.assertEqual(plan.findings, [])
+
+
+class IndexAdvisorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="reader")
+        author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        Book.objects.create(title="Dune", summary="Sand", isbn="1", author=author)
+
+    def test_replays_list_views(self):
+        out = StringIO()
+        call_command("index_advisor", "--min-rows=0", stdout=out)
+        output = out.getvalue()
+        for name in ("catalog:books", "catalog:authors", "catalog:my_borrowed"):
+            self.assertIn(name, output)
+        # counting for the page numbers reads the whole table
+        self.assertIn("sequential scan on catalog_author", output)
+
+    def test_fail_option(self):
+        with self.assertRaises(CommandError):
+            call_command("index_advisor", "--min-rows=0", "--fail", stdout=StringIO())
+        # tables this small are below the default threshold
+        call_command("index_advisor", "--fail", stdout=StringIO())
+
+
+class CompareBenchmarksTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write_run(self, name, medians):
+        path = self.directory / name
+        run = {
+            "commit_info": {"id": name},
+            "benchmarks": [
+                {"fullname": fullname, "stats": {"median": median, "min": median}}
+                for fullname, median in medians.items()
+            ],
+        }
+        path.write_text(json.dumps(run))
+        return path
+
+    def test_flags_regressions_beyond_threshold(self):
+        baseline = self.write_run("before.json", {"list": 1.0, "detail": 1.0})
+        current = self.write_run("after.json", {"list": 1.05, "detail": 1.5})
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "1 benchmark(s)"):
+            call_command("compare_benchmarks", baseline, current, stdout=out)
+        self.assertIn("+50.0%  REGRESSION", out.getvalue())
+
+        call_command(
+            "compare_benchmarks", baseline, current, "--threshold=60", stdout=out
+        )
+        self.assertIn("No regressions", out.getvalue())
+
+    def test_new_and_removed_benchmarks(self):
+        baseline = self.write_run("before.json", {"list": 1.0})
+        current = self.write_run("after.json", {"detail": 1.0})
+        out = StringIO()
+        call_command("compare_benchmarks", baseline, current, stdout=out)
+        self.assertIn("detail  new", out.getvalue())
+        self.assertIn("list    removed", out.getvalue())
+
+    def test_needs_two_runs(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "compare_benchmarks", f"--storage={self.directory}", stdout=StringIO()
+            )
+
+
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        Book.objects.create(title="Dune", summary="Sand", isbn="1", author=author)
+
+    def phases(self, response) -> dict[str, str]:
+        return {
+            metric.split(";")[0]: metric
+            for metric in response["Server-Timing"].split(", ")
+        }
+
+    def test_header_breaks_down_the_request(self):
+        response = self.client.get(reverse("catalog:books"))
+        phases = self.phases(response)
+        for phase in ("middleware", "view", "db", "template", "total"):
+            self.assertIn(phase, phases)
+        self.assertRegex(phases["db"], r'^db;dur=[\d.]+;desc="\d+ calls"$')
+
+        observed = REQUEST_PHASE_SECONDS.labels("catalog:books", "db")
+        self.assertGreater(observed._sum.get(), 0)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_turned_off(self):
+        response = self.client.get(reverse("catalog:index"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_nested_calls_of_the_same_phase_count_once(self):
+        timeline = Timeline("GET")
+        with timeline.span("cache.get_or_set", "cache"):
+            with timeline.span("cache.add", "cache"):
+                pass
+        timeline.finish()
+        durations = timeline.durations()
+        self.assertEqual(durations["cache"], timeline.spans[1].duration)
+        self.assertEqual(timeline.counts()["cache"], 2)
+
+    def test_spans_are_exported_as_otlp_json(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = str(Path(directory.name) / "spans.jsonl")
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        with override_settings(SERVER_TIMING_SPANS_FILE=path):
+            self.client.get(
+                reverse("catalog:books"),
+                headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"},
+            )
+        span_exporter(path).shutdown()
+
+        [line] = Path(path).read_text().splitlines()
+        spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root = spans[0]
+        self.assertEqual(root["name"], "GET catalog:books")
+        self.assertEqual(root["parentSpanId"], "00f067aa0ba902b7")
+        self.assertEqual({span["traceId"] for span in spans}, {trace_id})
+        view = next(span for span in spans if span["name"] == "view")
+        self.assertEqual(view["parentSpanId"], root["spanId"])
+        self.assertTrue(
+            any(span["name"].startswith("render catalog/") for span in spans)
+        )
+
+
+class ProfilerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="password")
+        author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        Book.objects.create(title="Dune", summary="Sand", isbn="1", author=author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        state_file = override_settings(
+            PROFILER_STATE_FILE=str(Path(directory.name) / "profiler.json")
+        )
+        state_file.enable()
+        self.addCleanup(state_file.disable)
+        _state.forget()
+        self.addCleanup(_state.forget)
+
+    def busy(self, seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    def test_sampler_keeps_the_frames_below_its_caller(self):
+        sampler = StackSampler(0.001).start()
+        self.busy(0.05)
+        stacks = sampler.stop()
+        self.assertIn("core.tests:ProfilerTest.busy", stacks)
+
+    def test_top_functions_and_collapsed_stacks(self):
+        stacks = Counter({"view;render;query": 3, "view;render": 1, "view": 1})
+        functions = {
+            function.name: (function.own, function.total)
+            for function in top_functions(stacks)
+        }
+        self.assertEqual(functions, {"query": (3, 3), "render": (1, 4), "view": (1, 5)})
+        self.assertEqual(collapsed(stacks).splitlines()[0], "view;render;query 3")
+
+    def test_idle_requests_make_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(_state.sessions_for("/catalog/books/"), [])
+
+    def test_profiles_matching_requests_up_to_the_limit(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:core_profilingsession_add"),
+                {
+                    "path_regex": "^/catalog/books/",
+                    "max_requests": 1,
+                    "interval_ms": 1,
+                    "expires_at_0": "2100-01-01",
+                    "expires_at_1": "00:00:00",
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        session = ProfilingSession.objects.get()
+        self.assertEqual(session.created_by, self.admin)
+        # instead of waiting for the next check of the state file
+        _state.forget()
+
+        self.client.get(reverse("catalog:index"))
+        self.client.get(reverse("catalog:books"))
+        self.client.get(reverse("catalog:books"))
+        [profiled] = ProfiledRequest.objects.all()
+        self.assertEqual(profiled.view_name, "catalog:books")
+        session.refresh_from_db()
+        self.assertFalse(session.active)
+        # the used up session was dropped from the state file
+        self.assertEqual(_state.sessions_for("/catalog/books/"), [])
+
+        response = self.client.get(
+            reverse("admin:core_profilingsession_change", args=[session.pk])
+        )
+        self.assertContains(response, "Top functions")
+        response = self.client.get(
+            reverse("admin:core_profilingsession_collapsed", args=[session.pk])
+        )
+        self.assertEqual(response["Content-Type"], "text/plain")
+
+    def test_results_need_permission(self):
+        session = ProfilingSession.objects.create(max_requests=1)
+        self.client.force_login(User.objects.create_user(username="reader"))
+        response = self.client.get(
+            reverse("admin:core_profilingsession_collapsed", args=[session.pk])
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingPipelineTest(TestCase):
+    def record(self, msg="Slow query %s", args=("x",), **extra):
+        return logging.makeLogRecord(
+            {
+                "name": "core",
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": msg,
+                "args": args,
+                **extra,
+            }
+        )
+
+    def test_request_id_header(self):
+        response = self.client.get(reverse("catalog:index"))
+        self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{32}$")
+        response = self.client.get(
+            reverse("catalog:index"), headers={"X-Request-ID": "from-nginx"}
+        )
+        self.assertEqual(response["X-Request-ID"], "from-nginx")
+        response = self.client.get(
+            reverse("catalog:index"), headers={"X-Request-ID": "not valid!"}
+        )
+        self.assertNotEqual(response["X-Request-ID"], "not valid!")
+
+    def test_json_records(self):
+        record = self.record(status_code=500)
+        token = request_id.set("abc")
+        try:
+            RequestIdFilter().filter(record)
+        finally:
+            request_id.reset(token)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "Slow query x")
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["status_code"], 500)
+
+    def test_rate_limit(self):
+        limit = RateLimitFilter(limit=2, period=60)
+        passed = [limit.filter(self.record()) for _ in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        # other messages have their own limit
+        self.assertTrue(limit.filter(self.record(msg="Other")))
+
+        limit.window_start -= 60
+        record = self.record()
+        self.assertTrue(limit.filter(record))
+        self.assertEqual(record.repeats_suppressed, 3)
+
+    def test_background_handler_writes_from_another_thread(self):
+        handler = BackgroundHandler("core.tests.ListHandler")
+        handler.addFilter(RequestIdFilter())
+        token = request_id.set("abc")
+        try:
+            handler.handle(self.record())
+        finally:
+            request_id.reset(token)
+        self.assertNotEqual(handler.listener._thread, None)
+        handler.close()
+
+        [record] = handler.handler.records
+        self.assertEqual(record.getMessage(), "Slow query x")
+        self.assertEqual(record.request_id, "abc")
+
+    def test_processes_sharing_a_file_rotate_it_once(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "django.log"
+        # two handlers on one file, like two workers
+        first = SharedRotatingFileHandler(path, maxBytes=100, backupCount=3)
+        second = SharedRotatingFileHandler(path, maxBytes=100, backupCount=3)
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+
+        first.handle(self.record(msg="a" * 80, args=None))
+        first.handle(self.record(msg="b" * 80, args=None))
+        # rotated by the first handler, so the second one reopens the new file
+        second.handle(self.record(msg="c" * 10, args=None))
+        self.assertEqual(path.read_text(), "b" * 80 + "\n" + "c" * 10 + "\n")
+        self.assertEqual((path.parent / "django.log.1").read_text(), "a" * 80 + "\n")
+
+    def test_rotates_by_age(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "django.log"
+        handler = SharedRotatingFileHandler(path, interval=0)
+        self.addCleanup(handler.close)
+        handler.handle(self.record(msg="first", args=None))
+        handler.handle(self.record(msg="second", args=None))
+        self.assertEqual(path.read_text(), "second\n")
+
+
+class AuthCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="librarian", password="secret")
+        cls.permission = Permission.objects.get(codename="can_mark_returned")
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [
+            query["sql"]
+            for query in queries.captured_queries
+            if "core_user" in query["sql"] or "auth_permission" in query["sql"]
+        ]
+
+    def test_second_request_makes_no_auth_queries(self):
+        self.user.user_permissions.add(self.permission)
+        self.client.login(username="librarian", password="secret")
+        url = reverse("catalog:all_borrowed")
+
+        response, queries = self.auth_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries)
+        response, queries = self.auth_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_permission_changes_invalidate(self):
+        self.client.login(username="librarian", password="secret")
+        url = reverse("catalog:all_borrowed")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.user.user_permissions.add(self.permission)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.user_permissions.remove(self.permission)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        group = Group.objects.create(name="Librarians")
+        group.user_set.add(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        # changes every member's permissions, without touching the users
+        group.permissions.add(self.permission)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        group.delete()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_user_save_invalidates(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.assertEqual(backend.get_user(self.user.pk).first_name, "")
+
+        self.user.first_name = "Ada"
+        self.user.save()
+        self.assertEqual(backend.get_user(self.user.pk).first_name, "Ada")
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+
+class SessionTest(TestCase):
+    def respond(self, cookie, view):
+        def get_response(request):
+            view(request.session)
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        if cookie:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+        return SessionMiddleware(get_response)(request)
+
+    def test_unchanged_session_not_saved(self):
+        for engine in ("db", "signed_cookies"):
+            with self.subTest(engine), self.settings(
+                SESSION_ENGINE=f"core.sessions.backends.{engine}"
+            ):
+
+                def visit(session):
+                    session["num_visits"] = session.get("num_visits", 0) + 1
+
+                response = self.respond(None, visit)
+                cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+
+                def touch(session):
+                    # like a nested value set to what it already was
+                    session["extras"] = session.get("extras", {})
+                    session.modified = True
+
+                response = self.respond(cookie, touch)
+                self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+                cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.respond(cookie, touch)
+                self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+                self.assertEqual(len(queries), 1 if engine == "db" else 0)
+
+                if engine == "signed_cookies":
+                    # the data is the key
+                    continue
+                # cycling the key (as logging in does) keeps the data but has to be saved
+                response = self.respond(cookie, lambda session: session.cycle_key())
+                self.assertNotEqual(
+                    response.cookies[settings.SESSION_COOKIE_NAME].value, cookie
+                )
+
+    def test_purge_sessions(self):
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(
+                session_key=f"expired{number}",
+                session_data="",
+                expire_date=now - datetime.timedelta(days=number + 1),
+            )
+        Session.objects.create(
+            session_key="live",
+            session_data="",
+            expire_date=now + datetime.timedelta(days=1),
+        )
+        out = StringIO()
+        call_command("purge_sessions", "--batch-size=2", "-v2", stdout=out)
+        self.assertEqual(out.getvalue().count("Deleted"), 3)
+        self.assertIn("Purged 5 expired sessions", out.getvalue())
+        self.assertEqual(list(Session.objects.values_list("pk", flat=True)), ["live"])
+
+
+class StaticBuildTest(SimpleTestCase):
+    def test_incremental_precompressed_build(self):
+        root = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(
+            override_settings(
+                STATIC_ROOT=root,
+                STORAGES={
+                    **settings.STORAGES,
+                    "staticfiles": {
+                        "BACKEND": "core.storage.PrecompressedManifestStaticFilesStorage",
+                        "OPTIONS": {"workers": 2},
+                    },
+                },
+            )
+        )
+
+        with self.assertLogs("core.storage", "INFO") as logs:
+            call_command("collectstatic", "--noinput", verbosity=0)
+        self.assertRegex(logs.output[0], r"Hashed [1-9]\d* changed static files \(0 ")
+        # left out up front
+        self.assertEqual(list(root.glob("**/*.scss")), [])
+        manifest = json.loads((root / "staticfiles.json").read_text())
+        hashed = manifest["paths"]["core/css/bootstrap.min.css"]
+        self.assertTrue((root / f"{hashed}.gz").exists())
+        favicon = manifest["paths"]["core/images/favicon.jpg"]
+        # hashed up front, to the same hash Django puts in the name
+        self.assertIn(manifest["sources"]["core/images/favicon.jpg"][2], favicon)
+        # not worth compressing
+        self.assertFalse((root / f"{favicon}.gz").exists())
+
+        # left by earlier builds: an older version of a file, and one whose source is gone
+        stale = [
+            root / "core/css/bootstrap.min.0123456789ab.css",
+            root / "core/css/bootstrap.min.0123456789ab.css.gz",
+            root / "core/removed/removed.css",
+            root / "core/removed/removed.css.br",
+        ]
+        for path in stale:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("stale")
+
+        with self.assertLogs("core.storage", "INFO") as logs:
+            call_command("collectstatic", "--noinput", verbosity=0)
+        self.assertRegex(logs.output[0], r"Hashed 0 changed static files")
+        self.assertIn(f"Deleted {len(stale)} static files", logs.output[-1])
+        self.assertFalse(any(path.exists() for path in stale))
+        self.assertFalse((root / "core/removed").exists())
+        self.assertTrue((root / f"{hashed}.gz").exists())
+        self.assertTrue((root / "core/css/bootstrap.min.css").exists())
+        self.assertEqual(
+            json.loads((root / "staticfiles.json").read_text())["paths"],
+            manifest["paths"],
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.gettempdir())
+class DirectUploadTest(TestCase):
+    def test_presigned_put_for_s3(self):
+        storage = UuidNameStorage(
+            class_name="storages.backends.s3.S3Storage",
+            bucket_name="covers",
+            access_key="key",
+            secret_key="secret",
+            endpoint_url="https://account.r2.cloudflarestorage.com",
+        )
+        upload = direct_upload(storage, "cover-images/a.png", "image/png", 1024, 60)
+        self.assertEqual(upload["method"], "PUT")
+        self.assertTrue(
+            upload["url"].startswith(
+                "https://account.r2.cloudflarestorage.com/covers/cover-images/a.png?"
+            )
+        )
+        self.assertIn("Signature=", upload["url"])
+        self.assertEqual(upload["headers"], {"Content-Type": "image/png"})
+
+    def test_local_stand_in(self):
+        storage = UuidNameStorage(
+            class_name="django.core.files.storage.FileSystemStorage"
+        )
+        name = storage.generate_filename("uploads/a.txt")
+        self.addCleanup(storage.delete, name)
+        upload = direct_upload(storage, name, "text/plain", 10, 60)
+
+        def put(content, content_type="text/plain", url=upload["url"]):
+            return self.client.put(url, content, content_type=content_type)
+
+        self.assertEqual(put(b"hello", "text/html").status_code, 403)
+        self.assertEqual(put(b"hello world").status_code, 413)
+        self.assertEqual(put(b"hello", url=upload["url"][:-3] + "xx/").status_code, 403)
+        self.assertEqual(put(b"hello").status_code, 200)
+        with storage.open(name) as file:
+            self.assertEqual(file.read(), b"hello")
+        self.assertEqual(put(b"again").status_code, 409)
+
+        expired = direct_upload(storage, name + "2", "text/plain", 10, -1)
+        self.assertEqual(put(b"hello", url=expired["url"]).status_code, 403)
+
+
+class CountingStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = Counter()
+
+    def exists(self, name):
+        self.calls["exists"] += 1
+        return super().exists(name)
+
+    def size(self, name):
+        self.calls["size"] += 1
+        return super().size(name)
+
+
+class StorageMetadataCacheTest(SimpleTestCase):
+    def storage(self, **options):
+        storage = UuidNameStorage(
+            class_name="core.tests.CountingStorage",
+            location=self.enterContext(tempfile.TemporaryDirectory()),
+            **options,
+        )
+        return storage, storage.calls
+
+    def test_metadata_is_cached_until_changed(self):
+        storage, calls = self.storage()
+        name = storage.save("a.txt", ContentFile(b"hello"))
+        # saving checks that the name is free
+        calls.clear()
+        self.assertEqual(storage.size(name), 5)
+        self.assertEqual(storage.size(name), 5)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(calls, {"size": 1})
+
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+        # missing files aren't cached, so they show up as soon as they're saved
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(calls["exists"], 2)
+        storage.save(name, ContentFile(b"hello again"))
+        self.assertEqual(storage.size(name), 11)
+
+    def test_bounded_and_expiring(self):
+        storage, calls = self.storage(metadata_cache_size=2)
+        names = [storage.save(f"{n}.txt", ContentFile(b"x")) for n in range(3)]
+        for name in names:
+            storage.size(name)
+        # the least recently used one was evicted
+        storage.size(names[0])
+        self.assertEqual(calls["size"], 4)
+
+        storage, calls = self.storage(metadata_ttl=0)
+        name = storage.save("a.txt", ContentFile(b"x"))
+        storage.size(name)
+        storage.size(name)
+        self.assertEqual(calls["size"], 2)
+
+    def test_prefetch(self):
+        storage, calls = self.storage()
+        names = [storage.save(f"{n}.txt", ContentFile(b"x" * n)) for n in range(4)]
+        storage.prefetch([*names, "missing.txt", ""])
+        self.assertEqual(calls["size"], 5)
+        self.assertEqual([storage.size(name) for name in names], [0, 1, 2, 3])
+        self.assertEqual(storage.url(names[0]), f"/user-media/{names[0]}")
+        self.assertEqual(calls["size"], 5)
+
+        storage.prefetch(names)
+        self.assertEqual(calls["size"], 5)
+
+    def test_forgets_files_deleted_by_cleanup(self):
+        storage, calls = self.storage()
+        name = storage.save("a.txt", ContentFile(b"x"))
+        storage.size(name)
+        cleanup_post_delete.send(
+            sender=Book,
+            file=type("File", (), {"storage": storage})(),
+            file_name=name,
+        )
+        storage.size(name)
+        self.assertEqual(calls["size"], 2)
@@ -0,0 +1,443 @@
+"""Per-request timing, broken down into phases.
+
+'RequestTimingMiddleware' (first in the chain) and 'ViewTimingMiddleware' (last) split every
+request into time spent in middleware and in the view (URL resolution, the view itself and
+rendering its template response). Inside that, 'instrument()' records a span for every SQL query,
+template render, cache call and storage call, so each request ends with these phases:
+
+    middleware, view   where the request's time went (they add up to the total)
+    db, template,      time spent in that kind of call, wherever it happened (sessions and auth
+    cache, storage     query the database from middleware, for example)
+
+They are reported as a 'Server-Timing' header (shown in the browser's devtools), as the
+'django_request_phase_seconds' prometheus histogram labelled by URL name, and optionally as
+OpenTelemetry spans appended to a local file in OTLP JSON.
+"""
+
+import atexit
+import functools
+import json
+import re
+import secrets
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+from prometheus_client import Histogram
+
+from core.queries import QueryInspectionMiddleware
+
+PHASES = ("middleware", "view", "db", "template", "cache", "storage")
+
+REQUEST_PHASE_SECONDS = Histogram(
+    "django_request_phase_seconds",
+    "Time spent in each phase of a request (middleware, view, db, template, cache, storage), "
+    "by URL name",
+    ["view", "phase"],
+)
+
+CACHE_METHODS = (
+    "get",
+    "get_many",
+    "get_or_set",
+    "set",
+    "set_many",
+    "add",
+    "touch",
+    "delete",
+    "delete_many",
+    "has_key",
+    "incr",
+    "decr",
+)
+STORAGE_METHODS = ("open", "save", "delete", "exists", "listdir", "size", "url")
+
+# W3C trace context sent by a proxy or client, so the request's spans join its trace
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_timeline: ContextVar["Timeline | None"] = ContextVar("timeline", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    phase: str
+    # perf_counter_ns() readings
+    start: int
+    end: int | None = None
+    parent: "Span | None" = None
+    attributes: dict = field(default_factory=dict)
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) / 1e9 if self.end else 0.0
+
+    def within(self, phase: str) -> bool:
+        parent = self.parent
+        while parent:
+            if parent.phase == phase:
+                return True
+            parent = parent.parent
+        return False
+
+
+class Timeline:
+    """The spans of one request, with the request itself as the root span."""
+
+    def __init__(self, name: str, traceparent: str = ""):
+        match = _TRACEPARENT.match(traceparent)
+        self.trace_id = match[1] if match else secrets.token_hex(16)
+        self.remote_parent_id = match[2] if match else None
+        # spans are timed with perf_counter_ns() and placed on the wall clock from here
+        self.wall_start = time.time_ns()
+        self.root = Span(name, "request", time.perf_counter_ns())
+        self.spans = [self.root]
+        self.current = self.root
+
+    @contextmanager
+    def span(self, name: str, phase: str, **attributes):
+        # spans opened while another is open are its children (concurrent tasks of an async view
+        # can get each other's spans as parents, which only affects the exported tree)
+        span = Span(
+            name,
+            phase,
+            time.perf_counter_ns(),
+            parent=self.current,
+            attributes=attributes,
+        )
+        self.spans.append(span)
+        self.current = span
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter_ns()
+            self.current = span.parent
+
+    def finish(self) -> None:
+        self.root.end = time.perf_counter_ns()
+
+    def durations(self) -> dict[str, float]:
+        """Seconds spent in each phase (and "total")."""
+        durations = dict.fromkeys(PHASES, 0.0)
+        for span in self.spans[1:]:
+            # a cache call made by another cache call (like get_or_set() calling add()) is
+            # already part of the outer call's time
+            if not span.within(span.phase):
+                durations[span.phase] = durations.get(span.phase, 0.0) + span.duration
+        durations["total"] = self.root.duration
+        durations["middleware"] = max(durations["total"] - durations["view"], 0.0)
+        return durations
+
+    def counts(self) -> dict[str, int]:
+        counts = dict.fromkeys(PHASES, 0)
+        for span in self.spans[1:]:
+            counts[span.phase] = counts.get(span.phase, 0) + 1
+        return counts
+
+    def server_timing(self) -> str:
+        """'Server-Timing' header value: every phase that happened, in milliseconds."""
+        counts = self.counts()
+        metrics = []
+        for phase, seconds in self.durations().items():
+            if phase in ("middleware", "view", "total") or counts.get(phase):
+                metric = f"{phase};dur={seconds * 1000:.1f}"
+                if counts.get(phase) and phase not in ("middleware", "view"):
+                    metric += f';desc="{counts[phase]} calls"'
+                metrics.append(metric)
+        return ", ".join(metrics)
+
+
+@contextmanager
+def span(name: str, phase: str, **attributes):
+    """Time a block as part of the current request (does nothing outside of one)."""
+    timeline = _timeline.get()
+    if timeline is None:
+        yield None
+        return
+    with timeline.span(name, phase, **attributes) as span:
+        yield span
+
+
+def _timed(phase: str, name: str, function):
+    if getattr(function, "timed", False):
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        timeline = _timeline.get()
+        if timeline is None:
+            return function(*args, **kwargs)
+        with timeline.span(name, phase):
+            return function(*args, **kwargs)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _instrument_class(cls, phase: str, methods) -> None:
+    for method in methods:
+        if hasattr(cls, method):
+            setattr(
+                cls, method, _timed(phase, f"{phase}.{method}", getattr(cls, method))
+            )
+
+
+def instrument() -> None:
+    """Wrap template rendering and the configured cache and storage backends so their calls are
+    recorded as spans (called once at startup when 'settings.SERVER_TIMING' is on).
+
+    Queries are recorded by the middleware instead, with an execute wrapper.
+    """
+    from django.template.backends.django import Template
+
+    render = Template.render
+    if not getattr(render, "timed", False):
+
+        @functools.wraps(render)
+        def timed_render(self, context=None, request=None):
+            with span(f"render {self.template.name}", "template"):
+                return render(self, context, request)
+
+        timed_render.timed = True
+        Template.render = timed_render
+
+    for config in settings.CACHES.values():
+        _instrument_class(import_string(config["BACKEND"]), "cache", CACHE_METHODS)
+    for config in settings.STORAGES.values():
+        classes = [config["BACKEND"]]
+        # wrapping storages (like 'core.storage.UuidNameStorage') name the storage they wrap
+        if "class_name" in config.get("OPTIONS", {}):
+            classes.append(config["OPTIONS"]["class_name"])
+        for class_name in classes:
+            _instrument_class(import_string(class_name), "storage", STORAGE_METHODS)
+
+
+def _record_query(execute, sql, params, many, context):
+    timeline = _timeline.get()
+    if timeline is None:
+        return execute(sql, params, many, context)
+    with timeline.span(
+        "db.executemany" if many else "db.query",
+        "db",
+        **{
+            "db.system": context["connection"].vendor,
+            "db.statement": sql,
+        },
+    ):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def _recording_queries():
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(_record_query))
+        yield
+
+
+class RequestTimingMiddleware:
+    """Times the whole request and reports its phases (see the module docstring).
+
+    Goes first in the middleware list, with 'ViewTimingMiddleware' last.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timeline = self.start(request)
+        token = _timeline.set(timeline)
+        try:
+            with _recording_queries():
+                response = self.get_response(request)
+        finally:
+            _timeline.reset(token)
+        self.report(request, response, timeline)
+        return response
+
+    async def __acall__(self, request):
+        timeline = self.start(request)
+        token = _timeline.set(timeline)
+        # queries run in the ORM's sync thread, so the wrappers are installed there (see
+        # 'QueryInspectionMiddleware')
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(_recording_queries())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _timeline.reset(token)
+        self.report(request, response, timeline)
+        return response
+
+    @staticmethod
+    def start(request) -> Timeline:
+        return Timeline(request.method, request.headers.get("traceparent", ""))
+
+    def report(self, request, response, timeline: Timeline) -> None:
+        timeline.finish()
+        view_name = QueryInspectionMiddleware.view_name(request)
+        # span names should have few distinct values, so the URL name instead of the path
+        timeline.root.name = f"{request.method} {view_name}"
+        timeline.root.attributes.update(
+            {
+                "http.request.method": request.method,
+                "http.route": view_name,
+                "url.path": request.path,
+                "http.response.status_code": response.status_code,
+            }
+        )
+
+        for phase, seconds in timeline.durations().items():
+            REQUEST_PHASE_SECONDS.labels(view_name, phase).observe(seconds)
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timeline.server_timing()
+        if settings.SERVER_TIMING_SPANS_FILE:
+            span_exporter(settings.SERVER_TIMING_SPANS_FILE).export(timeline)
+
+
+class ViewTimingMiddleware:
+    """Records the "view" span: everything after the last middleware (see
+    'RequestTimingMiddleware')."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with span("view", "view"):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with span("view", "view"):
+            return await self.get_response(request)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        # OTLP JSON encodes 64 bit integers as strings
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+# OTLP span kinds
+_INTERNAL, _SERVER, _CLIENT = 1, 2, 3
+
+
+class SpanFileExporter:
+    """Appends every request's spans to a file, one OTLP JSON 'ExportTraceServiceRequest' per line
+    (the format the OpenTelemetry collector's 'otlpjsonfile' receiver reads).
+
+    Lines are written by a background thread, so requests don't wait on the disk, each with a
+    single write() to a file opened for appending, so several worker processes can share a file.
+    """
+
+    def __init__(self, path: str, service_name: str = "library"):
+        self.path = path
+        self.service_name = service_name
+        self.lines = []
+        self.ready = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, timeline: Timeline) -> None:
+        line = json.dumps(self.encode(timeline), separators=(",", ":")) + "\n"
+        with self.ready:
+            self.lines.append(line.encode())
+            self.ready.notify()
+
+    def run(self) -> None:
+        with open(self.path, "ab", buffering=0) as file:
+            while True:
+                with self.ready:
+                    while not self.lines:
+                        self.ready.wait()
+                    lines, self.lines = self.lines, []
+                for line in lines:
+                    if line is None:
+                        return
+                    file.write(line)
+
+    def shutdown(self) -> None:
+        if self.thread.is_alive():
+            with self.ready:
+                self.lines.append(None)
+                self.ready.notify()
+            self.thread.join(timeout=5)
+
+    def encode(self, timeline: Timeline) -> dict:
+        def unix_nanos(reading: int) -> str:
+            return str(timeline.wall_start + reading - timeline.root.start)
+
+        spans = []
+        for span in timeline.spans:
+            if span.end is None:
+                continue
+            parent_id = (
+                span.parent.span_id if span.parent else timeline.remote_parent_id
+            )
+            spans.append(
+                {
+                    "traceId": timeline.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": parent_id} if parent_id else {}),
+                    "name": span.name,
+                    "kind": (
+                        _SERVER
+                        if span is timeline.root
+                        else _CLIENT if span.phase in ("db", "cache") else _INTERNAL
+                    ),
+                    "startTimeUnixNano": unix_nanos(span.start),
+                    "endTimeUnixNano": unix_nanos(span.end),
+                    "attributes": [
+                        _attribute(key, value)
+                        for key, value in {
+                            "phase": span.phase,
+                            **span.attributes,
+                        }.items()
+                    ],
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [_attribute("service.name", self.service_name)]
+                    },
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+
+
+@functools.cache
+def span_exporter(path: str) -> SpanFileExporter:
+    return SpanFileExporter(path)
@@ -1,5 +1,8 @@
 from django.urls import include, path
 
+from . import views
+
 urlpatterns = [
     path("accounts/", include("allauth.urls")),
+    path("uploads/<str:token>/", views.direct_upload, name="direct_upload"),
 ]
@@ -1 +1,36 @@
-# Create your views here.
+import time
+
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .storage import DIRECT_UPLOAD_SALT
+
+
+# the token (from 'core.storage.direct_upload') authorizes the upload like a presigned URL would,
+# and requests come from scripts, not forms
+@csrf_exempt
+@require_http_methods(["PUT"])
+def direct_upload(request, token):
+    """Stand-in for a bucket's presigned PUT URLs when media files are stored locally."""
+    try:
+        upload = signing.loads(token, salt=DIRECT_UPLOAD_SALT)
+    except signing.BadSignature:
+        return HttpResponse("Invalid upload URL", status=403)
+    if upload["expires"] < time.time():
+        return HttpResponse("Upload URL expired", status=403)
+    if request.content_type != upload["content_type"]:
+        return HttpResponse("Content-Type doesn't match the upload URL", status=403)
+    # checked before reading the body, when the client says how big it is
+    if int(request.headers.get("Content-Length") or 0) > upload["max_size"] or (
+        len(request.body) > upload["max_size"]
+    ):
+        return HttpResponse("File too large", status=413)
+    if default_storage.exists(upload["name"]):
+        return HttpResponse("Already uploaded", status=409)
+
+    default_storage.save(upload["name"], ContentFile(request.body))
+    return HttpResponse()
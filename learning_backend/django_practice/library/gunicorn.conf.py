@@ -1,7 +1,57 @@
 import multiprocessing
+import os
+
+from gunicorn.glogging import CONFIG_DEFAULTS
 
 workers = multiprocessing.cpu_count() * 2 + 1
-accesslog = "/app/library/log/gunicorn-access.log"
+# gunicorn runs from /app/library, so the access log goes through the same pipeline as Django's
+# logs ('core.logs'): queued for a background thread in each worker and rotated by size and age
+access_log_format = (
+    '%(h)s "%(r)s" %(s)s %(b)s %(L)ss "%(a)s" request_id=%({x-request-id}i)s'
+)
+# 'core.loadtest' turns the access log off, since writing it would be part of what it measures
+if os.environ.get("GUNICORN_ACCESS_LOG", "True") == "True":
+    logconfig_dict = {
+        # (top-level keys replace gunicorn's defaults, which the root logger still uses)
+        "formatters": {
+            **CONFIG_DEFAULTS["formatters"],
+            "json": {"()": "core.logs.JsonFormatter"},
+        },
+        "handlers": {
+            **CONFIG_DEFAULTS["handlers"],
+            "access": {
+                "()": "core.logs.BackgroundHandler",
+                "class_name": "core.logs.SharedRotatingFileHandler",
+                "filename": os.path.join(
+                    os.path.dirname(__file__), "log", "gunicorn-access.log"
+                ),
+                "maxBytes": 50 * 1024 * 1024,
+                "backupCount": 5,
+                "interval": 24 * 60 * 60,
+                "formatter": "json",
+            },
+        },
+        # gunicorn.error isn't listed, so it keeps the 'errorlog' handler
+        "loggers": {
+            "gunicorn.access": {
+                "level": "INFO",
+                "handlers": ["access"],
+                "propagate": False,
+            },
+        },
+    }
 errorlog = "/app/library/log/gunicorn-error.log"
 # Whether to send Django output to the console to the error log
-capture_output = True
\ No newline at end of file
+capture_output = True
+
+# same variable as settings.DJANGO_SERVER_MODE, so the served entry point and the views Django
+# routes to always match
+if os.environ.get("DJANGO_SERVER_MODE", "wsgi") == "asgi":
+    # gunicorn only manages the processes; each uvicorn worker runs an event loop that can serve
+    # many requests at once while they wait on the database/S3
+    wsgi_app = "library.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # a single event loop per core can already keep a core busy
+    workers = multiprocessing.cpu_count() + 1
+else:
+    wsgi_app = "library.wsgi:application"
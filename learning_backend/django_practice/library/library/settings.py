@@ -11,9 +11,12 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 from corsheaders.defaults import default_headers, default_methods
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,6 +24,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 ENV = os.environ.get("DJANGO_ENV", "dev")
 DEBUG = os.environ.get("DJANGO_DEBUG", "") == "True"
 PROD = os.environ.get("DJANGO_ENV", "") == "prod"
+TESTING = sys.argv[1:2] == ["test"]
 
 
 SECRET_KEY = os.environ.get(
@@ -98,6 +102,8 @@ INSTALLED_APPS = [
     # "allauth.socialaccount.provicers.xxx",
     # required to support permissions associated with models and generic relation fields
     "django.contrib.contenttypes",
+    # full-text search and trigram lookups (for 'catalog.search')
+    "django.contrib.postgres",
     "django.contrib.sessions",
     "django.contrib.messages",
     "catalog.apps.CatalogConfig",
@@ -107,7 +113,7 @@ INSTALLED_APPS = [
     "crispy_forms",
     "crispy_bootstrap5",
     # required to serve statics when using 'runserver' command and run 'collectstatic' command
-    "django.contrib.staticfiles",
+    "core.apps.StaticFilesConfig",
     # deletes old file when a new file name is uploaded for a model field (probably avoid using
     # this, or at least heavily configure, if you are performing more complex or persistent media
     # storage)
@@ -125,12 +131,69 @@ INSTALLED_APPS = [
 
 USING_WHITENOISE = os.environ.get("USE_WHITENOISE", "False") == "True"
 
+# records the queries run by every request to flag N+1 patterns and enforce QUERY_BUDGETS, and
+# exports per-view query counts/time to prometheus
+QUERY_INSPECTION = os.environ.get("QUERY_INSPECTION", "True") == "True"
+# max number of queries per request by URL name (including session/user lookups), with "default"
+# for any URL not listed (None for no limit); each is the view's cold-cache count plus a few
+# queries of headroom for incidental ones (a session save, a 'last_login' update, a cold auth cache)
+QUERY_BUDGETS = {
+    "default": int(os.environ.get("QUERY_BUDGET_DEFAULT", 30)),
+    "catalog:index": 8,
+    "catalog:books": 10,
+    "catalog:book_search": 10,
+    "catalog:authors": 9,
+    "catalog:book_detail": 10,
+    "catalog:book_detail_nonregexp": 10,
+    "catalog:author_detail": 10,
+    "catalog:my_borrowed": 10,
+    "catalog:all_borrowed": 10,
+}
+# raise instead of logging when a budget is exceeded; only in tests by default, so an incidental
+# extra query doesn't turn a dev page into a 500
+QUERY_BUDGETS_STRICT = os.environ.get("QUERY_BUDGETS_STRICT", str(TESTING)) == "True"
+# the same query shape run this many times in one request is reported as a possible N+1
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.environ.get("QUERY_N_PLUS_ONE_THRESHOLD", 5))
+
+# splits every request into phases (middleware, view, db, template, cache, storage) and exports
+# them to prometheus by URL name ('core.timing')
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "True") == "True"
+# also send the phases to the browser in a 'Server-Timing' header (shown in the devtools network
+# tab); off in production by default since timings can help attackers probe the server
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", str(not PROD)) == "True"
+# file every request's spans are appended to as OpenTelemetry traces (OTLP JSON, for the
+# collector's 'otlpjsonfile' receiver); not exported when unset
+SERVER_TIMING_SPANS_FILE = os.environ.get("SERVER_TIMING_SPANS_FILE") or None
+
+# on-demand sampling profiler started from the admin ('core.profiler'); costs a stat() of the
+# state file per second per worker while no profiling session is running
+PROFILER = os.environ.get("PROFILER", "True") == "True"
+# tells every worker which profiling sessions are running, so it must be shared by all of them
+PROFILER_STATE_FILE = os.environ.get(
+    "PROFILER_STATE_FILE", os.path.join(tempfile.gettempdir(), "library-profiler.json")
+)
+
 
 def middleware_list():
     middleware = []
 
     middleware.append("django_prometheus.middleware.PrometheusBeforeMiddleware")
 
+    # first, so everything logged while handling the request has its ID
+    middleware.append("core.logs.RequestIdMiddleware")
+
+    # before everything else it profiles
+    if PROFILER:
+        middleware.append("core.profiler.ProfilerMiddleware")
+
+    # first and last, so everything in between counts as middleware time and the rest as the view
+    if SERVER_TIMING:
+        middleware.append("core.timing.RequestTimingMiddleware")
+
+    # as early as possible so queries run by other middleware (sessions, auth) are counted too
+    if QUERY_INSPECTION:
+        middleware.append("core.queries.QueryInspectionMiddleware")
+
     # debug_toolbar must come as soon as possible in the middleware list, but behind any encoding
     # middleware (like gzip)
     if DEBUG:
@@ -143,7 +206,7 @@ def middleware_list():
 
     middleware.extend(
         [
-            "django.contrib.sessions.middleware.SessionMiddleware",
+            "core.sessions.middleware.SessionMiddleware",
             "django.middleware.common.CommonMiddleware",
             "django.middleware.csrf.CsrfViewMiddleware",
             "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -155,6 +218,9 @@ def middleware_list():
         ]
     )
 
+    if SERVER_TIMING:
+        middleware.append("core.timing.ViewTimingMiddleware")
+
     middleware.append("django_prometheus.middleware.PrometheusAfterMiddleware")
 
     return middleware
@@ -166,8 +232,9 @@ MIDDLEWARE = middleware_list()
 AUTH_USER_MODEL = "core.User"
 AUTHENTICATION_BACKENDS = [
     # Needed to login by username in Django admin, regardless of allauth
-    "django.contrib.auth.backends.ModelBackend",
-    "allauth.account.auth_backends.AuthenticationBackend",
+    # (both cache users and their permissions, see core.backends)
+    "core.backends.CachedModelBackend",
+    "core.backends.CachedAuthenticationBackend",
 ]
 # for social accounts in'allauth
 SOCIALACCOUNT_PROVIDERS = []
@@ -309,27 +376,69 @@ TEMPLATES = [
 
 
 WSGI_APPLICATION = "library.wsgi.application"
+ASGI_APPLICATION = "library.asgi.application"
+
+# "wsgi" (sync gunicorn workers) or "asgi" (uvicorn workers under gunicorn); read by gunicorn.conf.py
+# as well, so both agree on which entry point is being served
+DJANGO_SERVER_MODE = os.environ.get("DJANGO_SERVER_MODE", "wsgi")
+if DJANGO_SERVER_MODE not in ("wsgi", "asgi"):
+    raise ImproperlyConfigured(f"Unknown DJANGO_SERVER_MODE: {DJANGO_SERVER_MODE}")
 
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+# how database connections are managed:
+# - "per-request" (default): a new connection for every request, closed when it finishes
+# - "persistent": each worker thread keeps its connection open for DB_CONN_MAX_AGE seconds
+# - "pool": each gunicorn worker checks connections out of its own psycopg pool at the start of a
+#   request and returns them at the end (see 'core.db.backends.postgresql')
+DB_CONNECTION_MODE = os.environ.get("DB_CONNECTION_MODE", "per-request")
+if DB_CONNECTION_MODE not in ("per-request", "persistent", "pool"):
+    raise ImproperlyConfigured(f"Unknown DB_CONNECTION_MODE: {DB_CONNECTION_MODE}")
+
+
+def database_settings(mode: str) -> dict:
+    database = {
         "ENGINE": "django_prometheus.db.backends.postgresql",
         "NAME": os.environ.get("POSTGRES_DB_NAME"),
         "USER": os.environ.get("POSTGRES_USER"),
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": os.environ.get("POSTGRES_HOST"),
         "PORT": os.environ.get("POSTGRES_PORT"),
-        # defaults to 0; set to something or None if you want connection reuse (not needed for our low traffic site)
+        # 0 closes the connection at the end of every request
         "CONN_MAX_AGE": 0,
-        # usually set this to True if you want to use persistent connections, but check for performance penalties
-        "CONN_HEALTH_CHECKS": False,
+        # checks a reused connection still works before the first query of a request (one extra
+        # round trip per request, but avoids errors after postgres restarts/idle timeouts)
+        "CONN_HEALTH_CHECKS": os.environ.get("DB_CONN_HEALTH_CHECKS", "True") == "True",
         "OPTIONS": {
             "sslmode": "disable",
         },
     }
+    if mode == "persistent":
+        # None means connections are never closed for being too old
+        max_age = os.environ.get("DB_CONN_MAX_AGE", "600")
+        database["CONN_MAX_AGE"] = None if max_age == "None" else int(max_age)
+    elif mode == "pool":
+        # the pool already keeps connections open, so they're given back after every request
+        database["ENGINE"] = "core.db.backends.postgresql"
+        database["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "4")),
+            # seconds a request waits for a free connection before failing
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            # connections are recycled after this many seconds (or when idle for too long)
+            "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600")),
+            "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "600")),
+        }
+    else:
+        # nothing to check when connections are never reused
+        database["CONN_HEALTH_CHECKS"] = False
+    return database
+
+
+DATABASES = {
+    "default": database_settings(DB_CONNECTION_MODE),
 }
 
 USE_REDIS_CACHE = os.environ.get("USE_REDIS_CACHE", "") == "True"
@@ -361,13 +470,60 @@ if USE_REDIS_CACHE:
         }
     }
 
+# upper bound (in seconds) on how stale the home page counters can get; saves/deletes through the
+# ORM invalidate them immediately, but queryset .update()/.bulk_create() and other workers' local
+# memory caches (when not using redis) only catch up once the entry expires
+CATALOG_COUNTERS_TIMEOUT = int(os.environ.get("CATALOG_COUNTERS_TIMEOUT", 300))
+
+# keyset pagination for the catalog list views: pages stay equally fast at any depth and skip the
+# 'COUNT(*)', but only support next/previous links (no page totals or jumping to page N)
+CATALOG_CURSOR_PAGINATION = os.environ.get("CATALOG_CURSOR_PAGINATION", "") == "True"
+
+# cache holding catalog template fragments ('{% cachefragment %}') and their model version counters;
+# fragments are invalidated on save/delete, so the timeout only matters for per-process caches
+# (no redis) where other workers don't see the invalidation
+CATALOG_FRAGMENT_CACHE = "default"
+CATALOG_FRAGMENT_TIMEOUT = int(os.environ.get("CATALOG_FRAGMENT_TIMEOUT", 600))
+
+# cache holding users and their permission sets for the authentication backends; changes through
+# the ORM (saves, deletes, groups/permissions added or removed) invalidate them immediately, but
+# queryset .update() and other workers' local memory caches (when not using redis) only catch up
+# once the entry expires, so without redis the timeout is how long a revoked permission or
+# deactivated user can still be honored by another worker
+AUTH_CACHE = "default"
+AUTH_CACHE_TIMEOUT = int(
+    os.environ.get("AUTH_CACHE_TIMEOUT", 300 if USE_REDIS_CACHE else 30)
+)
+
+# book covers are re-encoded in the background after upload: one copy per width (in CSS pixels, so
+# 1x/2x/3x of the 200px wide list thumbnails) and format, with formats listed best first and the
+# last one used as the <img> fallback (AVIF is skipped if Pillow can't encode it); 0 workers
+# processes covers inline after the upload's transaction commits
+CATALOG_COVER_WIDTHS = (200, 400, 600)
+CATALOG_COVER_FORMATS = ("avif", "webp", "jpeg")
+CATALOG_COVER_WORKERS = int(os.environ.get("CATALOG_COVER_WORKERS", 2))
+# the book form uploads covers from the browser straight to the media storage instead of streaming
+# them through a worker (with a presigned PUT when it's R2, whose bucket then needs a CORS rule
+# allowing PUT with a Content-Type header from the site's origin)
+CATALOG_DIRECT_COVER_UPLOADS = (
+    os.environ.get("CATALOG_DIRECT_COVER_UPLOADS", "True") == "True"
+)
+# seconds the upload URL, and the uploaded cover until the book form is submitted, stay valid
+CATALOG_COVER_UPLOAD_EXPIRY = 60 * 60
+
+# route the read-heavy catalog views to their async versions ('catalog.async_views'); only a win
+# under ASGI, since WSGI would have to spin up an event loop for every request to run them
+CATALOG_ASYNC_VIEWS = (
+    os.environ.get("CATALOG_ASYNC_VIEWS", str(DJANGO_SERVER_MODE == "asgi")) == "True"
+)
+
 
 def static_files_storage():
     if USING_WHITENOISE:
         return "whitenoise.storage.CompressedManifestStaticFilesStorage"
     # can't use hash-only on debug because deug-toolbar doesn't properly use static template tag
     elif not DEBUG:
-        return "core.storage.HashOnlyManifestStaticFilesStorage"
+        return "core.storage.PrecompressedManifestStaticFilesStorage"
     else:
         return "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"
 
@@ -389,6 +545,10 @@ def media_files_storage():
                 "max_memory_size": 20 * 1024 * 1024,
                 "endpoint_url": os.environ.get("CLOUDFLARE_R2_API_URL"),
                 "custom_domain": os.environ.get("CLOUDFLARE_R2_CUSTOM_DOMAIN"),
+                # existence/size/URL of up to this many files are cached per process for
+                # 'metadata_ttl' seconds, since each can be a request to R2
+                "metadata_cache_size": 4096,
+                "metadata_ttl": 300,
             },
         }
     else:
@@ -409,14 +569,22 @@ STORAGES = {
     },
 }
 
-# write-through cache to the db, but cache-only for reads
-SESSION_ENGINE = (
-    "django.contrib.sessions.backends.cached_db"
-    if USE_REDIS_CACHE
+# where sessions are stored:
+# - "cached_db": write-through cache to the db, but cache-only for reads
+# - "cache": cache only (no queries at all, but sessions are lost when evicted or redis restarts)
+# - "signed_cookies": in the cookie itself (no server storage, but can't be revoked server-side,
+#   so logging out doesn't invalidate a stolen cookie, and the client can read the session data);
+#   never the default, only used when set explicitly
+# - "db": db only
+SESSION_MODE = os.environ.get("SESSION_MODE", "cached_db" if USE_REDIS_CACHE else "db")
+if SESSION_MODE not in ("cached_db", "cache", "signed_cookies", "db"):
+    raise ImproperlyConfigured(f"Unknown SESSION_MODE: {SESSION_MODE}")
+if SESSION_MODE in ("cached_db", "cache") and not USE_REDIS_CACHE:
     # do not use cache when not using redis as the cache because the default cache is local memory
     # per-process, which breaks session data consistency
-    else "django.contrib.sessions.backends.db"
-)
+    raise ImproperlyConfigured(f"SESSION_MODE {SESSION_MODE} requires USE_REDIS_CACHE")
+# the same engines, but not saving sessions whose data didn't change (see core.sessions)
+SESSION_ENGINE = f"core.sessions.backends.{SESSION_MODE}"
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -496,6 +664,10 @@ LOGGING = {
             "format": "{levelname} {asctime} {message}",
             "style": "{",
         },
+        # one JSON object per line, with the request ID and any 'extra=' values as keys
+        "json": {
+            "()": "core.logs.JsonFormatter",
+        },
     },
     "filters": {
         "require_debug_true": {
@@ -503,6 +675,16 @@ LOGGING = {
             "()": "django.utils.log.RequireDebugTrue",
             # any other key would refer to a parameter argument for the callable
         },
+        "request_id": {
+            "()": "core.logs.RequestIdFilter",
+        },
+        # at most 'limit' of the same message per 'period' seconds; the next one after says how
+        # many were dropped
+        "rate_limit": {
+            "()": "core.logs.RateLimitFilter",
+            "limit": int(os.environ.get("LOG_RATE_LIMIT", 20)),
+            "period": 60,
+        },
         # custom filter example
         #
         # "special": {
@@ -519,15 +701,23 @@ LOGGING = {
             "class": "logging.StreamHandler",
             "formatter": "simple",
         },
+        # queues records for a per-process background thread that writes them with "class_name"
+        # (the other options are its arguments), so logging never blocks a request on disk I/O;
+        # the file is rotated by size and age, with a lock so the gunicorn workers sharing it
+        # don't rotate it at the same time
         "file": {
             "level": "WARNING",
-            # technically shouldn't log to a file like this when using gunicon due to the multiple
-            # processes, but leaving it for simplicity
-            "class": "logging.FileHandler",
+            "()": "core.logs.BackgroundHandler",
+            "class_name": "core.logs.SharedRotatingFileHandler",
             # note that this is relative to the directory where the Django project start script is
             # called, NOT the settings file
             "filename": "./log/django-errors.log",
-            "formatter": "verbose",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            # seconds
+            "interval": 24 * 60 * 60,
+            "formatter": "json",
+            "filters": ["request_id", "rate_limit"],
         },
         # "mail_admins": {
         #     "level": "ERROR",
@@ -541,6 +731,10 @@ LOGGING = {
         "django": {
             "handlers": ["console", "file"],
         },
+        # query budget/N+1 reports from 'core.queries'
+        "core": {
+            "handlers": ["console", "file"],
+        },
         # BEWARE: failing email logging appears to prevent propagation??? (DON'T USE EMAIL LOGGING)
         #
         # "django.request": {